@@ -9,14 +9,23 @@ from sqlmodel import SQLModel
 from app.core.config import settings
 
 # Import all models to ensure they're registered with SQLModel
-from app.models import ChatSession, Message, User  # noqa: F401
+from app.models import (  # noqa: F401
+    ChatSession,
+    Message,
+    MessageEmbedding,
+    RateLimitBucket,
+    RevokedToken,
+    User,
+)
 
 
 # this is the Alembic Config object
 config = context.config
 
-# Override sqlalchemy.url with our settings
-config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+# Override sqlalchemy.url with our settings; `-x shard=<i>` migrates DATABASE_SHARD_URLS[i]
+shard = context.get_x_argument(as_dictionary=True).get("shard")
+database_url = settings.DATABASE_URL if shard is None else settings.DATABASE_SHARD_URLS[int(shard)]
+config.set_main_option("sqlalchemy.url", database_url)
 
 # Interpret the config file for Python logging
 if config.config_file_name is not None:
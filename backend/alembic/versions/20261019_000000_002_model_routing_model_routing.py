@@ -0,0 +1,34 @@
+"""Model routing: per-session model override and the model used per message.
+
+Revision ID: 002_model_routing
+Revises: 001_initial_schema
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "002_model_routing"
+down_revision: Union[str, None] = "001_initial_schema"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "chat_sessions",
+        sa.Column("model_override", sa.String(length=100), nullable=True),
+    )
+    op.add_column(
+        "messages",
+        sa.Column("model", sa.String(length=100), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "model")
+    op.drop_column("chat_sessions", "model_override")
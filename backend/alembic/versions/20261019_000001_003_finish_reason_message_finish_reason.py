@@ -0,0 +1,29 @@
+"""Message finish reason: how an assistant reply ended (stop, length, cancelled).
+
+Revision ID: 003_finish_reason
+Revises: 002_model_routing
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "003_finish_reason"
+down_revision: Union[str, None] = "002_model_routing"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "messages",
+        sa.Column("finish_reason", sa.String(length=20), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("messages", "finish_reason")
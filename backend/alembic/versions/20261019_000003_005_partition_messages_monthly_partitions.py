@@ -0,0 +1,134 @@
+"""Partition messages by month on created_at and add messages_archive.
+
+PostgreSQL only (other databases keep the plain table). Rows are copied into
+the partitioned table, so run this upgrade in a maintenance window on large
+databases. Later partitions are created ahead of time by the application
+(`app/db/partitions.py`).
+
+Revision ID: 005_partition_messages
+Revises: 004_rate_limits
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "005_partition_messages"
+down_revision: Union[str, None] = "004_rate_limits"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Partitions created beyond the current month, matches MESSAGE_PARTITION_MONTHS_AHEAD
+MONTHS_AHEAD = 3
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("ALTER TABLE messages RENAME TO messages_unpartitioned")
+    op.execute("ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey")
+    op.execute(
+        "ALTER TABLE messages_unpartitioned "
+        "RENAME CONSTRAINT fk_messages_chat_session_id TO fk_messages_unpartitioned_chat_session_id"
+    )
+    op.execute("ALTER INDEX ix_messages_chat_session_id RENAME TO ix_messages_unpartitioned_chat_session_id")
+
+    # The partition key must be part of the primary key
+    op.execute(
+        """
+        CREATE TABLE messages (
+            id UUID NOT NULL,
+            chat_session_id UUID NOT NULL,
+            content TEXT NOT NULL,
+            role messagerole NOT NULL,
+            model VARCHAR(100),
+            finish_reason VARCHAR(20),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            CONSTRAINT messages_pkey PRIMARY KEY (id, created_at),
+            CONSTRAINT fk_messages_chat_session_id FOREIGN KEY (chat_session_id)
+                REFERENCES chat_sessions (id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    # Serves the per-session history query (filter on session, order by time)
+    op.execute("CREATE INDEX ix_messages_chat_session_id_created_at ON messages (chat_session_id, created_at)")
+
+    # One partition per UTC month, from the oldest message to MONTHS_AHEAD months from now
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            partition_month DATE;
+        BEGIN
+            FOR partition_month IN
+                SELECT generate_series(
+                    date_trunc('month', COALESCE(
+                        (SELECT min(created_at) FROM messages_unpartitioned), now()
+                    ) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '{MONTHS_AHEAD} months',
+                    interval '1 month'
+                )::date
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                    'messages_y' || to_char(partition_month, 'YYYY') || 'm' || to_char(partition_month, 'MM'),
+                    partition_month::timestamp AT TIME ZONE 'UTC',
+                    (partition_month + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+            END LOOP;
+        END $$
+        """
+    )
+
+    op.execute(
+        """
+        INSERT INTO messages (id, chat_session_id, content, role, model, finish_reason, created_at)
+        SELECT id, chat_session_id, content, role, model, finish_reason, created_at
+        FROM messages_unpartitioned
+        """
+    )
+    op.execute("DROP TABLE messages_unpartitioned")
+
+    # Old partitions are moved here by the retention job, same columns, no foreign keys
+    op.execute(
+        "CREATE TABLE messages_archive (LIKE messages INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute(
+        """
+        CREATE TABLE messages (
+            id UUID NOT NULL,
+            chat_session_id UUID NOT NULL,
+            content TEXT NOT NULL,
+            role messagerole NOT NULL,
+            model VARCHAR(100),
+            finish_reason VARCHAR(20),
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()
+        )
+        """
+    )
+    op.execute(
+        """
+        INSERT INTO messages (id, chat_session_id, content, role, model, finish_reason, created_at)
+        SELECT id, chat_session_id, content, role, model, finish_reason, created_at
+        FROM messages_partitioned
+        """
+    )
+    op.execute("DROP TABLE messages_partitioned")
+    op.execute("DROP TABLE messages_archive")
+    op.execute("ALTER TABLE messages ADD CONSTRAINT messages_pkey PRIMARY KEY (id)")
+    op.execute(
+        "ALTER TABLE messages ADD CONSTRAINT fk_messages_chat_session_id FOREIGN KEY (chat_session_id) "
+        "REFERENCES chat_sessions (id) ON DELETE CASCADE"
+    )
+    op.execute("CREATE INDEX ix_messages_chat_session_id ON messages (chat_session_id)")
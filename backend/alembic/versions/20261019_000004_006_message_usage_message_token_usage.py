@@ -0,0 +1,45 @@
+"""Message token usage: Ollama token counts and timings of assistant replies.
+
+Revision ID: 006_message_usage
+Revises: 005_partition_messages
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "006_message_usage"
+down_revision: Union[str, None] = "005_partition_messages"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = (
+    "prompt_tokens",
+    "completion_tokens",
+    "prompt_eval_duration_ms",
+    "eval_duration_ms",
+    "load_duration_ms",
+)
+
+
+def _tables() -> list[str]:
+    # Partitions moved to messages_archive must keep the columns of messages
+    if op.get_bind().dialect.name == "postgresql":
+        return ["messages", "messages_archive"]
+    return ["messages"]
+
+
+def upgrade() -> None:
+    for table in _tables():
+        for column in COLUMNS:
+            op.add_column(table, sa.Column(column, sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    for table in _tables():
+        for column in reversed(COLUMNS):
+            op.drop_column(table, column)
@@ -0,0 +1,46 @@
+"""Message embeddings: persisted vectors for retrieval memory.
+
+Revision ID: 007_message_embeddings
+Revises: 006_message_usage
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "007_message_embeddings"
+down_revision: Union[str, None] = "006_message_usage"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "message_embeddings",
+        sa.Column("message_id", sa.Uuid(), nullable=False),
+        sa.Column("model", sa.String(length=100), nullable=False),
+        sa.Column("chat_session_id", sa.Uuid(), nullable=False),
+        sa.Column("vector", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["chat_session_id"],
+            ["chat_sessions.id"],
+            name="fk_message_embeddings_chat_session_id",
+            ondelete="CASCADE",
+        ),
+        sa.PrimaryKeyConstraint("message_id", "model"),
+    )
+    op.create_index(
+        op.f("ix_message_embeddings_chat_session_id"),
+        "message_embeddings",
+        ["chat_session_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_message_embeddings_chat_session_id"), table_name="message_embeddings")
+    op.drop_table("message_embeddings")
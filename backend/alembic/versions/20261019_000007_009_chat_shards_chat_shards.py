@@ -0,0 +1,42 @@
+"""Chat shards: no foreign key from chat sessions to users on shard databases.
+
+Users stay on the main database, so on a shard (`alembic -x shard=<i>
+upgrade head`) `chat_sessions.user_id` cannot reference `users`. The main
+database keeps the constraint.
+
+Revision ID: 009_chat_shards
+Revises: 008_revoked_tokens
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision: str = "009_chat_shards"
+down_revision: Union[str, None] = "008_revoked_tokens"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _is_shard() -> bool:
+    return "shard" in context.get_x_argument(as_dictionary=True)
+
+
+def upgrade() -> None:
+    if _is_shard():
+        op.drop_constraint("fk_chat_sessions_user_id", "chat_sessions", type_="foreignkey")
+
+
+def downgrade() -> None:
+    if _is_shard():
+        op.create_foreign_key(
+            "fk_chat_sessions_user_id",
+            "chat_sessions",
+            "users",
+            ["user_id"],
+            ["id"],
+            ondelete="CASCADE",
+        )
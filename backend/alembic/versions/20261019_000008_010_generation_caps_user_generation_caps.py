@@ -0,0 +1,31 @@
+"""Generation caps: user tiers and per-user generation limits.
+
+Revision ID: 010_generation_caps
+Revises: 009_chat_shards
+Create Date: 2026-10-19
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "010_generation_caps"
+down_revision: Union[str, None] = "009_chat_shards"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users",
+        sa.Column("tier", sa.String(length=32), nullable=False, server_default="default"),
+    )
+    op.add_column("users", sa.Column("generation_limits", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("users", "generation_limits")
+    op.drop_column("users", "tier")
@@ -1,31 +1,103 @@
 """API dependencies."""
 
 from typing import Annotated
+from uuid import UUID
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, WebSocketException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlmodel import Session, select
+from starlette.requests import HTTPConnection
 
-from app.core.security import decode_token
-from app.db.session import get_session
+from app.core.config import settings
+from app.core.ratelimit import rate_limit_headers, rate_limiter, token_subject
+from app.core.revocation import revocation_list
+from app.core.security import decode_token, issued_after
+from app.db.session import get_session, replica_reads
 from app.models.user import User
 
 
 security = HTTPBearer()
 
 
+async def rate_limit(connection: HTTPConnection) -> None:
+    """Charge the request against the caller's rate limit buckets, 429 when empty.
+
+    The `RateLimit-*` headers are added to the response by
+    `RateLimitHeadersMiddleware`, so streamed responses carry them too.
+
+    WebSocket handshakes are charged as `WS /path` and refused with close code
+    1008 when the bucket is empty.
+    """
+    if not settings.RATE_LIMIT_ENABLED:
+        return
+
+    method = connection.scope.get("method", "WS")
+    decision = await rate_limiter.check(
+        f"{method} {_route_template(connection)}",
+        _bearer_subject(connection),
+        client_ip(connection),
+    )
+    if decision is None:
+        return
+
+    headers = decision.headers()
+    if not decision.allowed:
+        if connection.scope["type"] == "websocket":
+            raise WebSocketException(
+                code=status.WS_1008_POLICY_VIOLATION, reason="Too many requests"
+            )
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests",
+            headers=headers,
+        )
+    response_headers = rate_limit_headers.get()
+    if response_headers is not None:
+        response_headers.update(headers)
+
+
+def client_ip(connection: HTTPConnection) -> str | None:
+    """Address of the client, or of the first proxy hop when trusted."""
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded = connection.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",", 1)[0].strip()
+    return connection.client.host if connection.client else None
+
+
+def _route_template(connection: HTTPConnection) -> str:
+    """Request path with path parameters put back as `{name}` placeholders."""
+    path = connection.url.path
+    for name, value in connection.path_params.items():
+        path = path.replace(f"/{value}", f"/{{{name}}}", 1)
+    return path
+
+
+def _bearer_subject(connection: HTTPConnection) -> str | None:
+    scheme, _, token = connection.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        return token_subject(token)
+    # WebSocket clients cannot set headers from browsers and pass the token in the query
+    token = connection.query_params.get("token", "")
+    return token_subject(token) if token else None
+
+
 async def get_current_user(
     credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
     session: Annotated[Session, Depends(get_session)],
 ) -> User:
     """Get the current authenticated user from JWT token."""
+    return authenticate_token(credentials.credentials, session)
+
+
+def authenticate_token(token: str, session: Session) -> User:
+    """Resolve an access token to an active user, raising 401 or 403 otherwise."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token = credentials.credentials
     payload = decode_token(token)
 
     if payload is None:
@@ -35,17 +107,34 @@ async def get_current_user(
     if payload.get("type") != "access":
         raise credentials_exception
 
+    # Logged out; a Bloom filter answers for valid tokens without a query
+    jti = payload.get("jti")
+    if jti and revocation_list.is_revoked(session, jti):
+        raise credentials_exception
+
     user_id: str | None = payload.get("sub")
     if user_id is None:
         raise credentials_exception
+    try:
+        user_uuid = UUID(user_id)
+    except ValueError:
+        raise credentials_exception from None
+
+    # Route this session's reads and writes for the authenticated user
+    session.info["user_id"] = user_id
 
     # Get user from database
-    statement = select(User).where(User.id == user_id)
-    user = session.exec(statement).first()
+    statement = select(User).where(User.id == user_uuid)
+    with replica_reads(session):
+        user = session.exec(statement).first()
 
     if user is None:
         raise credentials_exception
 
+    # Issued before a password change or a logout everywhere
+    if not issued_after(payload, user.tokens_valid_after):
+        raise credentials_exception
+
     if not user.is_active:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
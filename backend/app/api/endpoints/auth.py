@@ -3,12 +3,14 @@
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from sqlmodel import Session
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, security
+from app.core.security import decode_token
 from app.db.session import get_session
-from app.models.user import User, UserCreate, UserLogin, UserRead
+from app.models.user import PasswordChange, User, UserCreate, UserLogin, UserRead
 from app.services.auth import AuthService
 
 
@@ -30,6 +32,13 @@ class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
 
+class LogoutRequest(BaseModel):
+    """Request body for logout."""
+
+    refresh_token: str | None = None
+    everywhere: bool = False  # Also end the user's other logins
+
+
 @router.post("/register", response_model=UserRead, status_code=status.HTTP_201_CREATED)
 async def register(
     user_data: UserCreate,
@@ -109,6 +118,51 @@ async def refresh_token(
     }
 
 
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+    request: LogoutRequest | None = None,
+) -> None:
+    """Revoke the access token and, when sent, the refresh token of this login.
+
+    With `everywhere` all tokens issued to the user so far are revoked.
+    """
+    request = request or LogoutRequest()
+    payload = decode_token(credentials.credentials) or {}
+    auth_service = AuthService(session)
+    auth_service.logout(current_user, payload, request.refresh_token, request.everywhere)
+
+
+@router.post("/password")
+async def change_password(
+    password_data: PasswordChange,
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+) -> dict:
+    """Change the password, revoking every token issued so far.
+
+    Returns new tokens so the caller stays logged in.
+    """
+    auth_service = AuthService(session)
+    tokens = auth_service.change_password(
+        current_user, password_data.current_password, password_data.new_password
+    )
+
+    if not tokens:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Current password is incorrect",
+        )
+
+    return {
+        "access_token": tokens["access_token"],
+        "refresh_token": tokens["refresh_token"],
+        "token_type": "bearer",
+    }
+
+
 @router.get("/me", response_model=UserRead)
 async def get_current_user_info(
     current_user: Annotated[User, Depends(get_current_user)],
@@ -1,25 +1,71 @@
 """Chat endpoints."""
 
-from typing import Annotated
+import asyncio
+import json
+import logging
+import math
+from collections.abc import AsyncIterator
+from contextlib import suppress
+from dataclasses import asdict
+from datetime import datetime
+from typing import Annotated, Any
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
 
-from app.api.deps import get_current_user
+from app.api.deps import authenticate_token, client_ip, get_current_user
+from app.core.config import settings
+from app.core.ratelimit import rate_limiter
 from app.db.session import get_session
 from app.models.chat import (
+    BatchCreate,
     ChatSession,
     ChatSessionCreate,
     ChatSessionRead,
+    ChatSessionUpdate,
     ChatSessionWithMessages,
+    GenerationLimits,
+    HistoryImportRead,
     MessageCreate,
     MessageRead,
+    UsageRead,
 )
 from app.models.user import User
+from app.services.batch import BatchRunner
+from app.services.budgets import GenerationBudget, generation_budget, user_caps
 from app.services.chat import ChatService
+from app.services.generations import GenerationCancelledError, generation_registry
+from app.services.history import HistoryImporter, HistoryImportError, export_history
+from app.services.idempotency import (
+    DisconnectCheck,
+    IdempotencyKeyMismatchError,
+    fingerprint,
+    idempotency_store,
+)
+from app.services.llm import LLMTimeoutError, LLMUnavailableError
+from app.services.model_router import model_router
+from app.services.streams import StreamResumeError
+from app.services.turns import TurnBusyError
+from app.services.usage import UsageService
 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
@@ -40,6 +86,7 @@ async def create_chat_session(
     session: Annotated[Session, Depends(get_session)],
 ) -> ChatSession:
     """Create a new chat session."""
+    _validate_model_override(session_data.model_override)
     chat_service = ChatService(session)
     return chat_service.create_session(current_user.id, session_data)
 
@@ -63,6 +110,27 @@ async def get_chat_session(
     return chat_session
 
 
+@router.patch("/sessions/{session_id}", response_model=ChatSessionRead)
+async def update_chat_session(
+    session_id: UUID,
+    session_data: ChatSessionUpdate,
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+) -> ChatSession:
+    """Rename a chat session or pin it to a model (send null to clear the override)."""
+    _validate_model_override(session_data.model_override)
+    chat_service = ChatService(session)
+    chat_session = chat_service.update_session(session_id, current_user.id, session_data)
+
+    if not chat_session:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat session not found",
+        )
+
+    return chat_session
+
+
 @router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_chat_session(
     session_id: UUID,
@@ -84,10 +152,28 @@ async def delete_chat_session(
 async def send_message(
     session_id: UUID,
     message_data: MessageCreate,
+    request: Request,
+    response: Response,
     current_user: Annotated[User, Depends(get_current_user)],
     session: Annotated[Session, Depends(get_session)],
+    idempotency_key: Annotated[str | None, Header(max_length=255)] = None,
 ) -> MessageRead:
-    """Send a message and get AI response."""
+    """Send a message and get AI response.
+
+    Generation stops when the client disconnects or the session is cancelled. A
+    partial reply is returned with `finish_reason="cancelled"`.
+
+    With an `Idempotency-Key` header, retries of the same message wait for or
+    replay the original reply instead of generating a new one. Replays carry
+    `Idempotent-Replayed: true`.
+
+    `limits` (max tokens, context size, deadline, temperature) are clamped to
+    the user's caps; a reply cut off by them has `finish_reason` "length" or
+    "deadline".
+
+    When the model fails before any output the message is not stored and the
+    response is 503 (with `Retry-After`) or 504 when it did not reply in time.
+    """
     chat_service = ChatService(session)
 
     # Verify session belongs to user
@@ -99,5 +185,392 @@ async def send_message(
         )
 
     # Process message and get AI response
-    response = await chat_service.process_message(session_id, message_data.content)
-    return response
+    budget = generation_budget(user_caps(current_user), message_data.limits)
+
+    async def process(is_disconnected: DisconnectCheck) -> MessageRead:
+        return await chat_service.process_message(
+            session_id, message_data.content, is_disconnected=is_disconnected, budget=budget
+        )
+
+    try:
+        if idempotency_key is None:
+            return await process(request.is_disconnected)
+
+        result, replayed = await idempotency_store.run(
+            (current_user.id, idempotency_key),
+            fingerprint(session_id, message_data.content),
+            process,
+            request.is_disconnected,
+        )
+    except GenerationCancelledError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Generation cancelled before any output",
+        ) from e
+    except IdempotencyKeyMismatchError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        ) from e
+    except TurnBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+        ) from e
+    except LLMTimeoutError as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="The model did not reply in time",
+        ) from e
+    except LLMUnavailableError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The model is unavailable, try again later",
+            headers={"Retry-After": str(math.ceil(e.retry_after or 1))},
+        ) from e
+
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+@router.post("/sessions/{session_id}/cancel")
+async def cancel_generation(
+    session_id: UUID,
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+) -> dict:
+    """Stop the reply currently being generated in a chat session."""
+    chat_service = ChatService(session)
+    if not chat_service.get_session(session_id, current_user.id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chat session not found",
+        )
+
+    cancelled = generation_registry.cancel(session_id)
+    return {"cancelled": cancelled}
+
+
+@router.post("/batch", response_class=StreamingResponse)
+async def run_batch(
+    batch: BatchCreate,
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+) -> StreamingResponse:
+    """Run many prompts and stream one NDJSON result line per item as it finishes.
+
+    Items with a `session_id` are turns in that chat session and are stored;
+    items without one are stateless prompts. Each result carries the item's
+    `index` and `id`, and either a `reply` or an `error` (`code`, `detail`), so
+    failed items can be retried on their own.
+    """
+    if not batch.items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="A batch needs at least one item",
+        )
+    if len(batch.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch holds at most {settings.BATCH_MAX_ITEMS} items",
+        )
+
+    runner = BatchRunner(
+        session.get_bind(),
+        current_user.id,
+        settings.BATCH_CONCURRENCY,
+        settings.BATCH_FLUSH_SIZE,
+        user_caps(current_user),
+    )
+
+    async def lines() -> AsyncIterator[str]:
+        async for result in runner.run(batch.items):
+            yield result.model_dump_json(exclude_none=True) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@router.get("/usage", response_model=UsageRead)
+async def get_usage(
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+    since: datetime | None = None,
+    sessions: Annotated[int, Query(ge=0, le=100)] = 10,
+) -> UsageRead:
+    """Token usage and generation speed of the current user's assistant replies.
+
+    Totals are per model; `sessions` lists the chat sessions with the longest
+    prompts, whose history is the most expensive to send with each turn.
+    """
+    usage_service = UsageService(session)
+    return UsageRead(
+        models=usage_service.by_model(current_user.id, since),
+        sessions=usage_service.largest_sessions(current_user.id, sessions, since),
+    )
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_chat_history(
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+) -> StreamingResponse:
+    """Stream all chat sessions and messages of the current user as NDJSON."""
+    return StreamingResponse(
+        export_history(session.get_bind(), current_user.id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="chat-history.ndjson"'},
+    )
+
+
+@router.post("/import", response_model=HistoryImportRead, status_code=status.HTTP_201_CREATED)
+async def import_chat_history(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_user)],
+    session: Annotated[Session, Depends(get_session)],
+) -> HistoryImportRead:
+    """Import chat history from an NDJSON body in the export format.
+
+    The body is read as a stream and inserted in batches; the import is applied
+    all at once or not at all.
+    """
+    importer = HistoryImporter(session, current_user.id)
+    pending = b""
+    try:
+        async for chunk in request.stream():
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                importer.feed(line)
+            if importer.pending >= importer.batch_size:
+                await run_in_threadpool(importer.flush)
+        importer.feed(pending)
+        summary = await run_in_threadpool(importer.finish)
+    except HistoryImportError as e:
+        session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        ) from e
+
+    return HistoryImportRead(**asdict(summary))
+
+
+@router.websocket("/sessions/{session_id}/ws")
+async def chat_websocket(
+    websocket: WebSocket,
+    session_id: UUID,
+    session: Annotated[Session, Depends(get_session)],
+    token: str | None = None,
+) -> None:
+    """Chat over one connection: authenticated once, many turns, streamed replies.
+
+    Pass the access token as `?token=`. Client messages are
+    `{"type": "message", "content": "...", "limits": {...}}` (`limits` optional,
+    as for `POST /messages`) and `{"type": "cancel"}`. The server
+    answers each turn with `start` (`message_id` of the reply), `token` messages
+    (`content`) and `end` (`message`: the stored reply, or null when cancelled
+    before any output), and reports problems with `error` (`detail`).
+
+    A message sent with `"resumable": true` keeps generating when the
+    connection drops. `{"type": "resume", "message_id": "...", "offset": n}`,
+    on any connection to the session, streams that reply from character `n` on
+    like a turn, without generating it again.
+    """
+    try:
+        user = authenticate_token(token or "", session)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=str(e.detail))
+        return
+
+    chat_service = ChatService(session)
+    if not chat_service.get_session(session_id, user.id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Chat session not found")
+        return
+    caps = user_caps(user)
+
+    # Don't hold a database connection while the socket is idle
+    session.close()
+    await websocket.accept()
+
+    disconnected = False
+    turn: asyncio.Task | None = None
+    following = False  # `turn` resumes a reply instead of generating one
+
+    async def is_disconnected() -> bool:
+        return disconnected
+
+    try:
+        while True:
+            try:
+                data = json.loads(await websocket.receive_text())
+            except ValueError:
+                await _send(websocket, {"type": "error", "detail": "Invalid JSON"})
+                continue
+            kind = data.get("type") if isinstance(data, dict) else None
+
+            if kind == "cancel":
+                generation_registry.cancel(session_id)
+            elif kind == "resume":
+                resume = _resume_request(data)
+                if resume is None:
+                    await _send(
+                        websocket,
+                        {"type": "error", "detail": "message_id and an offset >= 0 are required"},
+                    )
+                elif turn is not None and not turn.done():
+                    await _send(
+                        websocket, {"type": "error", "detail": "A reply is still being generated"}
+                    )
+                else:
+                    following = True
+                    turn = asyncio.create_task(
+                        _resume_turn(websocket, chat_service, session_id, *resume)
+                    )
+            elif kind != "message":
+                await _send(websocket, {"type": "error", "detail": "Unknown message type"})
+            elif not isinstance(data.get("content"), str) or not data["content"]:
+                await _send(websocket, {"type": "error", "detail": "Message content is required"})
+            elif (budget := _turn_budget(data, caps)) is None:
+                await _send(websocket, {"type": "error", "detail": "Invalid generation limits"})
+            elif turn is not None and not turn.done():
+                await _send(
+                    websocket, {"type": "error", "detail": "A reply is still being generated"}
+                )
+            elif not await _charge_turn(websocket, user.id):
+                await _send(websocket, {"type": "error", "detail": "Too many requests"})
+            else:
+                # Resumable turns keep generating after a disconnect
+                check = None if data.get("resumable") is True else is_disconnected
+                following = False
+                turn = asyncio.create_task(
+                    _run_turn(websocket, chat_service, session_id, data["content"], check, budget)
+                )
+    except WebSocketDisconnect:
+        disconnected = True
+        if turn is not None:
+            if following:
+                turn.cancel()
+            # The generation sees the disconnect on its next poll and stops
+            with suppress(asyncio.CancelledError):
+                await turn
+
+
+async def _run_turn(
+    websocket: WebSocket,
+    chat_service: ChatService,
+    session_id: UUID,
+    content: str,
+    is_disconnected: DisconnectCheck | None,
+    budget: GenerationBudget,
+) -> None:
+    """Run one chat turn, streaming the reply over the socket."""
+
+    async def send_start(message_id: UUID) -> None:
+        await _send(websocket, {"type": "start", "message_id": str(message_id)})
+
+    async def send_token(text: str) -> None:
+        await _send(websocket, {"type": "token", "content": text})
+
+    try:
+        message = await chat_service.process_message(
+            session_id,
+            content,
+            is_disconnected=is_disconnected,
+            on_token=send_token,
+            on_start=send_start,
+            budget=budget,
+        )
+    except GenerationCancelledError:
+        await _send(websocket, {"type": "end", "message": None})
+    except TurnBusyError as e:
+        await _send(websocket, {"type": "error", "detail": str(e)})
+    except LLMTimeoutError:
+        await _send(websocket, {"type": "error", "detail": "The model did not reply in time"})
+    except LLMUnavailableError:
+        await _send(
+            websocket, {"type": "error", "detail": "The model is unavailable, try again later"}
+        )
+    except Exception:
+        logger.exception("Chat turn failed for session %s", session_id)
+        await _send(websocket, {"type": "error", "detail": "Could not process the message"})
+    else:
+        await _send(websocket, {"type": "end", "message": message.model_dump(mode="json")})
+    finally:
+        chat_service.session.close()
+
+
+async def _resume_turn(
+    websocket: WebSocket,
+    chat_service: ChatService,
+    session_id: UUID,
+    message_id: UUID,
+    offset: int,
+) -> None:
+    """Stream a reply from `offset` on to a client that lost it, ending like a turn."""
+    try:
+        texts = chat_service.resume_reply(session_id, message_id, offset)
+        await _send(websocket, {"type": "start", "message_id": str(message_id), "offset": offset})
+        async for text in texts:
+            await _send(websocket, {"type": "token", "content": text})
+        message = chat_service.get_message(session_id, message_id)
+    except StreamResumeError as e:
+        await _send(websocket, {"type": "error", "detail": str(e)})
+    except Exception:
+        logger.exception("Resuming reply %s failed", message_id)
+        await _send(websocket, {"type": "error", "detail": "Could not resume the reply"})
+    else:
+        if message is None:
+            await _send(websocket, {"type": "error", "detail": "The reply was not completed"})
+        else:
+            data = MessageRead.model_validate(message).model_dump(mode="json")
+            await _send(websocket, {"type": "end", "message": data})
+    finally:
+        chat_service.session.close()
+
+
+def _turn_budget(data: dict[str, Any], caps: GenerationLimits) -> GenerationBudget | None:
+    """The budget of a message's turn, None when its `limits` are not valid."""
+    try:
+        limits = GenerationLimits.model_validate(data.get("limits") or {})
+    except ValidationError:
+        return None
+    return generation_budget(caps, limits)
+
+
+def _resume_request(data: dict[str, Any]) -> tuple[UUID, int] | None:
+    """The reply id and offset of a resume message, None when they are not valid."""
+    offset = data.get("offset", 0)
+    if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+        return None
+    try:
+        return UUID(str(data.get("message_id"))), offset
+    except ValueError:
+        return None
+
+
+async def _send(websocket: WebSocket, data: dict[str, Any]) -> None:
+    """Send a JSON message, ignoring clients that already went away."""
+    with suppress(WebSocketDisconnect, RuntimeError):
+        await websocket.send_text(json.dumps(data))
+
+
+async def _charge_turn(websocket: WebSocket, user_id: UUID) -> bool:
+    """Charge a WebSocket turn like a sent message against the rate limits."""
+    if not settings.RATE_LIMIT_ENABLED:
+        return True
+    decision = await rate_limiter.check(
+        f"POST {settings.API_V1_PREFIX}/chat/sessions/{{session_id}}/messages",
+        str(user_id),
+        client_ip(websocket),
+    )
+    return decision is None or decision.allowed
+
+
+def _validate_model_override(model: str | None) -> None:
+    """Reject session model overrides outside the allowed models."""
+    allowed = model_router.allowed_overrides()
+    if model is not None and model not in allowed:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Model not allowed, choose one of: {', '.join(allowed)}",
+        )
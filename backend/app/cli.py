@@ -0,0 +1,193 @@
+"""Command line tools for operating the backend.
+
+Usage:
+    python -m app.cli export --user alice --output history.ndjson
+    python -m app.cli import --user alice history.ndjson
+    python -m app.cli partitions
+    python -m app.cli shards rebalance --dry-run
+    python -m app.cli usage --since 2026-10-01
+"""
+
+import argparse
+import sys
+from collections.abc import Sequence
+from datetime import datetime
+
+from sqlmodel import Session, or_, select
+
+from app.db.partitions import run_maintenance
+from app.db.session import RoutingSession, chat_engines, engine, shard_engines
+from app.db.shards import rebalance
+from app.models.user import User
+from app.services.history import HistoryImporter, HistoryImportError, export_history
+from app.services.usage import UsageService
+
+
+class CommandError(Exception):
+    """Raised for errors reported to the user without a traceback."""
+
+
+def _find_user(session: Session, identifier: str) -> User:
+    """Look up a user by username or email."""
+    statement = select(User).where(or_(User.username == identifier, User.email == identifier))
+    user = session.exec(statement).first()
+    if user is None:
+        raise CommandError(f"No user with username or email {identifier!r}")
+    return user
+
+
+def export_command(args: argparse.Namespace) -> None:
+    """Write a user's chat history as NDJSON."""
+    with RoutingSession() as session:
+        user_id = _find_user(session, args.user).id
+
+    with args.output as output:
+        for line in export_history(engine, user_id):
+            output.write(line)
+
+
+def import_command(args: argparse.Namespace) -> None:
+    """Import NDJSON chat history into a user's account."""
+    try:
+        with args.input as source, RoutingSession() as session:
+            user = _find_user(session, args.user)
+            session.info["user_id"] = str(user.id)
+            importer = HistoryImporter(session, user.id)
+            for line in source:
+                importer.feed(line)
+                if importer.pending >= importer.batch_size:
+                    importer.flush()
+            summary = importer.finish()
+    except HistoryImportError as e:
+        raise CommandError(str(e)) from e
+
+    print(f"Imported {summary.sessions} sessions and {summary.messages} messages", file=sys.stderr)
+
+
+def partitions_command(args: argparse.Namespace) -> None:
+    """Create upcoming message partitions and apply the retention policy."""
+    for chat_engine in chat_engines():
+        database = chat_engine.url.render_as_string(hide_password=True)
+        result = run_maintenance(
+            chat_engine,
+            months_ahead=args.months_ahead,
+            retention_months=args.retention_months,
+            mode=args.mode,
+        )
+        if result is None:
+            raise CommandError(
+                f"{database}: messages is not partitioned or maintenance is already running"
+            )
+        print(
+            f"{database}: created {len(result.created)}, archived {len(result.archived)} "
+            f"and dropped {len(result.dropped)} partitions",
+            file=sys.stderr,
+        )
+
+
+def shards_command(args: argparse.Namespace) -> None:
+    """Move each user's chat data to the shard it belongs on."""
+    if not shard_engines:
+        raise CommandError("DATABASE_SHARD_URLS is not set")
+    shard_urls = {str(shard.url) for shard in shard_engines}
+    # Chat data written before sharding was turned on is still on the main database
+    sources = [] if str(engine.url) in shard_urls else [engine]
+    result = rebalance(shard_engines, sources, dry_run=args.dry_run)
+    print(
+        f"{'Would move' if args.dry_run else 'Moved'} {result.users} users: "
+        f"{result.sessions} sessions, {result.messages} messages "
+        f"and {result.embeddings} embeddings",
+        file=sys.stderr,
+    )
+
+
+def usage_command(args: argparse.Namespace) -> None:
+    """Print token usage and generation speed per user and model."""
+    with RoutingSession() as session:
+        rows = UsageService(session).by_user_and_model(args.since)
+
+    print(
+        "user\tmodel\tmessages\tprompt_tokens\tcompletion_tokens\tmax_prompt_tokens\ttokens_per_second"
+    )
+    for username, usage in rows:
+        print(
+            f"{username}\t{usage.model or '-'}\t{usage.messages}\t{usage.prompt_tokens}\t"
+            f"{usage.completion_tokens}\t{usage.max_prompt_tokens or '-'}\t"
+            f"{usage.tokens_per_second or '-'}"
+        )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser with one subcommand per tool."""
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Export a user's chat history as NDJSON")
+    export_parser.add_argument("--user", required=True, help="Username or email")
+    export_parser.add_argument(
+        "--output",
+        type=argparse.FileType("w", encoding="utf-8"),
+        default="-",
+        help="File to write (default: stdout)",
+    )
+    export_parser.set_defaults(func=export_command)
+
+    import_parser = commands.add_parser("import", help="Import NDJSON chat history for a user")
+    import_parser.add_argument("--user", required=True, help="Username or email")
+    import_parser.add_argument(
+        "input",
+        nargs="?",
+        type=argparse.FileType("r", encoding="utf-8"),
+        default="-",
+        help="File to read (default: stdin)",
+    )
+    import_parser.set_defaults(func=import_command)
+
+    partitions_parser = commands.add_parser(
+        "partitions", help="Create upcoming message partitions and apply retention"
+    )
+    partitions_parser.add_argument(
+        "--months-ahead", type=int, help="Default: MESSAGE_PARTITION_MONTHS_AHEAD"
+    )
+    partitions_parser.add_argument(
+        "--retention-months", type=int, help="Default: MESSAGE_RETENTION_MONTHS (0 = keep all)"
+    )
+    partitions_parser.add_argument(
+        "--mode", choices=["archive", "drop"], help="Default: MESSAGE_RETENTION_MODE"
+    )
+    partitions_parser.set_defaults(func=partitions_command)
+
+    shards_parser = commands.add_parser("shards", help="Manage the chat data shards")
+    shards_commands = shards_parser.add_subparsers(dest="shards_command", required=True)
+    rebalance_parser = shards_commands.add_parser(
+        "rebalance", help="Move users' chat data to their shard (run with the API stopped)"
+    )
+    rebalance_parser.add_argument(
+        "--dry-run", action="store_true", help="Only count what would be moved"
+    )
+    rebalance_parser.set_defaults(func=shards_command)
+
+    usage_parser = commands.add_parser(
+        "usage", help="Print token usage and generation speed per user and model"
+    )
+    usage_parser.add_argument(
+        "--since", type=datetime.fromisoformat, help="Only replies from this date or time on"
+    )
+    usage_parser.set_defaults(func=usage_command)
+
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Run a command and return the process exit code."""
+    args = build_parser().parse_args(argv)
+    try:
+        args.func(args)
+    except CommandError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,6 +19,16 @@ class Settings(BaseSettings):
     API_V1_PREFIX: str = "/api/v1"
     DEBUG: bool = False
 
+    # Logging
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json (one object per line) | text
+    SLOW_REQUEST_THRESHOLD_MS: float = 5000.0  # Log slower requests with SQL/LLM timings (0 = off)
+
+    # Event loop monitoring: lag histogram and blocking call reports
+    LOOP_MONITOR_MODE: str = "sample"  # off | sample (stack samples) | debug (times callbacks)
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.25  # Heartbeat whose lateness is the loop lag
+    LOOP_BLOCK_THRESHOLD_MS: float = 100.0  # Longer blocks are logged with their coroutine
+
     # CORS
     CORS_ORIGINS: list[str] = Field(
         default=["http://localhost:5173", "http://localhost:1420", "tauri://localhost"]
@@ -40,6 +50,13 @@ class Settings(BaseSettings):
             f"@{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
 
+    # Read replicas (optional): read-only queries are spread over these engines
+    DATABASE_REPLICA_URLS: list[str] = Field(default=[])
+    DATABASE_REPLICA_STICKY_SECONDS: float = 5.0  # Reads stay on primary after a user writes
+
+    # Sharding (optional): each user's chat data lives on one of these databases
+    DATABASE_SHARD_URLS: list[str] = Field(default=[])
+
     # JWT Authentication
     JWT_SECRET_KEY: str = "dev-secret-key-change-in-production"
     JWT_ALGORITHM: str = "HS256"
@@ -47,11 +64,112 @@ class Settings(BaseSettings):
     JWT_REFRESH_INACTIVITY_TIMEOUT_MINUTES: int = 1440  # Session closes if no refresh in 24 hours
     JWT_MAX_SESSION_DURATION_MINUTES: int = 43200  # Maximum total session duration (30 days)
 
+    # Token revocation (logout, password change), screened by a Bloom filter per worker
+    TOKEN_REVOCATION_SYNC_SECONDS: float = 5.0  # How soon other workers see a revocation
+    TOKEN_REVOCATION_PRUNE_SECONDS: float = 3600.0  # Drop expired entries and rebuild the filter
+    TOKEN_REVOCATION_FILTER_CAPACITY: int = 100000  # Revoked tokens the filter is sized for
+    TOKEN_REVOCATION_FILTER_ERROR_RATE: float = 0.001  # Valid tokens that still need a lookup
+
+    # Rate limiting (token buckets per user and per client IP)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # memory (per worker) | database (shared by workers)
+    RATE_LIMIT_USER_CAPACITY: float = 60.0  # Burst size in tokens
+    RATE_LIMIT_USER_REFILL_PER_SECOND: float = 1.0
+    RATE_LIMIT_IP_CAPACITY: float = 120.0
+    RATE_LIMIT_IP_REFILL_PER_SECOND: float = 2.0
+    RATE_LIMIT_ROUTE_COSTS: dict[str, float] = Field(  # Tokens per route, others cost 1
+        default={
+            "POST /api/v1/auth/login": 10.0,
+            "POST /api/v1/auth/register": 10.0,
+            "POST /api/v1/chat/sessions/{session_id}/messages": 5.0,
+            "POST /api/v1/chat/batch": 30.0,
+        }
+    )
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False  # Client IP from X-Forwarded-For (behind a proxy)
+
     # Ollama / LLM
     OLLAMA_BASE_URL: str = "http://localhost:11434"
+    OLLAMA_BASE_URLS: list[str] = Field(default=[])  # Several Ollama hosts, [] = OLLAMA_BASE_URL
+    OLLAMA_HEALTH_CHECK_INTERVAL_SECONDS: float = 10.0  # Active health checks (0 = off)
+    OLLAMA_HEALTH_CHECK_TIMEOUT: float = 5.0
+    OLLAMA_EJECT_AFTER_FAILURES: int = 3  # Consecutive failures before a host leaves rotation
+    OLLAMA_EJECT_SECONDS: float = 30.0  # How long an ejected host stays out of rotation
+    OLLAMA_MAX_ATTEMPTS: int = 3  # Hosts tried for a request that could not be sent
+    OLLAMA_FIRST_TOKEN_TIMEOUT_SECONDS: float = 60.0  # Includes loading the model (0 = none)
+    OLLAMA_GENERATION_TIMEOUT_SECONDS: float = 300.0  # Whole reply (0 = none)
+    OLLAMA_BREAKER_FAILURE_THRESHOLD: int = 5  # Consecutive failed calls that open the circuit
+    OLLAMA_BREAKER_RESET_SECONDS: float = 30.0  # Fail fast this long before probing again
     OLLAMA_MODEL_DEV: str = "llama3.2:3b"
     OLLAMA_MODEL_PROD: str = "llama4-scout"
     OLLAMA_MODEL: str = Field(default="llama3.2:3b")  # Override via env
+    OLLAMA_KEEP_ALIVE: str = "30m"  # How long Ollama keeps the model loaded after a request
+    OLLAMA_WARMUP_ENABLED: bool = True  # Load the model at startup before reporting ready
+    OLLAMA_REWARM_INTERVAL_SECONDS: int = 600  # Periodic re-warm, keep below keep-alive (0 = off)
+    OLLAMA_WARMUP_TIMEOUT_SECONDS: float = 120.0  # Per model load, a hung host counts as failed
+    OLLAMA_TITLE_MODEL: str = "llama3.2:3b"  # Small model used for automatic session titles
+    OLLAMA_TEMPERATURE: float = 0.7  # Unless a reply's limits ask for another
+    GENERATION_DISCONNECT_POLL_SECONDS: float = 0.5  # How often to check for gone clients
+    TURN_LOCK_BACKEND: str = "memory"  # memory (per worker) | postgres (advisory locks)
+    TURN_LOCK_TIMEOUT_SECONDS: float = 120.0  # Max wait for the session's previous turn (0 = none)
+    STREAM_CHECKPOINT_INTERVAL_SECONDS: float = 1.0  # How often a reply's text is stored
+    STREAM_RESUME_IDLE_SECONDS: float = 120.0  # Resumes stop following stalled checkpoints
+    # Replies still "streaming" this long after they started were left by a crashed worker and
+    # are marked "error"; keep above the generation timeouts (0 = never)
+    STREAM_STALE_AFTER_SECONDS: float = 900.0
+
+    # Idempotency-Key support for sending messages (results kept per worker process)
+    IDEMPOTENCY_TTL_SECONDS: float = 86400.0  # How long a completed result can be replayed
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000  # Oldest results are dropped beyond this
+
+    # Generation caps per user tier; a reply's limits are clamped to them (missing = no cap).
+    # Without a deadline_seconds cap, only OLLAMA_GENERATION_TIMEOUT_SECONDS bounds a reply
+    GENERATION_TIERS: dict[str, dict[str, float]] = Field(
+        default={"default": {"max_tokens": 2048, "context_tokens": 8192}}
+    )
+    GENERATION_DEFAULT_TIER: str = "default"  # Caps for users whose tier is not listed
+
+    # Batch inference (POST /chat/batch)
+    BATCH_MAX_ITEMS: int = 1000
+    BATCH_CONCURRENCY: int = 4  # Generations running at once per batch
+    BATCH_FLUSH_SIZE: int = 100  # Max finished items stored per commit
+
+    # Model routing between a fast and a large model (disabled: always OLLAMA_MODEL)
+    MODEL_ROUTING_ENABLED: bool = False
+    MODEL_ROUTING_SMALL_MODEL: str | None = None  # Defaults to OLLAMA_MODEL_DEV
+    MODEL_ROUTING_LARGE_MODEL: str | None = None  # Defaults to OLLAMA_MODEL_PROD
+    MODEL_ROUTING_MAX_SMALL_PROMPT_CHARS: int = 500  # Longer prompts go to the large model
+    MODEL_ROUTING_MAX_SMALL_HISTORY: int = 12  # Longer conversations go to the large model
+    MODEL_ROUTING_LARGE_MAX_LATENCY_SECONDS: float = 30.0  # Shed to small model when slower
+    MODEL_ROUTING_LARGE_MAX_INFLIGHT: int = 4  # Shed to small model at this many turns
+    MODEL_ROUTING_ALLOWED_MODELS: list[str] = Field(default=[])  # Session overrides, [] = routed
+
+    # Background jobs (automatic titles and other non-critical LLM work)
+    BACKGROUND_JOB_CONCURRENCY: int = 1
+    BACKGROUND_JOB_MAX_ATTEMPTS: int = 3
+    BACKGROUND_JOB_RETRY_DELAY_SECONDS: float = 5.0  # Doubled after each failed attempt
+    BACKGROUND_JOB_MAX_QUEUE_SIZE: int = 1000
+    BACKGROUND_JOB_MAX_DEFER_SECONDS: float = 30.0  # Max wait for interactive chat to go idle
+    TITLE_GENERATION_ENABLED: bool = True
+
+    # Retrieval memory: send recent messages plus older ones relevant to the new message
+    MEMORY_ENABLED: bool = False
+    MEMORY_EMBEDDING_MODEL: str = "nomic-embed-text"
+    MEMORY_EMBED_TIMEOUT_SECONDS: float = 30.0
+    MEMORY_RECENT_MESSAGES: int = 8  # Always sent, older messages only when recalled
+    MEMORY_TOP_K: int = 4  # Older exchanges recalled per turn
+    MEMORY_MAX_CACHED_SESSIONS: int = 256  # Session indexes kept in memory per worker
+
+    # Monthly partitions of the messages table (PostgreSQL)
+    MESSAGE_PARTITION_MONTHS_AHEAD: int = 3  # Partitions created beyond the current month
+    MESSAGE_PARTITION_MAINTENANCE_INTERVAL_SECONDS: int = 86400  # 0 = off
+    MESSAGE_RETENTION_MONTHS: int = 0  # Months kept before the current one (0 = keep all)
+    MESSAGE_RETENTION_MODE: str = "archive"  # archive (move to messages_archive) | drop
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def OLLAMA_BACKENDS(self) -> list[str]:
+        """Ollama hosts requests are balanced over."""
+        return self.OLLAMA_BASE_URLS or [self.OLLAMA_BASE_URL]
 
     # Environment
     ENVIRONMENT: str = "development"  # development | staging | production
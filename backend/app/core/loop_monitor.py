@@ -0,0 +1,280 @@
+"""Event loop lag and blocking call detection.
+
+Synchronous work inside `async def` code (the sync database session, bcrypt,
+serializing a large response) stops every other request of the worker while it
+runs. `LOOP_MONITOR_MODE` selects how it is found:
+
+- `sample` (production): a heartbeat task wakes every
+  `LOOP_MONITOR_INTERVAL_SECONDS` and records how late it woke in
+  `event_loop_lag_seconds`. A watchdog thread notices when the heartbeat is
+  overdue by `LOOP_BLOCK_THRESHOLD_MS` and samples the stack of the loop thread
+  once, so the block is logged with the task and the code that caused it.
+- `debug`: times every callback the loop runs instead, and logs each one over
+  the threshold with its coroutine, request and a stack sample, at a few
+  microseconds per callback. Needs the asyncio loop (`uvicorn --loop
+  asyncio`); uvloop runs callbacks natively.
+
+`CallbackTimer` also lets tests fail when an endpoint blocks the loop for
+longer than a budget (`tests/loop_blocking.py`).
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections.abc import Callable
+from contextlib import suppress
+from dataclasses import dataclass, field
+from types import FrameType
+from typing import Any
+
+from app.core.config import settings
+from app.core.logging import request_id
+from app.core.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+event_loop_lag = metrics.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran the monitor's heartbeat",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+event_loop_blocks = metrics.counter(
+    "event_loop_blocks_total",
+    "Times the event loop was blocked longer than LOOP_BLOCK_THRESHOLD_MS, by coroutine",
+    ["coroutine"],
+)
+
+STACK_FRAMES = 20  # Innermost frames kept in a blocked call's stack
+
+
+@dataclass
+class BlockedCall:
+    """Code that kept the event loop from running anything else."""
+
+    duration_ms: float
+    task: str | None = None
+    coroutine: str | None = None
+    request_id: str | None = None
+    stack: list[str] = field(default_factory=list)  # Sampled while blocked, outermost first
+
+    def describe(self) -> str:
+        where = self.coroutine or "unknown code"
+        if self.task:
+            where = f"{where} (task {self.task})"
+        return f"{self.duration_ms:.0f} ms in {where}" + "".join(
+            f"\n    {line}" for line in self.stack
+        )
+
+
+def _frame_stack(frame: FrameType | None) -> list[str]:
+    entries = traceback.extract_stack(frame, limit=STACK_FRAMES) if frame else []
+    return [f"{entry.filename}:{entry.lineno} in {entry.name}" for entry in entries]
+
+
+def _coroutine_name(task: asyncio.Task) -> str:
+    coro = task.get_coro()
+    return getattr(coro, "__qualname__", None) or type(coro).__name__
+
+
+def _report(call: BlockedCall) -> None:
+    event_loop_blocks.inc(coroutine=call.coroutine or "unknown")
+    logger.warning(
+        "Event loop blocked for %s",
+        call.describe(),
+        extra={
+            "blocked_ms": round(call.duration_ms, 1),
+            "task": call.task,
+            "coroutine": call.coroutine,
+            "request_id": call.request_id,
+        },
+    )
+
+
+_original_run = asyncio.Handle._run
+_timers: list["CallbackTimer"] = []
+# Callbacks being run, by thread: [start time, stack sampled while over the threshold]
+_running: dict[int, list[Any]] = {}
+_sampler: threading.Thread | None = None
+_sampler_stopping = threading.Event()
+
+
+def _timed_run(handle: asyncio.Handle) -> None:
+    thread_id = threading.get_ident()
+    started = time.perf_counter()
+    _running[thread_id] = entry = [started, None]
+    try:
+        _original_run(handle)
+    finally:
+        del _running[thread_id]
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        for timer in _timers:
+            if elapsed_ms >= timer.threshold_ms:
+                timer._blocked(handle, elapsed_ms, entry[1] or [])
+
+
+def _sample_stacks() -> None:
+    """Take one stack sample of each callback still running past the lowest threshold."""
+    while _timers:
+        threshold = min(timer.threshold_ms for timer in _timers) / 1000
+        if _sampler_stopping.wait(max(threshold / 2, 0.005)):
+            return
+        now = time.perf_counter()
+        frames = None
+        for thread_id, entry in list(_running.items()):
+            if entry[1] is None and now - entry[0] >= threshold:
+                frames = frames or sys._current_frames()
+                entry[1] = _frame_stack(frames.get(thread_id))
+
+
+class CallbackTimer:
+    """Time the callbacks of asyncio loops and report those over a threshold.
+
+    While installed, every `Handle` run by any asyncio event loop of the process
+    is timed, and a thread samples the stack of callbacks still running past the
+    threshold. A task's step is attributed to its coroutine and the request it
+    serves.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        on_block: Callable[[BlockedCall], None],
+        loop: asyncio.AbstractEventLoop | None = None,
+    ) -> None:
+        self.threshold_ms = threshold_ms
+        self.on_block = on_block
+        self.loop = loop  # Only time this loop's callbacks; None = every loop
+
+    def install(self) -> None:
+        global _sampler
+        if self not in _timers:
+            _timers.append(self)
+        asyncio.Handle._run = _timed_run  # type: ignore[method-assign]
+        if _sampler is None:
+            _sampler_stopping.clear()
+            _sampler = threading.Thread(target=_sample_stacks, name="loop-sampler", daemon=True)
+            _sampler.start()
+
+    def uninstall(self) -> None:
+        global _sampler
+        if self in _timers:
+            _timers.remove(self)
+        if not _timers:
+            asyncio.Handle._run = _original_run  # type: ignore[method-assign]
+            if _sampler is not None:
+                _sampler_stopping.set()
+                _sampler.join()
+                _sampler = None
+
+    def __enter__(self) -> "CallbackTimer":
+        self.install()
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.uninstall()
+
+    def _blocked(self, handle: asyncio.Handle, elapsed_ms: float, stack: list[str]) -> None:
+        if self.loop is not None and handle._loop is not self.loop:  # type: ignore[attr-defined]
+            return
+        callback = handle._callback  # type: ignore[attr-defined]
+        # Task steps are scheduled as a method (or C wrapper) bound to the task
+        task = getattr(callback, "__self__", None)
+        if isinstance(task, asyncio.Task):
+            call = BlockedCall(
+                elapsed_ms,
+                task=task.get_name(),
+                coroutine=_coroutine_name(task),
+                request_id=handle._context.get(request_id),  # type: ignore[attr-defined]
+                stack=stack,
+            )
+        else:
+            call = BlockedCall(
+                elapsed_ms, coroutine=getattr(callback, "__qualname__", None), stack=stack
+            )
+        self.on_block(call)
+
+
+class LoopMonitor:
+    """Measure the worker's event loop lag and report what blocks it."""
+
+    def __init__(self) -> None:
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread_id: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stopping = threading.Event()
+        self._timer: CallbackTimer | None = None
+        self._beat = 0.0
+        self._sample: BlockedCall | None = None
+
+    async def start(self) -> None:
+        """Start the heartbeat, and the watchdog thread or callback timing."""
+        mode = settings.LOOP_MONITOR_MODE
+        if self._task is not None or mode == "off":
+            return
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stopping.clear()
+        self._task = asyncio.create_task(self._run(), name="loop-monitor")
+        if mode == "debug":
+            self._timer = CallbackTimer(settings.LOOP_BLOCK_THRESHOLD_MS, _report, self._loop)
+            self._timer.install()
+        else:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Stop monitoring."""
+        if self._timer is not None:
+            self._timer.uninstall()
+            self._timer = None
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._watchdog is not None:
+            self._stopping.set()
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _run(self) -> None:
+        interval = settings.LOOP_MONITOR_INTERVAL_SECONDS
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(interval)
+            self._beat = time.monotonic()
+            lag = max(0.0, self._beat - before - interval)
+            event_loop_lag.observe(lag)
+            sample, self._sample = self._sample, None
+            if sample is not None:
+                # The heartbeat was due when the block was sampled, so it is at least this long
+                sample.duration_ms = lag * 1000
+                _report(sample)
+
+    def _watch(self) -> None:
+        """Sample the loop thread's stack once per block, from outside the loop."""
+        interval = settings.LOOP_MONITOR_INTERVAL_SECONDS
+        threshold = settings.LOOP_BLOCK_THRESHOLD_MS / 1000
+        sampled_beat = None
+        while not self._stopping.wait(max(threshold / 2, 0.005)):
+            beat = self._beat
+            if beat == sampled_beat or time.monotonic() - beat - interval < threshold:
+                continue
+            sampled_beat = beat
+            frame = sys._current_frames().get(self._thread_id)  # type: ignore[arg-type]
+            task = asyncio.current_task(self._loop)
+            self._sample = BlockedCall(
+                threshold * 1000,
+                task=task.get_name() if task else None,
+                coroutine=_coroutine_name(task) if task else None,
+                stack=_frame_stack(frame),
+            )
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,361 @@
+"""Token-bucket rate limiting per user and per client IP.
+
+Every API request is charged against the caller's IP bucket and, when it
+carries a bearer token, the user's bucket. Both are checked before either is
+charged, so a request one bucket rejects costs the other nothing. Routes cost
+different amounts of tokens (`RATE_LIMIT_ROUTE_COSTS`), so expensive routes
+such as login (bcrypt) and sending a message (LLM generation) drain buckets
+faster.
+
+The in-memory backend keeps buckets per worker process and answers in about a
+microsecond. The database backend shares buckets between workers with one
+transaction per check; callers it has just rejected are rejected locally
+until their tokens refill, so clients hammering the API cost no queries.
+
+`RateLimitHeadersMiddleware` adds the `RateLimit-*` headers of the check to
+every response, including the streamed ones endpoints build themselves.
+"""
+
+import math
+import time
+from collections import OrderedDict
+from collections.abc import Mapping, Sequence
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Protocol
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.security import decode_token
+
+
+rate_limit_decisions = metrics.counter(
+    "rate_limit_decisions_total",
+    "Rate limit checks by bucket scope and outcome",
+    ["scope", "outcome"],
+)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """Bucket size and how fast it refills."""
+
+    capacity: float
+    refill_per_second: float
+
+
+@dataclass(frozen=True)
+class RateLimitDecision:
+    """Outcome of charging a request against a bucket."""
+
+    allowed: bool
+    limit: float
+    remaining: float
+    retry_after: float  # Seconds until the request would be allowed, 0 when allowed
+    reset_after: float  # Seconds until the bucket is full again
+
+    def headers(self) -> dict[str, str]:
+        """`RateLimit-*` response headers, plus `Retry-After` when rejected."""
+        headers = {
+            "RateLimit-Limit": str(int(self.limit)),
+            "RateLimit-Remaining": str(max(0, math.floor(self.remaining))),
+            "RateLimit-Reset": str(math.ceil(self.reset_after)),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+def _decide(limit: RateLimit, tokens: float, cost: float, allowed: bool) -> RateLimitDecision:
+    """Build a decision from the tokens left in a bucket after a check."""
+    rate = limit.refill_per_second
+    return RateLimitDecision(
+        allowed=allowed,
+        limit=limit.capacity,
+        remaining=tokens,
+        retry_after=0.0 if allowed else max(0.0, cost - tokens) / rate,
+        reset_after=max(0.0, limit.capacity - tokens) / rate,
+    )
+
+
+class RateLimitBackend(Protocol):
+    """Storage for token buckets."""
+
+    blocking: bool  # Whether `take_all` does I/O and must run off the event loop
+
+    def take_all(
+        self, buckets: Sequence[tuple[str, RateLimit]], cost: float
+    ) -> dict[str, RateLimitDecision]:
+        """Refill buckets, then take `cost` tokens from each if all of them have enough.
+
+        Returns a decision per bucket key, allowed when that bucket had enough
+        tokens. A backend may answer only for a bucket it rejects without
+        looking at the others.
+        """
+        ...
+
+
+class MemoryRateLimitBackend:
+    """Buckets in this worker's memory, the least recently used dropped past `max_keys`."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        # key -> (tokens, updated_at), least recently used first
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def take(self, key: str, cost: float, limit: RateLimit) -> RateLimitDecision:
+        """Refill a bucket, then take `cost` tokens from it if it has enough."""
+        return self.take_all([(key, limit)], cost)[key]
+
+    def take_all(
+        self, buckets: Sequence[tuple[str, RateLimit]], cost: float
+    ) -> dict[str, RateLimitDecision]:
+        now = time.monotonic()
+        refilled = []
+        for key, limit in buckets:
+            tokens, updated_at = self._buckets.get(key, (limit.capacity, now))
+            refilled.append(
+                min(limit.capacity, tokens + (now - updated_at) * limit.refill_per_second)
+            )
+        charge = all(tokens >= cost for tokens in refilled)
+
+        decisions = {}
+        for (key, limit), tokens in zip(buckets, refilled, strict=True):
+            left = tokens - cost if charge else tokens
+            if key in self._buckets:
+                self._buckets.move_to_end(key)
+            elif len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)  # Only forgets spent tokens, never over-restricts
+            self._buckets[key] = (left, now)
+            decisions[key] = _decide(limit, left, cost, tokens >= cost)
+        return decisions
+
+
+class DatabaseRateLimitBackend:
+    """Buckets in the `rate_limit_buckets` table, shared by every worker.
+
+    Works on PostgreSQL and SQLite. Rows untouched for `prune_after` seconds
+    are deleted from time to time.
+    """
+
+    blocking = True
+
+    def __init__(self, engine: Engine, prune_after: float = 3600.0) -> None:
+        from app.models.rate_limit import RateLimitBucket
+
+        self.engine = engine
+        self.prune_after = prune_after
+        self.table: sa.Table = RateLimitBucket.__table__  # type: ignore[attr-defined]
+        self._rejected_until: dict[str, tuple[float, RateLimitDecision]] = {}
+        self._next_prune = 0.0
+
+    def _insert(self) -> sa.Insert:
+        if self.engine.dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(self.table)
+
+    def take(self, key: str, cost: float, limit: RateLimit) -> RateLimitDecision:
+        """Refill a bucket, then take `cost` tokens from it if it has enough."""
+        return self.take_all([(key, limit)], cost)[key]
+
+    def take_all(
+        self, buckets: Sequence[tuple[str, RateLimit]], cost: float
+    ) -> dict[str, RateLimitDecision]:
+        now = time.time()
+        for key, _limit in buckets:
+            rejected = self._rejected_until.get(key)
+            if rejected is not None and now < rejected[0]:
+                return {key: rejected[1]}
+
+        c = self.table.c
+        keys = [key for key, _limit in buckets]
+        with self.engine.begin() as connection:
+            # Writing first takes SQLite's write lock; on PostgreSQL the rows are locked below
+            connection.execute(
+                self._insert()
+                .values(
+                    [
+                        {"key": key, "tokens": limit.capacity, "updated_at": now, "allowed": True}
+                        for key, limit in buckets
+                    ]
+                )
+                .on_conflict_do_nothing(index_elements=[c.key])
+            )
+            stored = {
+                row.key: row
+                for row in connection.execute(
+                    sa.select(c.key, c.tokens, c.updated_at)
+                    .where(c.key.in_(keys))
+                    .with_for_update()
+                )
+            }
+            refilled = [
+                min(
+                    limit.capacity,
+                    stored[key].tokens + (now - stored[key].updated_at) * limit.refill_per_second,
+                )
+                for key, limit in buckets
+            ]
+            charge = all(tokens >= cost for tokens in refilled)
+            left = [tokens - cost if charge else tokens for tokens in refilled]
+            connection.execute(
+                sa.update(self.table)
+                .where(c.key == sa.bindparam("bucket"))
+                .values(tokens=sa.bindparam("left"), updated_at=now, allowed=charge),
+                [{"bucket": key, "left": tokens} for key, tokens in zip(keys, left, strict=True)],
+            )
+            if now >= self._next_prune:
+                self._next_prune = now + self.prune_after
+                connection.execute(
+                    sa.delete(self.table).where(c.updated_at < now - self.prune_after)
+                )
+                # Forget local rejections that have run out, of callers that never came back
+                self._rejected_until = {
+                    k: entry for k, entry in list(self._rejected_until.items()) if entry[0] > now
+                }
+
+        decisions = {}
+        for (key, limit), tokens, before in zip(buckets, left, refilled, strict=True):
+            decision = decisions[key] = _decide(limit, tokens, cost, before >= cost)
+            if decision.allowed:
+                self._rejected_until.pop(key, None)
+            else:
+                self._rejected_until[key] = (now + decision.retry_after, decision)
+        return decisions
+
+
+class RateLimiter:
+    """Charge requests against per-user and per-IP token buckets."""
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        user_limit: RateLimit,
+        ip_limit: RateLimit,
+        route_costs: Mapping[str, float],
+        default_cost: float = 1.0,
+    ) -> None:
+        self.backend = backend
+        self.user_limit = user_limit
+        self.ip_limit = ip_limit
+        self.route_costs = dict(route_costs)
+        self.default_cost = default_cost
+
+    def cost(self, route: str) -> float:
+        """Tokens a request to `route` ("METHOD /path/{param}") costs."""
+        return self.route_costs.get(route, self.default_cost)
+
+    async def check(self, route: str, user: str | None, ip: str | None) -> RateLimitDecision | None:
+        """Charge a request and return the most restrictive decision.
+
+        Neither bucket is charged unless both let the request through.
+        """
+        cost = self.cost(route)
+        if cost <= 0:
+            return None
+
+        checks = []
+        if ip is not None:
+            checks.append(("ip", f"ip:{ip}", self.ip_limit))
+        if user is not None:
+            checks.append(("user", f"user:{user}", self.user_limit))
+        if not checks:
+            return None
+
+        buckets = [(key, limit) for _scope, key, limit in checks]
+        if self.backend.blocking:
+            results = await run_in_threadpool(self.backend.take_all, buckets, cost)
+        else:
+            results = self.backend.take_all(buckets, cost)
+
+        decision = None
+        for scope, key, _limit in checks:
+            if (result := results.get(key)) is None:
+                continue  # Not looked at, another bucket was rejected
+            rate_limit_decisions.inc(
+                scope=scope, outcome="allowed" if result.allowed else "rejected"
+            )
+            if not result.allowed:
+                return result
+            if (
+                decision is None
+                or result.remaining / result.limit < decision.remaining / decision.limit
+            ):
+                decision = result
+        return decision
+
+
+@lru_cache(maxsize=4096)
+def token_subject(token: str) -> str | None:
+    """User id in a bearer token, used only to pick the user's bucket.
+
+    Cached because decoding a JWT costs more than the rate limit check itself.
+    Authentication still validates the token on every request.
+    """
+    payload = decode_token(token)
+    return str(payload["sub"]) if payload and payload.get("sub") else None
+
+
+# Headers for the current response, filled in by the rate limit dependency
+rate_limit_headers: ContextVar[dict[str, str] | None] = ContextVar(
+    "rate_limit_headers", default=None
+)
+
+
+class RateLimitHeadersMiddleware:
+    """Add the `RateLimit-*` headers of the request's check to its response."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers: dict[str, str] = {}
+        token = rate_limit_headers.set(headers)
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start" and headers:
+                message["headers"] = [
+                    *message.get("headers", []),
+                    *(
+                        (name.lower().encode("latin-1"), value.encode())
+                        for name, value in headers.items()
+                    ),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            rate_limit_headers.reset(token)
+
+
+def _create_backend() -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "database":
+        from app.db.session import engine
+
+        return DatabaseRateLimitBackend(engine)
+    return MemoryRateLimitBackend()
+
+
+rate_limiter = RateLimiter(
+    backend=_create_backend(),
+    user_limit=RateLimit(
+        settings.RATE_LIMIT_USER_CAPACITY, settings.RATE_LIMIT_USER_REFILL_PER_SECOND
+    ),
+    ip_limit=RateLimit(settings.RATE_LIMIT_IP_CAPACITY, settings.RATE_LIMIT_IP_REFILL_PER_SECOND),
+    route_costs=settings.RATE_LIMIT_ROUTE_COSTS,
+)
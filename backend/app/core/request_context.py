@@ -0,0 +1,161 @@
+"""Request ids and per-request SQL and LLM timings, with slow-request capture.
+
+`RequestContextMiddleware` gives every request an id (the client's
+`X-Request-ID` when it sends a usable one) that is returned in the response and
+added to every log record written while handling the request. It also counts
+the time the request spent in SQL statements and LLM calls; requests slower
+than `SLOW_REQUEST_THRESHOLD_MS` are logged with those timings and their
+slowest statements.
+"""
+
+import logging
+import re
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.logging import request_id
+
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_STATEMENTS = 5  # Statements listed in a slow request log
+STATEMENT_CHARS = 300  # Statements are cut to this length
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+@dataclass
+class RequestTimings:
+    """Where a request spent its time; updated from the event loop and threadpool."""
+
+    sql_ms: float = 0.0
+    sql_statements: int = 0
+    llm_ms: float = 0.0
+    llm_calls: int = 0
+    slowest_sql: list[tuple[float, str]] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add_sql(self, milliseconds: float, statement: str) -> None:
+        with self._lock:
+            self.sql_ms += milliseconds
+            self.sql_statements += 1
+            if len(self.slowest_sql) < SLOWEST_STATEMENTS or milliseconds > self.slowest_sql[-1][0]:
+                self.slowest_sql.append((milliseconds, statement[:STATEMENT_CHARS]))
+                self.slowest_sql.sort(key=lambda entry: entry[0], reverse=True)
+                del self.slowest_sql[SLOWEST_STATEMENTS:]
+
+    def add_llm(self, milliseconds: float) -> None:
+        with self._lock:
+            self.llm_ms += milliseconds
+            self.llm_calls += 1
+
+
+request_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def record_llm_call(seconds: float) -> None:
+    """Count an LLM call against the current request, if any."""
+    timings = request_timings.get()
+    if timings is not None:
+        timings.add_llm(seconds * 1000)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn: Any, *_args: Any) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+    started = conn.info["query_started"].pop()
+    timings = request_timings.get()
+    if timings is not None:
+        timings.add_sql((time.perf_counter() - started) * 1000, statement)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context: Any) -> None:
+    # A failed statement never reaches after_cursor_execute
+    connection = context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+class RequestContextMiddleware:
+    """Assign request ids and log slow requests with their SQL and LLM timings."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        current_id = incoming if _VALID_REQUEST_ID.match(incoming) else uuid4().hex
+        timings = RequestTimings()
+        id_token = request_id.set(current_id)
+        timings_token = request_timings.set(timings)
+        status_code = 0
+        started = time.perf_counter()
+
+        async def send_with_id(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = [
+                    *message["headers"],
+                    (b"x-request-id", current_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            threshold = settings.SLOW_REQUEST_THRESHOLD_MS
+            # WebSocket connections last as long as the chat, only HTTP requests can be slow
+            if scope["type"] == "http" and threshold and elapsed_ms >= threshold:
+                _log_slow_request(scope, status_code, elapsed_ms, timings)
+            request_timings.reset(timings_token)
+            request_id.reset(id_token)
+
+
+def _log_slow_request(
+    scope: Scope, status_code: int, elapsed_ms: float, timings: RequestTimings
+) -> None:
+    logger.warning(
+        "Slow request %s %s took %.0f ms (SQL %.0f ms in %d statements, LLM %.0f ms in %d calls)",
+        scope["method"],
+        scope["path"],
+        elapsed_ms,
+        timings.sql_ms,
+        timings.sql_statements,
+        timings.llm_ms,
+        timings.llm_calls,
+        extra={
+            "request_id": request_id.get(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(elapsed_ms, 1),
+            "sql_ms": round(timings.sql_ms, 1),
+            "sql_statements": timings.sql_statements,
+            "llm_ms": round(timings.llm_ms, 1),
+            "llm_calls": timings.llm_calls,
+            "slowest_sql": [
+                {"ms": round(ms, 1), "statement": statement}
+                for ms, statement in timings.slowest_sql
+            ],
+        },
+    )
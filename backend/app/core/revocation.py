@@ -0,0 +1,176 @@
+"""Token revocation checked without a database query per request.
+
+Access and refresh tokens carry a token id (`jti`). Revoking a token stores its
+id in `revoked_tokens` until the token expires. Every worker keeps the revoked
+ids in a Bloom filter, so checking a token costs a few hash probes however many
+tokens are revoked; the database is only asked about ids the filter reports,
+i.e. revoked tokens and a small share (`TOKEN_REVOCATION_FILTER_ERROR_RATE`) of
+valid ones.
+
+Workers pick up each other's revocations every `TOKEN_REVOCATION_SYNC_SECONDS`.
+Every `TOKEN_REVOCATION_PRUNE_SECONDS` expired rows are deleted and
+the filter is rebuilt from the rows left, since a Bloom filter cannot forget.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections.abc import Iterator
+from contextlib import suppress
+from uuid import UUID
+
+from sqlalchemy import delete, func
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, col, select
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.session import engine
+from app.models.revoked_token import RevokedToken
+
+
+logger = logging.getLogger(__name__)
+
+revocation_checks = metrics.counter(
+    "token_revocation_checks_total",
+    "Token revocation checks by result (clear: answered by the filter alone)",
+    ["result"],
+)
+revoked_cached = metrics.gauge("token_revocation_filter_entries", "Revoked token ids in the filter")
+
+# Revocations committed while a sync ran can carry an earlier timestamp than the
+# sync's start; re-reading a window makes sure they are not skipped
+SYNC_OVERLAP_SECONDS = 60.0
+
+
+class BloomFilter:
+    """Set membership with false positives but no false negatives, in fixed memory."""
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        capacity = max(1, capacity)
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str) -> Iterator[int]:
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "big")
+        second = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key)
+        )
+
+
+class RevocationList:
+    """Revoked token ids: stored in the database, screened by a Bloom filter per worker."""
+
+    def __init__(self, engine: Engine, capacity: int, error_rate: float) -> None:
+        self.engine = engine
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filter = BloomFilter(capacity, error_rate)
+        self._synced_at: float | None = None
+        self._task: asyncio.Task | None = None
+        revoked_cached.set_function(lambda: self._filter.count)
+
+    def is_revoked(self, session: Session, jti: str) -> bool:
+        """Whether a token id was revoked; queries `session` only on a filter hit."""
+        if jti not in self._filter:
+            revocation_checks.inc(result="clear")
+            return False
+        revoked = session.get(RevokedToken, jti) is not None
+        revocation_checks.inc(result="revoked" if revoked else "false_positive")
+        return revoked
+
+    def revoke(self, session: Session, jti: str, user_id: UUID, expires_at: float) -> None:
+        """Add a token id to the session's transaction; the caller commits."""
+        session.merge(
+            RevokedToken(jti=jti, user_id=user_id, expires_at=expires_at, revoked_at=time.time())
+        )
+        # Before the commit is fine: a filter hit is always confirmed in the database
+        self._filter.add(jti)
+
+    def sync(self) -> int:
+        """Add the revocations other workers made since the last sync."""
+        started = time.time()
+        statement = select(RevokedToken.jti).where(RevokedToken.expires_at > started)
+        if self._synced_at is not None:
+            statement = statement.where(
+                RevokedToken.revoked_at >= self._synced_at - SYNC_OVERLAP_SECONDS
+            )
+        with Session(self.engine) as session:
+            jtis = list(session.exec(statement))
+        for jti in jtis:
+            if jti not in self._filter:
+                self._filter.add(jti)
+        self._synced_at = started
+        return len(jtis)
+
+    def rebuild(self) -> int:
+        """Delete expired revocations and rebuild the filter from the rest."""
+        started = time.time()
+        with Session(self.engine) as session:
+            session.execute(delete(RevokedToken).where(col(RevokedToken.expires_at) <= started))
+            session.commit()
+            count = session.exec(select(func.count()).select_from(RevokedToken)).one()
+            # Room to grow until the next rebuild without raising the error rate
+            rebuilt = BloomFilter(max(self.capacity, count * 2), self.error_rate)
+            for jti in session.exec(select(RevokedToken.jti)):
+                rebuilt.add(jti)
+        self._filter = rebuilt
+        self._synced_at = started
+        return count
+
+    async def start(self) -> None:
+        """Load the revoked ids, then keep them in sync in the background."""
+        try:
+            await run_in_threadpool(self.rebuild)
+        except Exception as e:
+            logger.warning("Could not load revoked tokens: %s", e)
+        if self._task is None and settings.TOKEN_REVOCATION_SYNC_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop syncing."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        last_rebuild = time.monotonic()
+        while True:
+            await asyncio.sleep(settings.TOKEN_REVOCATION_SYNC_SECONDS)
+            try:
+                if time.monotonic() - last_rebuild >= settings.TOKEN_REVOCATION_PRUNE_SECONDS:
+                    await run_in_threadpool(self.rebuild)
+                    last_rebuild = time.monotonic()
+                else:
+                    await run_in_threadpool(self.sync)
+            except Exception as e:
+                logger.warning("Token revocation sync failed: %s", e)
+
+
+revocation_list = RevocationList(
+    engine,
+    settings.TOKEN_REVOCATION_FILTER_CAPACITY,
+    settings.TOKEN_REVOCATION_FILTER_ERROR_RATE,
+)
@@ -1,6 +1,7 @@
 """Security utilities for password hashing and JWT token management."""
 
 from datetime import UTC, datetime, timedelta
+from uuid import uuid4
 
 import bcrypt
 from jose import JWTError, jwt
@@ -48,6 +49,8 @@ def create_access_token(
     to_encode.update(
         {
             "exp": expire,
+            "iat": now_ts,
+            "jti": uuid4().hex,
             "type": "access",
             "session_started_at": session_started_at or now_ts,
             "last_refresh_at": last_refresh_at or now_ts,
@@ -83,6 +86,8 @@ def create_refresh_token(
     to_encode.update(
         {
             "exp": expire,
+            "iat": now_ts,
+            "jti": uuid4().hex,
             "type": "refresh",
             "session_started_at": session_started_at or now_ts,
             "last_refresh_at": last_refresh_at or now_ts,
@@ -104,6 +109,14 @@ def decode_token(token: str) -> dict | None:
         return None
 
 
+def issued_after(payload: dict, cutoff: float | None) -> bool:
+    """Whether a token was issued after a user's `tokens_valid_after` cut-off."""
+    if cutoff is None:
+        return True
+    issued_at = payload.get("iat")
+    return issued_at is not None and issued_at >= cutoff
+
+
 def validate_session_constraints(payload: dict) -> tuple[bool, str | None]:
     """Validate session constraints from token payload.
 
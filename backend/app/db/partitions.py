@@ -0,0 +1,328 @@
+"""Monthly partitions of the messages table (PostgreSQL).
+
+`messages` is range partitioned on `created_at`, one partition per UTC month
+named `messages_yYYYYmMM`. Maintenance keeps partitions for the coming months
+in place and applies the retention policy to old ones:
+
+- new partitions are created standalone, then attached, which only takes a
+  SHARE UPDATE EXCLUSIVE lock on `messages` (reads and writes keep going)
+- expired partitions are detached with DETACH ... CONCURRENTLY, then either
+  attached to `messages_archive` or dropped
+
+DDL runs with a short `lock_timeout` so maintenance gives up instead of
+queueing behind long transactions, and under an advisory lock so only one
+worker does it at a time. There is no default partition (DETACH CONCURRENTLY
+needs that), so writers of old or future rows, like the history import, call
+`ensure_months` for the months they write first. On other databases (SQLite in tests) `messages` is a
+plain table and maintenance does nothing.
+"""
+
+import asyncio
+import logging
+import re
+from collections.abc import Iterable
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import UTC, date, datetime
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.session import chat_engines
+
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLE = "messages"
+ARCHIVE_TABLE = "messages_archive"
+MAINTENANCE_LOCK_KEY = 0x6D736773  # pg advisory lock shared by all workers
+LOCK_TIMEOUT = "5s"
+
+_PARTITION_NAME = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    """First day of the month `months` after `month`."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Name of the partition holding a month."""
+    return f"messages_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> date | None:
+    """Month held by a partition, None for names not managed here."""
+    match = _PARTITION_NAME.match(name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def month_of(moment: datetime) -> date:
+    """UTC month a timestamp falls in; naive timestamps are taken as UTC."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(UTC)
+    return moment.date().replace(day=1)
+
+
+def retention_cutoff(today: date, retention_months: int) -> date | None:
+    """First month kept by retention, None when everything is kept."""
+    if retention_months <= 0:
+        return None
+    return add_months(today.replace(day=1), -retention_months)
+
+
+def partition_bounds(month: date) -> tuple[str, str]:
+    """Range bounds of a month's partition as UTC timestamp literals."""
+    return f"{month.isoformat()} 00:00:00+00", f"{add_months(month, 1).isoformat()} 00:00:00+00"
+
+
+def expired_partitions(names: list[str], today: date, retention_months: int) -> list[str]:
+    """Partitions whose whole month lies before the retention window, oldest first.
+
+    The current month and the `retention_months` before it are kept.
+    """
+    cutoff = retention_cutoff(today, retention_months)
+    if cutoff is None:
+        return []
+    months = {name: partition_month(name) for name in names}
+    return sorted(name for name, month in months.items() if month is not None and month < cutoff)
+
+
+@dataclass
+class MaintenanceResult:
+    """Partitions changed by one maintenance run."""
+
+    created: list[str] = field(default_factory=list)
+    archived: list[str] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+
+
+def is_partitioned(connection: Connection) -> bool:
+    """Whether `messages` is a partitioned table in this database."""
+    if connection.dialect.name != "postgresql":
+        return False
+    relkind = connection.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": PARTITIONED_TABLE},
+    ).scalar()
+    return relkind == "p"
+
+
+def list_partitions(connection: Connection, table: str = PARTITIONED_TABLE) -> list[str]:
+    """Names of the partitions attached to a table."""
+    rows = connection.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+        ),
+        {"table": table},
+    )
+    return list(rows.scalars())
+
+
+def ensure_partitions(connection: Connection, today: date, months_ahead: int) -> list[str]:
+    """Create missing partitions from this month to `months_ahead` months ahead."""
+    months = [add_months(today.replace(day=1), offset) for offset in range(months_ahead + 1)]
+    return create_partitions(connection, months)
+
+
+def create_partitions(connection: Connection, months: Iterable[date]) -> list[str]:
+    """Create the partitions of the months that have none yet."""
+    existing = set(list_partitions(connection))
+    created = []
+    for month in sorted(set(months)):
+        name = partition_name(month)
+        if name in existing:
+            continue
+        lower, upper = partition_bounds(month)
+        connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {name} "
+                f"(LIKE {PARTITIONED_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            )
+        )
+        # With a matching CHECK constraint, ATTACH does not scan the table
+        connection.execute(
+            text(
+                f"ALTER TABLE {name} ADD CONSTRAINT {name}_bounds "
+                f"CHECK (created_at >= '{lower}' AND created_at < '{upper}')"
+            )
+        )
+        connection.execute(
+            text(
+                f"ALTER TABLE {PARTITIONED_TABLE} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+            )
+        )
+        connection.execute(text(f"ALTER TABLE {name} DROP CONSTRAINT {name}_bounds"))
+        created.append(name)
+    return created
+
+
+def retire_partitions(
+    connection: Connection, today: date, retention_months: int, mode: str
+) -> MaintenanceResult:
+    """Detach partitions past retention, then archive or drop them.
+
+    `connection` must be in autocommit mode: DETACH ... CONCURRENTLY cannot run
+    inside a transaction block.
+    """
+    result = MaintenanceResult()
+    _finalize_pending_detaches(connection)
+    for name in expired_partitions(list_partitions(connection), today, retention_months):
+        connection.execute(
+            text(f"ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name} CONCURRENTLY")
+        )
+        if mode == "drop":
+            connection.execute(text(f"DROP TABLE {name}"))
+            result.dropped.append(name)
+            continue
+
+        # Archived rows must not block deleting their chat session
+        for constraint in _foreign_keys(connection, name):
+            connection.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"'))
+        month = partition_month(name)
+        assert month is not None
+        lower, upper = partition_bounds(month)
+        connection.execute(
+            text(
+                f"ALTER TABLE {ARCHIVE_TABLE} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+            )
+        )
+        result.archived.append(name)
+    return result
+
+
+def _finalize_pending_detaches(connection: Connection) -> None:
+    """Complete detaches interrupted by a crash or a lock timeout."""
+    rows = connection.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:table) AND i.inhdetachpending"
+        ),
+        {"table": PARTITIONED_TABLE},
+    )
+    for name in rows.scalars().all():
+        connection.execute(
+            text(f"ALTER TABLE {PARTITIONED_TABLE} DETACH PARTITION {name} FINALIZE")
+        )
+
+
+def _foreign_keys(connection: Connection, table: str) -> list[str]:
+    rows = connection.execute(
+        text(
+            "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'f'"
+        ),
+        {"table": table},
+    )
+    return list(rows.scalars())
+
+
+def run_maintenance(
+    engine: Engine,
+    today: date | None = None,
+    months_ahead: int | None = None,
+    retention_months: int | None = None,
+    mode: str | None = None,
+) -> MaintenanceResult | None:
+    """Create upcoming partitions and apply retention once.
+
+    Returns None when `messages` is not partitioned or another worker is
+    already running maintenance. Arguments default to the settings.
+    """
+    today = today or datetime.now(UTC).date()
+    months_ahead = settings.MESSAGE_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    retention_months = (
+        settings.MESSAGE_RETENTION_MONTHS if retention_months is None else retention_months
+    )
+    mode = mode or settings.MESSAGE_RETENTION_MODE
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if not is_partitioned(connection):
+            return None
+        if not connection.execute(
+            text("SELECT pg_try_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+        ).scalar():
+            return None
+        try:
+            connection.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+            created = ensure_partitions(connection, today, months_ahead)
+            result = retire_partitions(connection, today, retention_months, mode)
+            result.created = created
+        finally:
+            connection.execute(text("RESET lock_timeout"))
+            connection.execute(
+                text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+            )
+
+    if result.created or result.archived or result.dropped:
+        logger.info(
+            "Message partitions: created %s, archived %s, dropped %s",
+            result.created,
+            result.archived,
+            result.dropped,
+        )
+    return result
+
+
+def ensure_months(engine: Engine, months: Iterable[date]) -> list[str]:
+    """Create the partitions rows of these months need before they are inserted.
+
+    Waits for a maintenance run in progress, for at most the lock timeout.
+    Returns the partitions created; does nothing where `messages` is not
+    partitioned.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if not is_partitioned(connection):
+            return []
+        connection.execute(text(f"SET lock_timeout = '{LOCK_TIMEOUT}'"))
+        try:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY})
+            try:
+                created = create_partitions(connection, months)
+            finally:
+                connection.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+                )
+        finally:
+            connection.execute(text("RESET lock_timeout"))
+    if created:
+        logger.info("Message partitions: created %s for older or newer rows", created)
+    return created
+
+
+class PartitionMaintainer:
+    """Run partition maintenance at startup and then periodically, on each database."""
+
+    def __init__(self, engines: list[Engine]) -> None:
+        self.engines = engines
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Start the maintenance loop."""
+        if self._task is None and settings.MESSAGE_PARTITION_MAINTENANCE_INTERVAL_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the maintenance loop."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            for engine in self.engines:
+                try:
+                    await run_in_threadpool(run_maintenance, engine)
+                except Exception as e:
+                    logger.warning("Message partition maintenance failed: %s", e)
+            await asyncio.sleep(settings.MESSAGE_PARTITION_MAINTENANCE_INTERVAL_SECONDS)
+
+
+partition_maintainer = PartitionMaintainer(chat_engines())
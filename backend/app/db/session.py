@@ -1,10 +1,18 @@
 """Database session management."""
 
-from collections.abc import Generator
+import functools
+import random
+import time
+from collections.abc import Callable, Generator, Iterator
+from contextlib import contextmanager
+from typing import Any
 
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlmodel import Session, create_engine
 
 from app.core.config import settings
+from app.db.shards import ShardingError, shard_for, uses_sharded_tables
 
 
 engine = create_engine(
@@ -13,8 +21,140 @@ engine = create_engine(
     pool_pre_ping=True,
 )
 
+replica_engines = [
+    create_engine(url, echo=settings.DEBUG, pool_pre_ping=True)
+    for url in settings.DATABASE_REPLICA_URLS
+]
+
+shard_engines = [
+    create_engine(url, echo=settings.DEBUG, pool_pre_ping=True)
+    for url in settings.DATABASE_SHARD_URLS
+]
+
+
+class WriteTracker:
+    """Remember users who wrote recently so their reads stay on the primary.
+
+    Replicas lag behind the primary, so a user reading right after a write
+    could otherwise miss their own changes (read-your-writes).
+    """
+
+    # Expired entries are pruned once the tracker grows past this size
+    max_entries = 10_000
+
+    def __init__(self, window_seconds: float) -> None:
+        self.window_seconds = window_seconds
+        self._sticky_until: dict[str, float] = {}
+
+    def mark(self, user_id: Any) -> None:
+        """Record a write by a user."""
+        now = time.monotonic()
+        if len(self._sticky_until) >= self.max_entries:
+            self._sticky_until = {
+                key: until for key, until in self._sticky_until.items() if until > now
+            }
+        self._sticky_until[str(user_id)] = now + self.window_seconds
+
+    def is_sticky(self, user_id: Any) -> bool:
+        """Whether a user wrote within the stickiness window."""
+        until = self._sticky_until.get(str(user_id))
+        if until is None:
+            return False
+        if until <= time.monotonic():
+            self._sticky_until.pop(str(user_id), None)
+            return False
+        return True
+
+
+write_tracker = WriteTracker(settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+class RoutingSession(Session):
+    """Session that sends read-only queries to replicas and everything else to the primary.
+
+    Queries run on a replica only inside `replica_reads()` (or a `@read_only`
+    service method), and only while neither this session nor its user
+    (`session.info["user_id"]`) has written recently.
+
+    With shards, statements on chat tables go to the shard of
+    `session.info["user_id"]` instead; shards have no replicas.
+    """
+
+    def __init__(
+        self,
+        bind: Engine = engine,
+        replicas: list[Engine] | None = None,
+        tracker: WriteTracker | None = None,
+        shards: list[Engine] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(bind=bind, **kwargs)
+        self.replicas = replica_engines if replicas is None else replicas
+        self.tracker = write_tracker if tracker is None else tracker
+        self.shards = shard_engines if shards is None else shards
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, **kwargs: Any) -> Any:
+        """Pick the engine for a statement."""
+        if kwargs.get("bind") is not None:
+            # Explicit `bind_arguments`, e.g. a query run on each shard in turn
+            return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+        if self.shards and uses_sharded_tables(mapper, clause):
+            user_id = self.info.get("user_id")
+            if user_id is None:
+                raise ShardingError("Chat data is sharded: set session.info['user_id'] first")
+            return self.shards[shard_for(user_id, len(self.shards))]
+        if self.replicas and self._replica_allowed():
+            return random.choice(self.replicas)
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+    def _replica_allowed(self) -> bool:
+        if not self.info.get("read_only") or self.info.get("wrote") or self._flushing:
+            return False
+        user_id = self.info.get("user_id")
+        return user_id is None or not self.tracker.is_sticky(user_id)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _record_flush(session: Session, _flush_context: Any) -> None:
+    """Keep the rest of the session on the primary once it has written."""
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _record_commit(session: Session) -> None:
+    """Make the writing user's next reads sticky to the primary."""
+    if session.info.get("wrote") and "user_id" in session.info:
+        session.tracker.mark(session.info["user_id"])  # type: ignore[attr-defined]
+
+
+@contextmanager
+def replica_reads(session: Session) -> Iterator[Session]:
+    """Allow queries in this block to run on a read replica."""
+    previous = session.info.get("read_only", False)
+    session.info["read_only"] = True
+    try:
+        yield session
+    finally:
+        session.info["read_only"] = previous
+
+
+def read_only(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Mark a service method (on a class with a `session` attribute) as replica-safe."""
+
+    @functools.wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        with replica_reads(self.session):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def chat_engines() -> list[Engine]:
+    """The databases holding chat data: every shard, or the primary."""
+    return shard_engines or [engine]
+
 
 def get_session() -> Generator[Session, None, None]:
     """Get a database session."""
-    with Session(engine) as session:
+    with RoutingSession(engine) as session:
         yield session
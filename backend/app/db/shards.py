@@ -0,0 +1,167 @@
+"""Horizontal sharding of chat data by user.
+
+With `DATABASE_SHARD_URLS` set, each user's chat sessions, messages and message
+embeddings live on one of those databases, picked by a jump consistent hash of
+the user id. Users, revoked tokens and rate limit buckets stay on the main
+database. `RoutingSession` picks the database of every statement from the
+tables it uses and the session's `user_id`, so services only need to say whose
+data they work on.
+
+Adding a shard moves about 1/N of the users (N = the new number of shards).
+`rebalance` moves the chat data of every user not on its shard, including
+chat data still on the main database when sharding is first turned on.
+"""
+
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import Table, delete, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.util import find_tables
+from sqlmodel import Session, col, select
+
+from app.models.chat import ChatSession, Message
+from app.models.memory import MessageEmbedding
+
+
+logger = logging.getLogger(__name__)
+
+SHARDED_TABLES = frozenset({"chat_sessions", "messages", "message_embeddings"})
+COPY_BATCH_SIZE = 1000  # Rows per INSERT when moving a user
+
+
+class ShardingError(Exception):
+    """Raised for a statement that cannot be routed to one database."""
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping and Veach): growing to n buckets moves 1/n of the keys."""
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(user_id: UUID | str, count: int) -> int:
+    """Index of the shard holding a user's chat data."""
+    digest = hashlib.blake2b(UUID(str(user_id)).bytes, digest_size=8).digest()
+    return jump_hash(int.from_bytes(digest, "big"), count)
+
+
+def uses_sharded_tables(mapper: Any = None, clause: Any = None) -> bool:
+    """Whether a statement reads or writes chat data; raises for one mixing both kinds."""
+    names = set()
+    if clause is not None:
+        names = {table.name for table in find_tables(clause, include_crud=True)}
+    if mapper is not None and isinstance(mapper.persist_selectable, Table):
+        names.add(mapper.persist_selectable.name)
+    sharded = names & SHARDED_TABLES
+    if sharded and names - SHARDED_TABLES:
+        raise ShardingError(
+            f"{', '.join(sorted(sharded))} and {', '.join(sorted(names - SHARDED_TABLES))} "
+            "are on different databases and cannot be queried together"
+        )
+    return bool(sharded)
+
+
+@dataclass
+class RebalanceResult:
+    """What a rebalance moved (or would move, in a dry run)."""
+
+    users: int = 0
+    sessions: int = 0
+    messages: int = 0
+    embeddings: int = 0
+
+
+def rebalance(
+    shards: list[Engine], sources: list[Engine] | None = None, dry_run: bool = False
+) -> RebalanceResult:
+    """Move every user's chat data to the shard it hashes to.
+
+    `sources` are searched for chat data in addition to the shards, e.g. the
+    main database when sharding is turned on. Users are moved one at a time:
+    copied to their shard in one transaction, then deleted from where they were
+    in another. A rebalance that stopped half way can simply be run again.
+    Run it with the API stopped, so no chat data is written while it moves.
+    """
+    result = RebalanceResult()
+    for source in [*shards, *(sources or [])]:
+        with Session(source) as session:
+            user_ids = list(session.exec(select(ChatSession.user_id).distinct()))
+        for user_id in user_ids:
+            target = shards[shard_for(user_id, len(shards))]
+            if target is source:
+                continue
+            moved = move_user(source, target, user_id, dry_run)
+            result.users += 1
+            result.sessions += moved.sessions
+            result.messages += moved.messages
+            result.embeddings += moved.embeddings
+            logger.info(
+                "%s chat data of user %s to %s",
+                "Would move" if dry_run else "Moved",
+                user_id,
+                target.url.render_as_string(hide_password=True),
+            )
+    return result
+
+
+def move_user(
+    source: Engine, target: Engine, user_id: UUID, dry_run: bool = False
+) -> RebalanceResult:
+    """Copy a user's chat data from `source` to `target`, then delete it from `source`."""
+    sessions = select(ChatSession.id).where(ChatSession.user_id == user_id)
+    tables = [
+        (ChatSession, select(ChatSession).where(ChatSession.user_id == user_id)),
+        (Message, select(Message).where(col(Message.chat_session_id).in_(sessions))),
+        (
+            MessageEmbedding,
+            select(MessageEmbedding).where(col(MessageEmbedding.chat_session_id).in_(sessions)),
+        ),
+    ]
+    counts = []
+    with Session(source) as reader, Session(target) as writer:
+        for model, statement in tables:
+            count = 0
+            rows = reader.execute(statement.execution_options(yield_per=COPY_BATCH_SIZE))
+            for batch in rows.scalars().partitions():
+                count += len(batch)
+                if not dry_run:
+                    writer.execute(
+                        insert_ignoring_duplicates(target, model), [_row(r) for r in batch]
+                    )
+            counts.append(count)
+        if dry_run:
+            return RebalanceResult(1, *counts)
+        writer.commit()
+
+    # Only once the copy is committed; children first, like the foreign keys need
+    with Session(source) as session:
+        session.execute(
+            delete(MessageEmbedding).where(col(MessageEmbedding.chat_session_id).in_(sessions))
+        )
+        session.execute(delete(Message).where(col(Message.chat_session_id).in_(sessions)))
+        session.execute(delete(ChatSession).where(col(ChatSession.user_id) == user_id))
+        session.commit()
+    return RebalanceResult(1, *counts)
+
+
+def insert_ignoring_duplicates(engine: Engine, model: Any) -> Any:
+    """INSERT that skips rows whose primary key already exists, where the database supports it."""
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif engine.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return insert(model)
+    return dialect_insert(model).on_conflict_do_nothing()
+
+
+def _row(instance: Any) -> dict[str, Any]:
+    return {column.key: getattr(instance, column.key) for column in instance.__table__.columns}
@@ -3,19 +3,48 @@
 from collections.abc import AsyncGenerator
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.api.router import api_router
 from app.core.config import settings
+from app.core.logging import configure_logging, stop_logging
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import metrics
+from app.core.ratelimit import RateLimitHeadersMiddleware
+from app.core.request_context import RequestContextMiddleware
+from app.core.revocation import revocation_list
+from app.db.partitions import partition_maintainer
+from app.services.background import background_jobs
+from app.services.model_router import model_router
+from app.services.ollama_pool import ollama_pool
+from app.services.streams import stale_reply_sweeper
+from app.services.warmup import warmer
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Application lifespan context manager."""
     # Startup
+    configure_logging()
+    await loop_monitor.start()
+    await ollama_pool.start()
+    await warmer.start()
+    await background_jobs.start()
+    await partition_maintainer.start()
+    await stale_reply_sweeper.start()
+    await revocation_list.start()
     yield
     # Shutdown
+    await revocation_list.stop()
+    await stale_reply_sweeper.stop()
+    await partition_maintainer.stop()
+    await background_jobs.stop()
+    await warmer.stop()
+    await ollama_pool.stop()
+    await loop_monitor.stop()
+    stop_logging()
 
 
 app = FastAPI(
@@ -34,6 +63,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Rate limit headers on every response, streamed ones included
+app.add_middleware(RateLimitHeadersMiddleware)
+
+# Request ids in logs and responses, slow request capture
+app.add_middleware(RequestContextMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 
@@ -42,3 +77,22 @@ app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 async def health_check() -> dict[str, str]:
     """Health check endpoint."""
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness_check() -> JSONResponse:
+    """Readiness endpoint, 503 until the chat models and database pool are warm."""
+    body = {
+        "status": "ready" if warmer.ready else "not_ready",
+        "models": model_router.active_models(),
+        "model_ready": warmer.model_ready,
+        "database_ready": warmer.db_ready,
+    }
+    status_code = status.HTTP_200_OK if warmer.ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return JSONResponse(body, status_code=status_code)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint() -> str:
+    """Metrics for this worker process in the Prometheus text format."""
+    return metrics.render()
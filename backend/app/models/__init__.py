@@ -1,7 +1,10 @@
 """Database models."""
 
 from app.models.chat import ChatSession, Message
+from app.models.memory import MessageEmbedding
+from app.models.rate_limit import RateLimitBucket
+from app.models.revoked_token import RevokedToken
 from app.models.user import User
 
 
-__all__ = ["ChatSession", "Message", "User"]
+__all__ = ["ChatSession", "Message", "MessageEmbedding", "RateLimitBucket", "RevokedToken", "User"]
@@ -2,10 +2,11 @@
 
 from datetime import UTC, datetime
 from enum import Enum
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Literal, NamedTuple
 from uuid import UUID, uuid4
 
 import sqlalchemy as sa
+from pydantic import computed_field
 from sqlalchemy import Enum as SAEnum
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -14,6 +15,9 @@ if TYPE_CHECKING:
     from app.models.user import User
 
 
+DEFAULT_SESSION_TITLE = "New Chat"
+
+
 class MessageRole(str, Enum):
     """Message role enum."""
 
@@ -26,6 +30,7 @@ class ChatSessionBase(SQLModel):
     """Base chat session model."""
 
     title: str | None = Field(default=None, max_length=255)
+    model_override: str | None = Field(default=None, max_length=100)
 
 
 class ChatSession(ChatSessionBase, table=True):
@@ -50,6 +55,14 @@ class ChatSessionCreate(SQLModel):
     """Schema for creating a chat session."""
 
     title: str | None = None
+    model_override: str | None = None
+
+
+class ChatSessionUpdate(SQLModel):
+    """Schema for updating a chat session (only fields that are sent are changed)."""
+
+    title: str | None = Field(default=None, max_length=255)
+    model_override: str | None = None
 
 
 class ChatSessionRead(ChatSessionBase):
@@ -77,9 +90,14 @@ class Message(SQLModel, table=True):
     """Message database model."""
 
     __tablename__ = "messages"  # type: ignore[assignment]
+    # On PostgreSQL the table is partitioned by month on created_at and its
+    # primary key is (id, created_at), see app/db/partitions.py
+    __table_args__ = (
+        sa.Index("ix_messages_chat_session_id_created_at", "chat_session_id", "created_at"),
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
-    chat_session_id: UUID = Field(foreign_key="chat_sessions.id", index=True)
+    chat_session_id: UUID = Field(foreign_key="chat_sessions.id")
     content: str
     role: MessageRole = Field(
         sa_column=sa.Column(
@@ -87,16 +105,44 @@ class Message(SQLModel, table=True):
             nullable=False,
         )
     )
+    model: str | None = Field(default=None, max_length=100)  # Model that generated the reply
+    # stop | length | cancelled | timeout | error, streaming while being generated
+    finish_reason: str | None = Field(default=None, max_length=20)
+    # Token counts and timings Ollama reported for an assistant reply
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    prompt_eval_duration_ms: int | None = None
+    eval_duration_ms: int | None = None
+    load_duration_ms: int | None = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
     # Relationships
     chat_session: ChatSession = Relationship(back_populates="messages")
 
 
+class HistoryMessage(NamedTuple):
+    """The columns of a message needed to build a prompt, read without ORM tracking."""
+
+    id: UUID
+    chat_session_id: UUID
+    role: str
+    content: str
+
+
+class GenerationLimits(SQLModel):
+    """Limits for one reply; the server clamps them to the user's caps."""
+
+    max_tokens: int | None = Field(default=None, ge=1)  # Tokens generated at most
+    context_tokens: int | None = Field(default=None, ge=256)  # Context window of the model
+    deadline_seconds: float | None = Field(default=None, gt=0)  # Reply cut off after this
+    temperature: float | None = Field(default=None, ge=0, le=2)
+
+
 class MessageCreate(SQLModel):
     """Schema for creating a message."""
 
     content: str
+    limits: GenerationLimits | None = None
 
 
 class MessageRead(SQLModel):
@@ -106,8 +152,139 @@ class MessageRead(SQLModel):
     chat_session_id: UUID
     content: str
     role: MessageRole
+    model: str | None = None
+    finish_reason: str | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    prompt_eval_duration_ms: int | None = None
+    eval_duration_ms: int | None = None
+    load_duration_ms: int | None = None
     created_at: datetime
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def tokens_per_second(self) -> float | None:
+        """Generation speed of an assistant reply."""
+        return tokens_per_second(self.completion_tokens, self.eval_duration_ms)
+
+
+def tokens_per_second(tokens: int | None, duration_ms: int | None) -> float | None:
+    """Tokens generated per second, None without timing."""
+    if not tokens or not duration_ms:
+        return None
+    return round(tokens * 1000 / duration_ms, 2)
+
+
+class ChatSessionExport(SQLModel):
+    """Chat session line of a history export."""
+
+    type: Literal["session"] = "session"
+    id: UUID
+    title: str | None = Field(default=None, max_length=255)
+    model_override: str | None = Field(default=None, max_length=100)
+    created_at: datetime
+    updated_at: datetime
+
+
+class MessageExport(SQLModel):
+    """Message line of a history export."""
+
+    type: Literal["message"] = "message"
+    session_id: UUID
+    role: MessageRole
+    content: str
+    model: str | None = Field(default=None, max_length=100)
+    finish_reason: str | None = Field(default=None, max_length=20)
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    prompt_eval_duration_ms: int | None = None
+    eval_duration_ms: int | None = None
+    load_duration_ms: int | None = None
+    created_at: datetime
+
+
+class HistoryImportRead(SQLModel):
+    """Schema for the result of a history import."""
+
+    sessions: int
+    messages: int
+
+
+class ModelUsageRead(SQLModel):
+    """Token usage and generation speed of one model."""
+
+    model: str | None
+    messages: int
+    prompt_tokens: int
+    completion_tokens: int
+    avg_prompt_tokens: float | None
+    max_prompt_tokens: int | None
+    avg_load_duration_ms: float | None
+    tokens_per_second: float | None
+
+
+class SessionUsageRead(SQLModel):
+    """Token usage of one chat session, to spot prompts that have grown long."""
+
+    session_id: UUID
+    title: str | None
+    messages: int
+    prompt_tokens: int
+    completion_tokens: int
+    max_prompt_tokens: int | None
+
+
+class UsageRead(SQLModel):
+    """Token usage of a user's assistant replies."""
+
+    models: list[ModelUsageRead]
+    sessions: list[SessionUsageRead]
+
+
+class BatchItemCreate(SQLModel):
+    """One prompt of a batch: a turn in a chat session, or stateless without a session."""
+
+    content: str
+    session_id: UUID | None = None
+    id: str | None = Field(default=None, max_length=255)  # Client reference, echoed back
+    limits: GenerationLimits | None = None
+
+
+class BatchCreate(SQLModel):
+    """Schema for a batch of prompts."""
+
+    items: list[BatchItemCreate]
+
+
+class BatchReplyRead(SQLModel):
+    """The reply to one batch item."""
+
+    message_id: UUID | None = None  # The stored reply, None for stateless prompts
+    content: str
+    model: str
+    finish_reason: str | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    eval_duration_ms: int | None = None
+
+
+class BatchErrorRead(SQLModel):
+    """Why one batch item has no reply."""
+
+    code: Literal["invalid", "not_found", "busy", "timeout", "unavailable", "failed", "not_stored"]
+    detail: str
+    retry_after: float | None = None
+
+
+class BatchItemRead(SQLModel):
+    """Result line of a batch, streamed as each item finishes."""
+
+    index: int  # Position of the item in the request
+    id: str | None = None
+    status: Literal["ok", "error"]
+    reply: BatchReplyRead | None = None
+    error: BatchErrorRead | None = None
+
 
 # Update forward references
 ChatSessionWithMessages.model_rebuild()
@@ -0,0 +1,26 @@
+"""Message embedding model."""
+
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlmodel import Field, SQLModel
+
+
+class MessageEmbedding(SQLModel, table=True):
+    """Embedding of a message, the persisted form of a session's recall index."""
+
+    __tablename__ = "message_embeddings"  # type: ignore[assignment]
+
+    message_id: UUID = Field(primary_key=True)
+    model: str = Field(primary_key=True, max_length=100)  # Embedding model that produced it
+    chat_session_id: UUID = Field(
+        sa_column=sa.Column(
+            sa.Uuid(),
+            sa.ForeignKey("chat_sessions.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+        )
+    )
+    vector: bytes = Field(
+        sa_column=sa.Column(sa.LargeBinary(), nullable=False)
+    )  # float32, unit length
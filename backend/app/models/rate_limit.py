@@ -0,0 +1,14 @@
+"""Rate limit model."""
+
+from sqlmodel import Field, SQLModel
+
+
+class RateLimitBucket(SQLModel, table=True):
+    """Token bucket shared by all workers when rate limits are kept in the database."""
+
+    __tablename__ = "rate_limit_buckets"  # type: ignore[assignment]
+
+    key: str = Field(primary_key=True, max_length=200)  # e.g. "user:<id>" or "ip:<address>"
+    tokens: float
+    updated_at: float  # Unix timestamp of the last refill
+    allowed: bool = Field(default=True)  # Whether the last request was let through
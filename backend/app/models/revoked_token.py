@@ -0,0 +1,24 @@
+"""Revoked token model."""
+
+from uuid import UUID
+
+import sqlalchemy as sa
+from sqlmodel import Field, SQLModel
+
+
+class RevokedToken(SQLModel, table=True):
+    """A token id (`jti`) that is no longer accepted, kept until the token expires."""
+
+    __tablename__ = "revoked_tokens"  # type: ignore[assignment]
+
+    jti: str = Field(primary_key=True, max_length=64)
+    user_id: UUID = Field(
+        sa_column=sa.Column(
+            sa.Uuid(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+        )
+    )
+    expires_at: float = Field(index=True)  # Unix timestamp, the row can go after this
+    revoked_at: float = Field(index=True)  # Unix timestamp, workers sync newer entries
@@ -4,6 +4,7 @@ from datetime import UTC, datetime
 from typing import TYPE_CHECKING
 from uuid import UUID, uuid4
 
+import sqlalchemy as sa
 from pydantic import EmailStr
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -27,6 +28,11 @@ class User(UserBase, table=True):
 
     id: UUID = Field(default_factory=uuid4, primary_key=True)
     hashed_password: str = Field(max_length=255)
+    # Unix timestamp; tokens issued before it are rejected (password change, logout everywhere)
+    tokens_valid_after: float | None = Field(default=None)
+    # Generation caps: the tier's from GENERATION_TIERS, then this user's own (GenerationLimits)
+    tier: str = Field(default="default", max_length=32)
+    generation_limits: dict | None = Field(default=None, sa_column=sa.Column(sa.JSON()))
     created_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(UTC))
 
@@ -49,6 +55,13 @@ class UserRead(UserBase):
     created_at: datetime
 
 
+class PasswordChange(SQLModel):
+    """Schema for changing the current user's password."""
+
+    current_password: str
+    new_password: str = Field(min_length=8, max_length=100)
+
+
 class UserLogin(SQLModel):
     """Schema for user login."""
 
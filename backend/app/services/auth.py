@@ -5,11 +5,13 @@ from uuid import UUID
 
 from sqlmodel import Session, select
 
+from app.core.revocation import revocation_list
 from app.core.security import (
     create_access_token,
     create_refresh_token,
     decode_token,
     get_password_hash,
+    issued_after,
     validate_session_constraints,
     verify_password,
 )
@@ -104,9 +106,13 @@ class AuthService:
         Returns None if:
         - Token is invalid or expired
         - Token is not a refresh token
+        - Token was revoked (logout, already used, or issued before a password change)
         - User doesn't exist or is inactive
         - Session has exceeded maximum duration (20 minutes)
         - Session has been inactive too long (5 minutes since last refresh)
+
+        The refresh token is revoked once used, so a copied refresh token stops
+        working as soon as its owner refreshes.
         """
         payload = decode_token(refresh_token)
         if not payload:
@@ -126,9 +132,19 @@ class AuthService:
         if not user_id:
             return None
 
+        jti = payload.get("jti")
+        if jti and revocation_list.is_revoked(self.session, jti):
+            return None
+
         user = self.get_user_by_id(UUID(user_id))
         if not user or not user.is_active:
             return None
+        if not issued_after(payload, user.tokens_valid_after):
+            return None
+
+        if jti:
+            self.revoke_token(payload)
+            self.session.commit()
 
         # Create new tokens with preserved session start time and updated last refresh
         session_started_at = payload.get("session_started_at")
@@ -139,3 +155,44 @@ class AuthService:
             session_started_at=session_started_at,
             last_refresh_at=now,  # Update last refresh to now
         )
+
+    def revoke_token(self, payload: dict) -> None:
+        """Revoke a decoded token until it expires; the caller commits."""
+        jti, user_id = payload.get("jti"), payload.get("sub")
+        if jti and user_id:
+            revocation_list.revoke(self.session, jti, UUID(user_id), float(payload["exp"]))
+
+    def revoke_all_tokens(self, user: User) -> None:
+        """Reject every token issued to a user so far; the caller commits."""
+        user.tokens_valid_after = datetime.now(UTC).timestamp()
+        user.updated_at = datetime.now(UTC)
+        self.session.add(user)
+
+    def logout(
+        self, user: User, access_payload: dict, refresh_token: str | None, everywhere: bool
+    ) -> None:
+        """End a login: revoke its access token and, when given, its refresh token.
+
+        With `everywhere` every token of the user is revoked, on all devices.
+        """
+        self.revoke_token(access_payload)
+        refresh_payload = decode_token(refresh_token) if refresh_token else None
+        if refresh_payload and refresh_payload.get("sub") == str(user.id):
+            self.revoke_token(refresh_payload)
+        if everywhere:
+            self.revoke_all_tokens(user)
+        self.session.commit()
+
+    def change_password(self, user: User, current_password: str, new_password: str) -> dict | None:
+        """Set a new password and revoke all existing tokens.
+
+        Returns a new pair of tokens for the caller, or None when the current
+        password is wrong.
+        """
+        if not verify_password(current_password, user.hashed_password):
+            return None
+        user.hashed_password = get_password_hash(new_password)
+        self.revoke_all_tokens(user)
+        self.session.commit()
+        self.session.refresh(user)
+        return self.create_tokens(user)
@@ -0,0 +1,219 @@
+"""In-process background jobs for non-critical LLM work.
+
+Jobs never run on the request path. They run on a bounded pool of worker tasks,
+wait for interactive chat generations to finish before starting, are retried
+with exponential backoff and are deduplicated by key (e.g. one title job per
+chat session).
+"""
+
+import asyncio
+import itertools
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable
+from contextlib import asynccontextmanager, suppress
+from dataclasses import dataclass, field
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+logger = logging.getLogger(__name__)
+
+queue_depth = metrics.gauge("background_queue_depth", "Background jobs waiting to run")
+jobs_total = metrics.counter(
+    "background_jobs_total", "Background jobs by kind and outcome", ["kind", "status"]
+)
+interactive_inflight = metrics.gauge(
+    "interactive_generations_inflight", "Interactive chat generations in progress"
+)
+
+
+class InteractiveActivity:
+    """Track in-flight interactive generations so background work can yield to them."""
+
+    def __init__(self) -> None:
+        self.inflight = 0
+        self._idle: asyncio.Event | None = None
+
+    @property
+    def idle(self) -> asyncio.Event:
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            self._idle.set()
+        return self._idle
+
+    @asynccontextmanager
+    async def track(self) -> AsyncIterator[None]:
+        """Mark an interactive generation as running for the duration of the block."""
+        self.inflight += 1
+        interactive_inflight.set(self.inflight)
+        self.idle.clear()
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            interactive_inflight.set(self.inflight)
+            if self.inflight == 0:
+                self.idle.set()
+
+    async def wait_idle(self, timeout: float) -> None:
+        """Wait until no interactive generation runs, for at most `timeout` seconds."""
+        with suppress(TimeoutError):
+            await asyncio.wait_for(self.idle.wait(), timeout)
+
+
+interactive = InteractiveActivity()
+
+
+@dataclass(order=True)
+class BackgroundJob:
+    """A unit of background work, ordered by priority then submission order."""
+
+    priority: int
+    sequence: int
+    key: str = field(compare=False)
+    kind: str = field(compare=False)
+    func: Callable[[], Awaitable[None]] = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+class BackgroundJobRunner:
+    """Bounded pool of workers consuming a priority queue of jobs."""
+
+    def __init__(
+        self,
+        concurrency: int,
+        max_attempts: int,
+        retry_base_delay: float,
+        max_queue_size: int,
+        max_defer_seconds: float,
+    ) -> None:
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.max_queue_size = max_queue_size
+        self.max_defer_seconds = max_defer_seconds
+        self._queue: asyncio.PriorityQueue[BackgroundJob] | None = None
+        self._workers: list[asyncio.Task] = []
+        self._keys: set[str] = set()
+        self._retries: dict[str, asyncio.TimerHandle] = {}
+        self._sequence = itertools.count()
+        queue_depth.set_function(lambda: self.depth)
+
+    @property
+    def depth(self) -> int:
+        """Number of jobs waiting to run, including failed jobs waiting to be retried."""
+        queued = self._queue.qsize() if self._queue is not None else 0
+        return queued + len(self._retries)
+
+    @property
+    def running(self) -> bool:
+        """Whether workers are consuming the queue."""
+        return bool(self._workers)
+
+    def submit(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[None]],
+        *,
+        kind: str = "job",
+        priority: int = 100,
+    ) -> bool:
+        """Queue a job unless one with the same key is already pending or running.
+
+        Returns False when the job was not queued (duplicate key, full queue or
+        runner not started).
+        """
+        if self._queue is None or key in self._keys:
+            jobs_total.inc(kind=kind, status="skipped")
+            return False
+        if self.depth >= self.max_queue_size:
+            jobs_total.inc(kind=kind, status="dropped")
+            return False
+
+        self._keys.add(key)
+        job = BackgroundJob(priority, next(self._sequence), key, kind, func)
+        self._queue.put_nowait(job)
+        jobs_total.inc(kind=kind, status="queued")
+        return True
+
+    async def start(self) -> None:
+        """Start the worker tasks."""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        """Cancel the workers, dropping queued jobs and pending retries."""
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            with suppress(asyncio.CancelledError):
+                await worker
+        self._workers = []
+        self._queue = None
+        self._keys.clear()
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        queue = self._queue
+        while True:
+            job = await queue.get()
+            try:
+                # Background work runs below interactive chat priority
+                await interactive.wait_idle(self.max_defer_seconds)
+                await self._run(job)
+            finally:
+                queue.task_done()
+
+    async def _run(self, job: BackgroundJob) -> None:
+        job.attempts += 1
+        started = time.monotonic()
+        try:
+            await job.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if job.attempts >= self.max_attempts:
+                logger.warning(
+                    "Background job %s failed after %d attempts: %s", job.key, job.attempts, e
+                )
+                self._keys.discard(job.key)
+                jobs_total.inc(kind=job.kind, status="failed")
+                return
+            delay = self.retry_base_delay * 2 ** (job.attempts - 1)
+            jobs_total.inc(kind=job.kind, status="retried")
+            self._retries[job.key] = asyncio.get_running_loop().call_later(
+                delay, self._requeue, job
+            )
+            return
+
+        self._keys.discard(job.key)
+        jobs_total.inc(kind=job.kind, status="succeeded")
+        logger.debug("Background job %s finished in %.2fs", job.key, time.monotonic() - started)
+
+    def _requeue(self, job: BackgroundJob) -> None:
+        self._retries.pop(job.key, None)
+        if self._queue is None:
+            return
+        if self._queue.qsize() >= self.max_queue_size:
+            logger.warning("Background queue full, dropping retry of job %s", job.key)
+            self._keys.discard(job.key)
+            jobs_total.inc(kind=job.kind, status="dropped")
+            return
+        job.sequence = next(self._sequence)
+        self._queue.put_nowait(job)
+
+
+background_jobs = BackgroundJobRunner(
+    concurrency=settings.BACKGROUND_JOB_CONCURRENCY,
+    max_attempts=settings.BACKGROUND_JOB_MAX_ATTEMPTS,
+    retry_base_delay=settings.BACKGROUND_JOB_RETRY_DELAY_SECONDS,
+    max_queue_size=settings.BACKGROUND_JOB_MAX_QUEUE_SIZE,
+    max_defer_seconds=settings.BACKGROUND_JOB_MAX_DEFER_SECONDS,
+)
@@ -0,0 +1,328 @@
+"""Batch inference: many prompts in one request, results streamed as they finish.
+
+Items are chat turns (with a `session_id`) or stateless prompts. Turns of one
+session run in order, each answered from a history with the replies before it;
+everything else runs in parallel, at most `concurrency` generations at a time.
+
+Finished turns are stored in bulk: whatever finished while the previous commit
+ran is written with one multi-row INSERT and one commit, then reported. An item
+that fails is reported with an error and stores nothing, as when sending a
+single message.
+"""
+
+import asyncio
+import logging
+from collections.abc import AsyncIterator
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from typing import Any
+from uuid import UUID, uuid4
+
+from sqlalchemy import insert, update
+from sqlalchemy.engine import Engine
+from sqlmodel import col, select
+
+from app.core.metrics import metrics
+from app.db.session import RoutingSession, replica_reads
+from app.models.chat import (
+    DEFAULT_SESSION_TITLE,
+    BatchErrorRead,
+    BatchItemCreate,
+    BatchItemRead,
+    BatchReplyRead,
+    ChatSession,
+    GenerationLimits,
+    HistoryMessage,
+    Message,
+    MessageRole,
+)
+from app.services.budgets import generation_budget
+from app.services.chat import ChatService
+from app.services.llm import Generation, LLMService, LLMTimeoutError, LLMUnavailableError
+from app.services.memory import schedule_memory_indexing
+from app.services.model_router import model_router
+from app.services.titles import schedule_title_generation
+from app.services.turns import TurnBusyError, turn_locks
+
+
+logger = logging.getLogger(__name__)
+
+batch_items = metrics.counter("chat_batch_items_total", "Batch items by outcome", ["outcome"])
+
+USAGE_COLUMNS = (
+    "prompt_tokens",
+    "completion_tokens",
+    "prompt_eval_duration_ms",
+    "eval_duration_ms",
+    "load_duration_ms",
+)
+
+
+@dataclass
+class _Finished:
+    """A batch item that is done generating, waiting to be stored and reported."""
+
+    index: int
+    item: BatchItemCreate
+    generation: Generation | None = None
+    error: BatchErrorRead | None = None
+    rows: list[dict[str, Any]] = field(default_factory=list)  # Messages to insert
+    first_turn: bool = False
+    stored: asyncio.Future[bool] | None = None
+
+    def read(self) -> BatchItemRead:
+        if self.error is not None or self.generation is None:
+            return BatchItemRead(
+                index=self.index, id=self.item.id, status="error", error=self.error
+            )
+        generation = self.generation
+        usage = generation.usage
+        return BatchItemRead(
+            index=self.index,
+            id=self.item.id,
+            status="ok",
+            reply=BatchReplyRead(
+                message_id=self.rows[-1]["id"] if self.rows else None,
+                content=generation.content,
+                model=generation.model,
+                finish_reason=generation.finish_reason,
+                prompt_tokens=usage["prompt_tokens"],
+                completion_tokens=usage["completion_tokens"],
+                eval_duration_ms=usage["eval_duration_ms"],
+            ),
+        )
+
+
+class BatchRunner:
+    """Run a user's batch of prompts."""
+
+    def __init__(
+        self,
+        bind: Engine,
+        user_id: UUID,
+        concurrency: int,
+        flush_size: int,
+        caps: GenerationLimits | None = None,
+    ) -> None:
+        self.bind = bind
+        self.user_id = user_id
+        self.caps = caps or GenerationLimits()  # Each item's limits are clamped to these
+        self.concurrency = max(1, concurrency)
+        self.flush_size = max(1, flush_size)
+        self.llm_service = LLMService()
+        self._unstored: set[UUID] = set()
+
+    async def run(self, items: list[BatchItemCreate]) -> AsyncIterator[BatchItemRead]:
+        """Yield one result per item, in the order the items finish.
+
+        Uses its own database session so the results can be streamed after the
+        request's session is gone.
+        """
+        with RoutingSession(self.bind) as session:
+            session.info["user_id"] = str(self.user_id)
+            finished: asyncio.Queue[_Finished] = asyncio.Queue()
+            tasks = self._start(session, items, finished)
+            try:
+                remaining = len(items)
+                while remaining:
+                    done = [await finished.get()]
+                    while len(done) < self.flush_size and not finished.empty():
+                        done.append(finished.get_nowait())
+                    remaining -= len(done)
+                    self._store(session, done)
+                    for result in done:
+                        batch_items.inc(outcome=result.error.code if result.error else "ok")
+                        yield result.read()
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _start(
+        self, session: RoutingSession, items: list[BatchItemCreate], finished: asyncio.Queue
+    ) -> list[asyncio.Task]:
+        """Report invalid items at once and start a task per session and per stateless prompt."""
+        sessions = self._owned_sessions(
+            session, {item.session_id for item in items if item.session_id}
+        )
+        slots = asyncio.Semaphore(self.concurrency)
+        turns: dict[UUID, list[tuple[int, BatchItemCreate]]] = {}
+        tasks = []
+        for index, item in enumerate(items):
+            if not item.content.strip():
+                finished.put_nowait(_error(index, item, "invalid", "Message content is required"))
+            elif item.session_id is None:
+                tasks.append(asyncio.create_task(self._run_prompt(index, item, slots, finished)))
+            elif item.session_id not in sessions:
+                finished.put_nowait(_error(index, item, "not_found", "Chat session not found"))
+            else:
+                turns.setdefault(item.session_id, []).append((index, item))
+        for session_id, entries in turns.items():
+            tasks.append(
+                asyncio.create_task(
+                    self._run_session(session, sessions[session_id], entries, slots, finished)
+                )
+            )
+        return tasks
+
+    def _owned_sessions(self, session: RoutingSession, ids: set[UUID]) -> dict[UUID, Any]:
+        if not ids:
+            return {}
+        statement = select(ChatSession.id, ChatSession.title, ChatSession.model_override).where(
+            col(ChatSession.id).in_(ids), ChatSession.user_id == self.user_id
+        )
+        with replica_reads(session):
+            return {row.id: row for row in session.execute(statement)}
+
+    async def _run_prompt(
+        self, index: int, item: BatchItemCreate, slots: asyncio.Semaphore, finished: asyncio.Queue
+    ) -> None:
+        # Stateless prompts are never stored, the message only builds the prompt
+        message = HistoryMessage(uuid4(), uuid4(), MessageRole.USER.value, item.content)
+        finished.put_nowait(await self._generate(index, item, [message], None, slots))
+
+    async def _run_session(
+        self,
+        session: RoutingSession,
+        chat_session: Any,
+        entries: list[tuple[int, BatchItemCreate]],
+        slots: asyncio.Semaphore,
+        finished: asyncio.Queue,
+    ) -> None:
+        """Run a session's turns in order, holding the session until they are stored."""
+        loop = asyncio.get_running_loop()
+        session_id = chat_session.id
+        reported = 0
+        try:
+            async with turn_locks.hold(session_id):
+                history = ChatService(session).get_history(session_id)
+                stored = []
+                for index, item in entries:
+                    asked_at = datetime.now(UTC)
+                    question = HistoryMessage(
+                        uuid4(), session_id, MessageRole.USER.value, item.content
+                    )
+                    result = await self._generate(
+                        index, item, [*history, question], chat_session.model_override, slots
+                    )
+                    if result.generation is not None:
+                        reply = HistoryMessage(
+                            uuid4(),
+                            session_id,
+                            MessageRole.ASSISTANT.value,
+                            result.generation.content,
+                        )
+                        result.rows = [
+                            _row(question, asked_at),
+                            _row(reply, datetime.now(UTC), result.generation),
+                        ]
+                        result.first_turn = (
+                            not history and chat_session.title == DEFAULT_SESSION_TITLE
+                        )
+                        result.stored = loop.create_future()
+                        stored.append(result.stored)
+                        history = [*history, question, reply]
+                    finished.put_nowait(result)
+                    reported += 1
+                # The next turn of the session must see these in its history
+                await asyncio.gather(*stored)
+        except TurnBusyError as e:
+            for index, item in entries:
+                finished.put_nowait(_error(index, item, "busy", str(e)))
+        except Exception:
+            logger.exception("Batch turns of session %s failed", session_id)
+            for index, item in entries[reported:]:
+                finished.put_nowait(_error(index, item, "failed", "Could not process the item"))
+
+    async def _generate(
+        self,
+        index: int,
+        item: BatchItemCreate,
+        history: list[HistoryMessage],
+        override: str | None,
+        slots: asyncio.Semaphore,
+    ) -> _Finished:
+        try:
+            async with slots:
+                decision = model_router.choose(item.content, len(history), override)
+                generation = Generation(
+                    model=decision.model,
+                    user_id=self.user_id,
+                    budget=generation_budget(self.caps, item.limits),
+                )
+                await self.llm_service.generate_response(history, generation)
+        except LLMTimeoutError as e:
+            return _error(index, item, "timeout", str(e))
+        except LLMUnavailableError as e:
+            return _error(index, item, "unavailable", str(e), e.retry_after)
+        except Exception:
+            logger.exception("Batch item %d failed", index)
+            return _error(index, item, "failed", "Could not process the item")
+        return _Finished(index, item, generation=generation)
+
+    def _store(self, session: RoutingSession, done: list[_Finished]) -> None:
+        """Insert the messages of finished turns with one INSERT and one commit."""
+        turns = [result for result in done if result.rows]
+        for result in turns:
+            if result.item.session_id in self._unstored:
+                # An earlier turn of the session was lost, this one would not follow on from it
+                result.error = BatchErrorRead(
+                    code="not_stored", detail="An earlier turn of the session was not stored"
+                )
+        pending = [result for result in turns if result.error is None]
+        if pending:
+            try:
+                session.execute(insert(Message), [row for result in pending for row in result.rows])
+                session.execute(
+                    update(ChatSession)
+                    .where(col(ChatSession.id).in_({result.item.session_id for result in pending}))
+                    .values(updated_at=datetime.now(UTC))
+                )
+                session.commit()
+            except Exception:
+                logger.exception("Could not store %d batch turns", len(pending))
+                session.rollback()
+                for result in pending:
+                    self._unstored.add(result.item.session_id)  # type: ignore[arg-type]
+                    result.error = BatchErrorRead(
+                        code="not_stored", detail="The reply could not be stored"
+                    )
+            else:
+                for result in pending:
+                    session_id = result.item.session_id
+                    assert session_id is not None
+                    if result.first_turn:
+                        schedule_title_generation(session_id, self.user_id)
+                    schedule_memory_indexing(session_id, self.user_id)
+        for result in turns:
+            if result.stored is not None and not result.stored.done():
+                result.stored.set_result(result.error is None)
+
+
+def _row(
+    message: HistoryMessage, created_at: datetime, generation: Generation | None = None
+) -> dict[str, Any]:
+    """A `messages` row; every row of a multi-row INSERT needs the same keys."""
+    usage = generation.usage if generation else {}
+    return {
+        "id": message.id,
+        "chat_session_id": message.chat_session_id,
+        "role": message.role,
+        "content": message.content,
+        "model": generation.model if generation else None,
+        "finish_reason": generation.finish_reason if generation else None,
+        **{column: usage.get(column) for column in USAGE_COLUMNS},
+        "created_at": created_at,
+    }
+
+
+def _error(
+    index: int,
+    item: BatchItemCreate,
+    code: Any,
+    detail: str,
+    retry_after: float | None = None,
+) -> _Finished:
+    return _Finished(
+        index, item, error=BatchErrorRead(code=code, detail=detail, retry_after=retry_after)
+    )
@@ -0,0 +1,112 @@
+"""Generation budgets: how many tokens, how much context and how long a reply may take.
+
+Clients may send `limits` with a message. Each limit is clamped to the caps of
+the user's tier (`GENERATION_TIERS`), which the user's own `generation_limits`
+override. Without a requested value, the reply gets the cap for `max_tokens`
+and `deadline_seconds`, so one runaway answer cannot hold a model slot. The
+context window keeps the model's default unless a client asks for one:
+Ollama reloads a model to change it.
+
+A reply that hits `max_tokens` ends with `finish_reason="length"` and one cut
+off by its deadline with `"deadline"`; both are counted in
+`generation_budget_hits_total`, as is a deadline that passes before the first
+token (the reply then fails like a timeout).
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any
+
+from pydantic import ValidationError
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.chat import GenerationLimits
+from app.models.user import User
+
+
+logger = logging.getLogger(__name__)
+
+clamped_limits = metrics.counter(
+    "generation_limits_clamped_total",
+    "Requested generation limits lowered to the user's cap, by limit",
+    ["limit"],
+)
+budget_hits = metrics.counter(
+    "generation_budget_hits_total",
+    "Replies cut short by their budget, by limit (max_tokens or deadline)",
+    ["limit"],
+)
+
+
+@dataclass(frozen=True)
+class GenerationBudget:
+    """The limits a reply is generated with."""
+
+    max_tokens: int | None = None
+    context_tokens: int | None = None
+    deadline_seconds: float | None = None
+    temperature: float | None = None
+
+    def options(self) -> dict[str, Any]:
+        """Ollama options for the reply."""
+        options: dict[str, Any] = {
+            "temperature": settings.OLLAMA_TEMPERATURE
+            if self.temperature is None
+            else self.temperature
+        }
+        if self.max_tokens is not None:
+            options["num_predict"] = self.max_tokens
+        if self.context_tokens is not None:
+            options["num_ctx"] = self.context_tokens
+        return options
+
+
+def user_caps(user: User) -> GenerationLimits:
+    """A user's caps: their tier's, overridden by their own.
+
+    Stored overrides that are not valid limits (e.g. `{"max_tokens": 0}`) are
+    logged and ignored, so they cannot fail every message of the user.
+    """
+    tiers = settings.GENERATION_TIERS
+    caps = dict(tiers.get(user.tier) or tiers.get(settings.GENERATION_DEFAULT_TIER) or {})
+    if user.generation_limits:
+        try:
+            own = GenerationLimits.model_validate(user.generation_limits)
+        except ValidationError as e:
+            logger.warning("Ignoring invalid generation_limits of user %s: %s", user.id, e)
+        else:
+            caps.update(own.model_dump(exclude_unset=True))
+    return GenerationLimits.model_validate(caps)
+
+
+def generation_budget(
+    caps: GenerationLimits, requested: GenerationLimits | None = None
+) -> GenerationBudget:
+    """The budget for a reply: the requested limits, clamped to the caps."""
+    requested = requested or GenerationLimits()
+    return GenerationBudget(
+        max_tokens=_clamp("max_tokens", requested.max_tokens, caps.max_tokens, True),
+        context_tokens=_clamp("context_tokens", requested.context_tokens, caps.context_tokens),
+        deadline_seconds=_clamp(
+            "deadline_seconds", requested.deadline_seconds, caps.deadline_seconds, True
+        ),
+        temperature=requested.temperature,
+    )
+
+
+def record_budget_hit(finish_reason: str | None) -> None:
+    """Count a reply that ended because it used up its budget."""
+    if finish_reason == "length":
+        budget_hits.inc(limit="max_tokens")
+    elif finish_reason == "deadline":
+        budget_hits.inc(limit="deadline")
+
+
+def _clamp(name: str, requested: Any, cap: Any, default_to_cap: bool = False) -> Any:
+    if requested is None:
+        return cap if default_to_cap else None
+    if cap is not None and requested > cap:
+        clamped_limits.inc(limit=name)
+        return cap
+    return requested
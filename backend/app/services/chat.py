@@ -1,18 +1,43 @@
 """Chat service."""
 
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
 from datetime import UTC, datetime
+from functools import partial
 from uuid import UUID
 
-from sqlmodel import Session, select
+from sqlalchemy import Row, update
+from sqlmodel import Session, col, select
 
+from app.db.session import read_only
 from app.models.chat import (
+    DEFAULT_SESSION_TITLE,
     ChatSession,
     ChatSessionCreate,
+    ChatSessionUpdate,
+    HistoryMessage,
     Message,
     MessageRead,
     MessageRole,
 )
-from app.services.llm import LLMService
+from app.services.background import interactive
+from app.services.budgets import GenerationBudget
+from app.services.generations import GenerationCancelledError, generation_registry
+from app.services.llm import Generation, LLMError, LLMService
+from app.services.memory import delete_session_embeddings, schedule_memory_indexing
+from app.services.model_router import model_router
+from app.services.streams import (
+    STREAMING,
+    StreamResumeError,
+    follow_checkpoints,
+    reply_streams,
+    resumed_replies,
+)
+from app.services.titles import schedule_title_generation
+from app.services.turns import turn_locks
+
+
+logger = logging.getLogger(__name__)
 
 
 class ChatService:
@@ -22,17 +47,33 @@ class ChatService:
         self.session = session
         self.llm_service = LLMService()
 
-    def get_user_sessions(self, user_id: UUID) -> list[ChatSession]:
-        """Get all chat sessions for a user, sorted by creation date (newest first)."""
+    @read_only
+    def get_user_sessions(self, user_id: UUID) -> list[Row]:
+        """Get all chat sessions for a user, sorted by creation date (newest first).
+
+        Rows carry only the `ChatSessionRead` columns, no ORM instances are built.
+        """
         statement = (
-            select(ChatSession)
+            select(
+                ChatSession.id,
+                ChatSession.user_id,
+                ChatSession.title,
+                ChatSession.model_override,
+                ChatSession.created_at,
+                ChatSession.updated_at,
+            )
             .where(ChatSession.user_id == user_id)
             .order_by(ChatSession.created_at.desc())  # type: ignore[union-attr]
         )
-        return list(self.session.exec(statement).all())
+        return list(self.session.execute(statement).all())
 
+    @read_only
     def get_session(self, session_id: UUID, user_id: UUID) -> ChatSession | None:
         """Get a specific chat session."""
+        return self._get_owned_session(session_id, user_id)
+
+    def _get_owned_session(self, session_id: UUID, user_id: UUID) -> ChatSession | None:
+        """Get a chat session owned by a user from the primary."""
         statement = select(ChatSession).where(
             ChatSession.id == session_id,
             ChatSession.user_id == user_id,
@@ -43,16 +84,32 @@ class ChatService:
         """Create a new chat session."""
         chat_session = ChatSession(
             user_id=user_id,
-            title=data.title or "New Chat",
+            title=data.title or DEFAULT_SESSION_TITLE,
+            model_override=data.model_override,
         )
         self.session.add(chat_session)
         self.session.commit()
         self.session.refresh(chat_session)
         return chat_session
 
+    def update_session(
+        self, session_id: UUID, user_id: UUID, data: ChatSessionUpdate
+    ) -> ChatSession | None:
+        """Update the fields of a chat session that were sent."""
+        chat_session = self._get_owned_session(session_id, user_id)
+        if not chat_session:
+            return None
+
+        chat_session.sqlmodel_update(data.model_dump(exclude_unset=True))
+        chat_session.updated_at = datetime.now(UTC)
+        self.session.add(chat_session)
+        self.session.commit()
+        self.session.refresh(chat_session)
+        return chat_session
+
     def delete_session(self, session_id: UUID, user_id: UUID) -> bool:
         """Delete a chat session."""
-        chat_session = self.get_session(session_id, user_id)
+        chat_session = self._get_owned_session(session_id, user_id)
         if not chat_session:
             return False
 
@@ -62,10 +119,12 @@ class ChatService:
         for message in messages:
             self.session.delete(message)
 
+        delete_session_embeddings(self.session, session_id)
         self.session.delete(chat_session)
         self.session.commit()
         return True
 
+    @read_only
     def get_session_messages(self, session_id: UUID) -> list[Message]:
         """Get all messages for a chat session."""
         statement = (
@@ -75,44 +134,257 @@ class ChatService:
         )
         return list(self.session.exec(statement).all())
 
-    def add_message(self, session_id: UUID, content: str, role: MessageRole) -> Message:
-        """Add a message to a chat session."""
+    @read_only
+    def get_history(self, session_id: UUID) -> list[HistoryMessage]:
+        """Get the messages of a chat session for prompt building, oldest first.
+
+        Selects only the columns a prompt needs into tuples, skipping ORM
+        instances, the identity map and change tracking. Replies still being
+        generated (or abandoned by a crashed worker) are left out.
+        """
+        statement = (
+            select(Message.id, Message.chat_session_id, Message.role, Message.content)
+            .where(
+                Message.chat_session_id == session_id,
+                col(Message.finish_reason).is_distinct_from(STREAMING),
+            )
+            .order_by(Message.created_at.asc())  # type: ignore[union-attr]
+        )
+        return [HistoryMessage(*row) for row in self.session.execute(statement)]
+
+    def add_message(
+        self,
+        session_id: UUID,
+        content: str,
+        role: MessageRole,
+        model: str | None = None,
+        finish_reason: str | None = None,
+        usage: dict[str, int | None] | None = None,
+    ) -> Message:
+        """Add a message to a chat session.
+
+        `usage` holds the token counts and timings of an assistant reply.
+        """
         message = Message(
             chat_session_id=session_id,
             content=content,
             role=role,
+            model=model,
+            finish_reason=finish_reason,
+            **(usage or {}),
         )
         self.session.add(message)
+        self._touch_session(session_id)
+        self.session.commit()
+        self.session.refresh(message)
+        return message
 
-        # Update session timestamp
+    def _touch_session(self, session_id: UUID) -> None:
+        """Update a chat session's timestamp, committed with the caller's changes."""
         statement = select(ChatSession).where(ChatSession.id == session_id)
         chat_session = self.session.exec(statement).first()
         if chat_session:
             chat_session.updated_at = datetime.now(UTC)
             self.session.add(chat_session)
 
+    def get_message(self, session_id: UUID, message_id: UUID) -> Message | None:
+        """Get a message of a chat session from the primary."""
+        statement = select(Message).where(
+            Message.id == message_id, Message.chat_session_id == session_id
+        )
+        return self.session.exec(statement).first()
+
+    def _checkpoint_reply(self, message_id: UUID, created_at: datetime, content: str) -> None:
+        """Store the text a reply has so far; runs in the threadpool while it streams."""
+        self.session.execute(
+            update(Message)
+            # created_at lets PostgreSQL go straight to the message's partition
+            .where(col(Message.id) == message_id, col(Message.created_at) == created_at)
+            .values(content=content)
+        )
         self.session.commit()
-        self.session.refresh(message)
-        return message
 
-    async def process_message(self, session_id: UUID, content: str) -> MessageRead:
-        """Process a user message and get AI response."""
+    def _reply_checkpoint(
+        self, session_id: UUID, message_id: UUID
+    ) -> tuple[str, str | None] | None:
+        """The stored text and finish reason of an assistant reply."""
+        statement = select(Message.content, Message.finish_reason).where(
+            Message.id == message_id,
+            Message.chat_session_id == session_id,
+            Message.role == MessageRole.ASSISTANT.value,
+        )
+        try:
+            row = self.session.execute(statement).first()
+        finally:
+            # End the transaction so the next read sees newer checkpoints
+            self.session.rollback()
+        return (row.content, row.finish_reason) if row else None
+
+    def resume_reply(self, session_id: UUID, message_id: UUID, offset: int) -> AsyncIterator[str]:
+        """Follow an assistant reply from `offset` (in characters) until it is finished.
+
+        Replies generated by this worker are followed as the tokens arrive,
+        others through the checkpoints stored while they stream; neither calls
+        the model again. Raises `StreamResumeError` when there is no such reply
+        or the offset is past its end.
+        """
+        stream = reply_streams.get(message_id)
+        if stream is not None and stream.session_id == session_id:
+            if offset > len(stream.text):
+                raise StreamResumeError("Offset is past the end of the reply")
+            resumed_replies.inc(source="live")
+            return stream.follow(offset)
+
+        row = self._reply_checkpoint(session_id, message_id)
+        if row is None:
+            raise StreamResumeError("Reply not found")
+        text, finish_reason = row
+        # A checkpoint can lag behind what the client received, a finished reply cannot
+        if finish_reason != STREAMING and offset > len(text):
+            raise StreamResumeError("Offset is past the end of the reply")
+        resumed_replies.inc(source="checkpoint")
+        return follow_checkpoints(partial(self._reply_checkpoint, session_id, message_id), offset)
+
+    def _schedule_title(self, session_id: UUID) -> None:
+        """Queue title generation for a chat session still using the default title."""
+        chat_session = self.session.get(ChatSession, session_id)
+        if chat_session and chat_session.title == DEFAULT_SESSION_TITLE:
+            schedule_title_generation(session_id, chat_session.user_id)
+
+    async def process_message(
+        self,
+        session_id: UUID,
+        content: str,
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+        on_token: Callable[[str], Awaitable[None]] | None = None,
+        on_start: Callable[[UUID], Awaitable[None]] | None = None,
+        budget: GenerationBudget | None = None,
+    ) -> MessageRead:
+        """Process a user message and get AI response.
+
+        The generation is aborted when `is_disconnected` reports the client gone
+        or the session's generation is cancelled. A partial reply is stored with
+        `finish_reason="cancelled"`; without any output `GenerationCancelledError`
+        is raised and nothing is stored for the reply. `on_token` receives the
+        reply as it streams in.
+
+        The reply is stored (`finish_reason="streaming"`) before generation
+        starts and its text checkpointed as it streams, so a client that lost
+        the stream can pick it up with `resume_reply`. `on_start` receives the
+        reply's message id.
+
+        `budget` limits the reply's tokens, context and time; a reply cut off by
+        it is stored with `finish_reason` "length" or "deadline".
+
+        When the model fails or times out before any output, the `LLMError` is
+        raised and the user message is removed again, so a failure never becomes
+        part of the conversation and the client can simply retry.
+
+        Turns of one session run one at a time, so each reply is generated from
+        a history that includes the previous reply; `TurnBusyError` is raised
+        when the previous turn takes longer than `TURN_LOCK_TIMEOUT_SECONDS`.
+        """
+        async with turn_locks.hold(session_id):
+            return await self._take_turn(
+                session_id, content, is_disconnected, on_token, on_start, budget
+            )
+
+    async def _take_turn(
+        self,
+        session_id: UUID,
+        content: str,
+        is_disconnected: Callable[[], Awaitable[bool]] | None,
+        on_token: Callable[[str], Awaitable[None]] | None,
+        on_start: Callable[[UUID], Awaitable[None]] | None,
+        budget: GenerationBudget | None,
+    ) -> MessageRead:
         # Save user message
-        self.add_message(session_id, content, MessageRole.USER)
+        user_message = self.add_message(session_id, content, MessageRole.USER)
 
         # Get conversation history
-        history = self.get_session_messages(session_id)
+        history = self.get_history(session_id)
+
+        # Pick the model for this turn
+        chat_session = self.session.get(ChatSession, session_id)
+        override = chat_session.model_override if chat_session else None
+        user_id = chat_session.user_id if chat_session else None
+        decision = model_router.choose(content, len(history), override)
+
+        # Store the reply up front and checkpoint its text as it streams in
+        ai_message = self.add_message(
+            session_id, "", MessageRole.ASSISTANT, model=decision.model, finish_reason=STREAMING
+        )
+        stream = reply_streams.open(
+            ai_message.id,
+            session_id,
+            partial(self._checkpoint_reply, ai_message.id, ai_message.created_at),
+        )
+
+        async def on_text(text: str) -> None:
+            stream.append(text)
+            if on_token is not None:
+                await on_token(text)
 
         # Generate AI response
-        ai_response = await self.llm_service.generate_response(history)
+        generation = Generation(model=decision.model, user_id=user_id, budget=budget)
+        try:
+            if on_start is not None:
+                await on_start(ai_message.id)
+            try:
+                async with interactive.track():
+                    await generation_registry.run(
+                        session_id,
+                        generation,
+                        self.llm_service.generate_response(history, generation, on_text),
+                        is_disconnected,
+                    )
+            finally:
+                await stream.flush()
+            if generation.finish_reason == "cancelled" and not generation.content:
+                logger.info("Turn cancelled before any output in session %s", session_id)
+                self.session.delete(ai_message)
+                self.session.commit()
+                raise GenerationCancelledError("no output before cancellation")
 
-        # Save AI response
-        ai_message = self.add_message(session_id, ai_response, MessageRole.ASSISTANT)
+            # Store the complete reply
+            ai_message.sqlmodel_update(
+                {
+                    "content": generation.content,
+                    "model": generation.model,
+                    "finish_reason": generation.finish_reason,
+                    **generation.usage,
+                }
+            )
+            self.session.add(ai_message)
+            self._touch_session(session_id)
+            self.session.commit()
+            self.session.refresh(ai_message)
+        except LLMError as e:
+            logger.warning(
+                "Turn failed in session %s, the message was not kept: %s",
+                session_id,
+                e,
+                extra={"session_id": str(session_id), "model": decision.model},
+            )
+            self.session.delete(ai_message)
+            self.session.delete(user_message)
+            self.session.commit()
+            raise
+        except GenerationCancelledError:
+            raise
+        except Exception:
+            # Don't leave a reply that looks like it is still being generated
+            self.session.rollback()
+            self.session.delete(ai_message)
+            self.session.commit()
+            raise
+        finally:
+            reply_streams.close(stream)
 
-        return MessageRead(
-            id=ai_message.id,
-            chat_session_id=ai_message.chat_session_id,
-            content=ai_message.content,
-            role=ai_message.role,
-            created_at=ai_message.created_at,
-        )
+        # Name new chats from their first exchange, off the request path
+        if len(history) == 1:
+            self._schedule_title(session_id)
+        if user_id is not None:
+            schedule_memory_indexing(session_id, user_id)
+
+        return MessageRead.model_validate(ai_message)
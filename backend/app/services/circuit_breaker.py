@@ -0,0 +1,110 @@
+"""Circuit breaker that fails fast while a dependency is unhealthy.
+
+After `failure_threshold` consecutive failures the circuit opens and calls are
+rejected immediately for `reset_seconds`. Then one probe call is let through
+(half-open): its success closes the circuit, its failure opens it again.
+"""
+
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from app.core.metrics import metrics
+
+
+circuit_state = metrics.gauge(
+    "circuit_breaker_state", "Circuit state: 0 closed, 1 half-open, 2 open", ["circuit"]
+)
+circuit_transitions = metrics.counter(
+    "circuit_breaker_transitions_total", "Circuit state changes by new state", ["circuit", "state"]
+)
+circuit_rejections = metrics.counter(
+    "circuit_breaker_rejections_total", "Calls rejected without trying", ["circuit"]
+)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUES = {CLOSED: 0.0, HALF_OPEN: 1.0, OPEN: 2.0}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency while its circuit is open."""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"{name} is unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Count consecutive failures of a dependency and stop calling it when it is down."""
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+        circuit_state.set_function(lambda: _STATE_VALUES[self.state], circuit=name)
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the reset time has passed."""
+        if self.opened_at is None:
+            return CLOSED
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return OPEN
+        return HALF_OPEN
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a probe through."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def before_call(self) -> None:
+        """Raise `CircuitOpenError` unless a call may go through now."""
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+        circuit_rejections.inc(circuit=self.name)
+        raise CircuitOpenError(self.name, self.retry_after or self.reset_seconds)
+
+    def record_success(self) -> None:
+        """Close the circuit after a successful call."""
+        self.failures = 0
+        self._probing = False
+        if self.opened_at is not None:
+            self.opened_at = None
+            circuit_transitions.inc(circuit=self.name, state=CLOSED)
+
+    def record_failure(self) -> None:
+        """Count a failed call, opening the circuit at the threshold or after a failed probe."""
+        self.failures += 1
+        probe_failed = self._probing
+        self._probing = False
+        if probe_failed or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            circuit_transitions.inc(circuit=self.name, state=OPEN)
+
+    @asynccontextmanager
+    async def guard(self) -> AsyncIterator[None]:
+        """Run a call through the breaker; exceptions count as failures.
+
+        A cancelled call (e.g. the client went away) counts as neither.
+        """
+        self.before_call()
+        try:
+            yield
+        except Exception:
+            self.record_failure()
+            raise
+        except BaseException:
+            self._probing = False
+            raise
+        self.record_success()
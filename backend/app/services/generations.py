@@ -0,0 +1,124 @@
+"""Cancellation of in-flight chat generations.
+
+A generation is aborted when the client that asked for it disconnects or when
+the user cancels it explicitly. Cancelling the generation task closes the
+stream to Ollama, which stops the model and frees its capacity.
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from uuid import UUID
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.llm import Generation
+from app.services.model_router import latency_tracker
+
+
+logger = logging.getLogger(__name__)
+
+cancelled_generations = metrics.counter(
+    "llm_generations_cancelled_total",
+    "Generations aborted before completion, and what happened to the partial output",
+    ["reason", "partial"],
+)
+reclaimed_seconds = metrics.counter(
+    "llm_reclaimed_model_seconds_total",
+    "Estimated model time freed by aborting generations (typical duration minus elapsed)",
+    ["model"],
+)
+
+
+class GenerationCancelledError(Exception):
+    """Raised when a generation was cancelled before producing any output."""
+
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Generation cancelled: {reason}")
+        self.reason = reason
+
+
+class _ActiveGeneration:
+    """A generation task and why it was cancelled, if it was."""
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task = task
+        self.cancel_reason: str | None = None
+
+    def cancel(self, reason: str) -> None:
+        if self.cancel_reason is None:
+            self.cancel_reason = reason
+            self.task.cancel()
+
+
+class GenerationRegistry:
+    """In-flight generations per chat session in this worker process."""
+
+    def __init__(self, poll_interval: float) -> None:
+        self.poll_interval = poll_interval
+        self._active: dict[UUID, set[_ActiveGeneration]] = {}
+
+    def cancel(self, session_id: UUID, reason: str = "user_cancelled") -> int:
+        """Cancel every generation running for a chat session, returning how many."""
+        active = self._active.get(session_id, set())
+        for entry in active:
+            entry.cancel(reason)
+        return len(active)
+
+    async def run(
+        self,
+        session_id: UUID,
+        generation: Generation,
+        work: Awaitable[object],
+        is_disconnected: Callable[[], Awaitable[bool]] | None = None,
+    ) -> Generation:
+        """Run `work` until it completes, the client disconnects or it is cancelled.
+
+        On cancellation `generation` keeps the partial output and gets
+        `finish_reason="cancelled"`.
+        """
+        entry = _ActiveGeneration(asyncio.ensure_future(work))
+        self._active.setdefault(session_id, set()).add(entry)
+        try:
+            while not entry.task.done():
+                await asyncio.wait({entry.task}, timeout=self.poll_interval)
+                if not entry.task.done() and is_disconnected and await is_disconnected():
+                    entry.cancel("client_disconnected")
+            if entry.cancel_reason is None or not entry.task.cancelled():
+                entry.task.result()
+                return generation
+        except asyncio.CancelledError:
+            # The request itself was cancelled (e.g. server shutdown)
+            entry.cancel("request_cancelled")
+            await asyncio.wait({entry.task})
+            self._record_cancel(generation, entry.cancel_reason or "request_cancelled")
+            raise
+        finally:
+            sessions = self._active.get(session_id, set())
+            sessions.discard(entry)
+            if not sessions:
+                self._active.pop(session_id, None)
+
+        self._record_cancel(generation, entry.cancel_reason or "user_cancelled")
+        return generation
+
+    def _record_cancel(self, generation: Generation, reason: str) -> None:
+        """Mark a generation cancelled and account for the model time it no longer uses."""
+        generation.finish_reason = "cancelled"
+        elapsed = generation.elapsed
+        typical = latency_tracker.latency(generation.model)
+        if typical is not None and typical > elapsed:
+            reclaimed_seconds.inc(typical - elapsed, model=generation.model)
+
+        partial = "kept" if generation.content else "empty"
+        cancelled_generations.inc(reason=reason, partial=partial)
+        logger.info(
+            "Generation on %s cancelled (%s) after %.2fs with %d characters of output",
+            generation.model,
+            reason,
+            elapsed,
+            len(generation.content),
+        )
+
+
+generation_registry = GenerationRegistry(poll_interval=settings.GENERATION_DISCONNECT_POLL_SECONDS)
@@ -0,0 +1,237 @@
+"""Streaming export and bulk import of a user's chat history as NDJSON.
+
+The format is one JSON object per line: a header, then each chat session
+followed by its messages, oldest first::
+
+    {"type": "export", "version": 1, "exported_at": "..."}
+    {"type": "session", "id": "...", "title": "...", ...}
+    {"type": "message", "session_id": "...", "role": "user", "content": "...", ...}
+
+Export reads one joined query through a server-side cursor and import inserts
+in multi-row batches, so memory use does not grow with the size of the history.
+"""
+
+import json
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import UTC, date, datetime
+from typing import Any
+from uuid import UUID, uuid4
+
+from pydantic import ValidationError
+from sqlalchemy import insert, inspect
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.db.partitions import ensure_months, month_of, retention_cutoff
+from app.db.session import RoutingSession, replica_reads
+from app.models.chat import ChatSession, ChatSessionExport, Message, MessageExport
+from app.services.streams import STREAMING
+
+
+EXPORT_FORMAT_VERSION = 1
+EXPORT_BATCH_SIZE = 500  # Rows fetched per round trip from the server-side cursor
+IMPORT_BATCH_SIZE = 500  # Rows per multi-row INSERT
+
+
+class HistoryImportError(Exception):
+    """Raised for an import line that cannot be read."""
+
+    def __init__(self, line_number: int, message: str) -> None:
+        super().__init__(f"Line {line_number}: {message}")
+        self.line_number = line_number
+
+
+def export_history(bind: Engine, user_id: UUID) -> Iterator[str]:
+    """Yield a user's chat sessions and messages as NDJSON lines.
+
+    Uses its own session so the export can be streamed after the request's
+    session is gone. Reads are allowed to go to a replica.
+    """
+    header = {
+        "type": "export",
+        "version": EXPORT_FORMAT_VERSION,
+        "exported_at": datetime.now(UTC).isoformat(),
+    }
+    yield json.dumps(header) + "\n"
+
+    statement = (
+        select(
+            ChatSession.id,
+            ChatSession.title,
+            ChatSession.model_override,
+            ChatSession.created_at,
+            ChatSession.updated_at,
+            Message.role,
+            Message.content,
+            Message.model,
+            Message.finish_reason,
+            Message.prompt_tokens,
+            Message.completion_tokens,
+            Message.prompt_eval_duration_ms,
+            Message.eval_duration_ms,
+            Message.load_duration_ms,
+            Message.created_at.label("message_created_at"),  # type: ignore[attr-defined]
+        )
+        .outerjoin(Message, Message.chat_session_id == ChatSession.id)  # type: ignore[arg-type]
+        .where(ChatSession.user_id == user_id)
+        .order_by(ChatSession.created_at, ChatSession.id, Message.created_at)  # type: ignore[arg-type]
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+
+    with RoutingSession(bind) as session:
+        session.info["user_id"] = str(user_id)
+        with replica_reads(session):
+            current: UUID | None = None
+            for row in session.execute(statement):
+                if row.id != current:
+                    current = row.id
+                    chat_session = ChatSessionExport(
+                        id=row.id,
+                        title=row.title,
+                        model_override=row.model_override,
+                        created_at=row.created_at,
+                        updated_at=row.updated_at,
+                    )
+                    yield chat_session.model_dump_json() + "\n"
+                if row.role is not None:
+                    message = MessageExport(
+                        session_id=row.id,
+                        role=row.role,
+                        content=row.content,
+                        model=row.model,
+                        finish_reason=row.finish_reason,
+                        prompt_tokens=row.prompt_tokens,
+                        completion_tokens=row.completion_tokens,
+                        prompt_eval_duration_ms=row.prompt_eval_duration_ms,
+                        eval_duration_ms=row.eval_duration_ms,
+                        load_duration_ms=row.load_duration_ms,
+                        created_at=row.message_created_at,
+                    )
+                    yield message.model_dump_json() + "\n"
+
+
+@dataclass
+class HistoryImportSummary:
+    """Number of rows an import created."""
+
+    sessions: int = 0
+    messages: int = 0
+
+
+class HistoryImporter:
+    """Import NDJSON history lines into a user's account in multi-row batches.
+
+    Imported sessions and messages get new ids, so an export can be imported
+    again (e.g. into the same database) without conflicts. Messages must follow
+    the session they belong to, as in an export. Nothing is visible until
+    `finish()` commits.
+
+    Messages keep their `created_at`, so the partitions of their months are
+    created before each batch is inserted. Messages from before the retention
+    window (`MESSAGE_RETENTION_MONTHS`) are rejected: they would be archived or
+    dropped by the next maintenance run.
+    """
+
+    def __init__(self, session: Session, user_id: UUID, batch_size: int = IMPORT_BATCH_SIZE):
+        self.session = session
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.summary = HistoryImportSummary()
+        self._line_number = 0
+        self._source_session: UUID | None = None
+        self._target_session: UUID | None = None
+        self._sessions: list[dict[str, Any]] = []
+        self._messages: list[dict[str, Any]] = []
+        self._months: set[date] = set()  # Months whose partitions are known to exist
+        self._oldest_month = retention_cutoff(
+            datetime.now(UTC).date(), settings.MESSAGE_RETENTION_MONTHS
+        )
+
+    @property
+    def pending(self) -> int:
+        """Rows buffered for the next batch."""
+        return len(self._sessions) + len(self._messages)
+
+    def feed(self, line: str | bytes) -> None:
+        """Parse one line and buffer the row it describes."""
+        self._line_number += 1
+        if not line.strip():
+            return
+        try:
+            data = json.loads(line)
+            kind = data.get("type") if isinstance(data, dict) else None
+            if kind == "session":
+                self._add_session(ChatSessionExport.model_validate(data))
+            elif kind == "message":
+                self._add_message(MessageExport.model_validate(data))
+            elif kind != "export":
+                raise HistoryImportError(self._line_number, "unknown record type")
+        except (ValueError, ValidationError) as e:
+            raise HistoryImportError(self._line_number, str(e)) from e
+
+    def _add_session(self, record: ChatSessionExport) -> None:
+        self._source_session = record.id
+        self._target_session = uuid4()
+        self._sessions.append(
+            {
+                "id": self._target_session,
+                "user_id": self.user_id,
+                "title": record.title,
+                "model_override": record.model_override,
+                "created_at": record.created_at,
+                "updated_at": record.updated_at,
+            }
+        )
+        self.summary.sessions += 1
+
+    def _add_message(self, record: MessageExport) -> None:
+        if record.session_id != self._source_session:
+            raise HistoryImportError(
+                self._line_number, "message does not follow the session it belongs to"
+            )
+        if self._oldest_month is not None and month_of(record.created_at) < self._oldest_month:
+            raise HistoryImportError(
+                self._line_number,
+                f"message is older than the retention period ({self._oldest_month:%Y-%m})",
+            )
+        self._messages.append(
+            {
+                "id": uuid4(),
+                "chat_session_id": self._target_session,
+                "role": record.role.value,
+                "content": record.content,
+                "model": record.model,
+                # A reply exported mid-generation will not be finished in the copy
+                "finish_reason": "cancelled"
+                if record.finish_reason == STREAMING
+                else record.finish_reason,
+                "prompt_tokens": record.prompt_tokens,
+                "completion_tokens": record.completion_tokens,
+                "prompt_eval_duration_ms": record.prompt_eval_duration_ms,
+                "eval_duration_ms": record.eval_duration_ms,
+                "load_duration_ms": record.load_duration_ms,
+                "created_at": record.created_at,
+            }
+        )
+        self.summary.messages += 1
+
+    def flush(self) -> None:
+        """Insert the buffered rows, sessions first."""
+        if self._sessions:
+            self.session.execute(insert(ChatSession), self._sessions)
+            self._sessions = []
+        if self._messages:
+            months = {month_of(row["created_at"]) for row in self._messages} - self._months
+            if months:
+                ensure_months(self.session.get_bind(inspect(Message)), months)
+                self._months |= months
+            self.session.execute(insert(Message), self._messages)
+            self._messages = []
+
+    def finish(self) -> HistoryImportSummary:
+        """Insert what is left and commit the import."""
+        self.flush()
+        self.session.commit()
+        return self.summary
@@ -0,0 +1,153 @@
+"""Idempotency keys for requests that are expensive to repeat.
+
+Clients on flaky networks retry requests whose response they never saw. With an
+`Idempotency-Key` header, the first request does the work, duplicates that
+arrive while it runs wait for its result, and later replays get the stored
+result for `IDEMPOTENCY_TTL_SECONDS`. Failed requests are not stored so they can
+be retried.
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+idempotent_requests = metrics.counter(
+    "idempotent_requests_total", "Requests with an idempotency key by outcome", ["outcome"]
+)
+
+DisconnectCheck = Callable[[], Awaitable[bool]]
+
+
+class IdempotencyKeyMismatchError(Exception):
+    """Raised when an idempotency key is reused for a different request."""
+
+
+def fingerprint(*parts: object) -> str:
+    """Stable digest of the request fields an idempotency key must match."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class _InFlight:
+    """A running request, its result and the clients waiting for it."""
+
+    def __init__(self, request_fingerprint: str) -> None:
+        self.fingerprint = request_fingerprint
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.watchers: list[DisconnectCheck] = []
+
+    async def all_disconnected(self) -> bool:
+        """Whether every client waiting for the result has gone away."""
+        if not self.watchers:
+            return False
+        for check in list(self.watchers):
+            if not await check():
+                return False
+        return True
+
+
+class IdempotencyStore:
+    """Single-flight execution and a bounded, expiring store of results per key."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._inflight: dict[Hashable, _InFlight] = {}
+        # Completed results in completion order: (expires_at, fingerprint, result)
+        self._completed: OrderedDict[Hashable, tuple[float, str, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._completed)
+
+    async def run(
+        self,
+        key: Hashable,
+        request_fingerprint: str,
+        func: Callable[[DisconnectCheck], Awaitable[Any]],
+        is_disconnected: DisconnectCheck | None = None,
+    ) -> tuple[Any, bool]:
+        """Run `func` once per key and return `(result, replayed)`.
+
+        `func` receives a disconnect check that only reports True once every
+        client waiting on this key has disconnected, so a retry keeps the
+        original work alive after the first client drops.
+        """
+        self._expire()
+
+        stored = self._completed.get(key)
+        if stored is not None:
+            _expires_at, stored_fingerprint, result = stored
+            self._check_fingerprint(stored_fingerprint, request_fingerprint)
+            idempotent_requests.inc(outcome="replayed")
+            return result, True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self._check_fingerprint(inflight.fingerprint, request_fingerprint)
+            idempotent_requests.inc(outcome="joined")
+            return await self._wait(inflight, is_disconnected), True
+
+        inflight = _InFlight(request_fingerprint)
+        self._inflight[key] = inflight
+        idempotent_requests.inc(outcome="executed")
+        task = asyncio.ensure_future(func(inflight.all_disconnected))
+        task.add_done_callback(lambda t: self._finish(key, inflight, t))
+        return await self._wait(inflight, is_disconnected), False
+
+    async def _wait(self, inflight: _InFlight, is_disconnected: DisconnectCheck | None) -> Any:
+        if is_disconnected is not None:
+            inflight.watchers.append(is_disconnected)
+        try:
+            # Shielded: one waiter going away must not cancel the shared work
+            return await asyncio.shield(inflight.future)
+        finally:
+            if is_disconnected is not None:
+                inflight.watchers.remove(is_disconnected)
+
+    def _finish(self, key: Hashable, inflight: _InFlight, task: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            inflight.future.cancel()
+        elif task.exception() is not None:
+            inflight.future.set_exception(task.exception())  # type: ignore[arg-type]
+            # Nobody may be waiting anymore, don't log "exception never retrieved"
+            inflight.future.exception()
+        else:
+            result = task.result()
+            inflight.future.set_result(result)
+            expires_at = time.monotonic() + self.ttl_seconds
+            self._completed[key] = (expires_at, inflight.fingerprint, result)
+            while len(self._completed) > self.max_entries:
+                self._completed.popitem(last=False)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        while self._completed:
+            key, (expires_at, _fingerprint, _result) = next(iter(self._completed.items()))
+            if expires_at > now:
+                break
+            del self._completed[key]
+
+    @staticmethod
+    def _check_fingerprint(stored: str, received: str) -> None:
+        if stored != received:
+            idempotent_requests.inc(outcome="mismatch")
+            raise IdempotencyKeyMismatchError(
+                "Idempotency key was already used for a different request"
+            )
+
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+)
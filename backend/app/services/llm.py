@@ -1,30 +1,166 @@
-"""LLM service using LangChain and Ollama."""
+"""LLM service using LangChain and Ollama.
 
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
-from langchain_ollama import ChatOllama
+LangChain and the Ollama client are heavy to import, so they are loaded on first
+use rather than at module import. Auth-only workers, migrations and test
+collection never pay for them.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Sequence
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any
+from uuid import UUID
 
 from app.core.config import settings
-from app.models.chat import Message, MessageRole
+from app.core.request_context import record_llm_call
+from app.models.chat import HistoryMessage, Message, MessageRole
+from app.services.budgets import GenerationBudget, record_budget_hit
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.memory import memory_service
+from app.services.model_router import latency_tracker
+from app.services.ollama_pool import NoBackendAvailableError, is_unstarted_failure, ollama_pool
+
+
+TITLE_PROMPT = (
+    "Write a short title (at most 6 words) for the conversation below. "
+    "Reply with the title only, without quotes or punctuation at the end."
+)
+TITLE_MAX_LENGTH = 60
+
+
+if TYPE_CHECKING:
+    from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+
+logger = logging.getLogger(__name__)
+
+# One circuit for all Ollama backends: opens once failover has nothing healthy left
+ollama_circuit = CircuitBreaker(
+    "ollama", settings.OLLAMA_BREAKER_FAILURE_THRESHOLD, settings.OLLAMA_BREAKER_RESET_SECONDS
+)
+# Background jobs (titles) get their own circuit so their failures never fail chat fast
+background_circuit = CircuitBreaker(
+    "ollama_background",
+    settings.OLLAMA_BREAKER_FAILURE_THRESHOLD,
+    settings.OLLAMA_BREAKER_RESET_SECONDS,
+)
+
+
+class LLMError(Exception):
+    """Raised when the model could not produce a reply."""
+
+
+class LLMUnavailableError(LLMError):
+    """Raised when Ollama failed or is known to be down."""
+
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LLMTimeoutError(LLMError):
+    """Raised when the model did not reply within the deadline."""
+
+
+@dataclass
+class Generation:
+    """Reply accumulated from a streamed generation and how it ended."""
+
+    model: str
+    user_id: UUID | None = None  # Whose session; locates its stored embeddings
+    budget: GenerationBudget | None = None  # None = Ollama defaults, server timeouts only
+    content: str = ""
+    finish_reason: str | None = None  # stop | length | deadline | timeout | cancelled | error
+    metadata: dict[str, Any] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds since the generation started."""
+        return time.monotonic() - self.started_at
+
+    @property
+    def usage(self) -> dict[str, int | None]:
+        """Token counts and timings from Ollama's final chunk, as `Message` fields.
+
+        All None when the generation did not finish (cancelled or failed).
+        """
+        return {
+            "prompt_tokens": self.metadata.get("prompt_eval_count"),
+            "completion_tokens": self.metadata.get("eval_count"),
+            "prompt_eval_duration_ms": _milliseconds(self.metadata.get("prompt_eval_duration")),
+            "eval_duration_ms": _milliseconds(self.metadata.get("eval_duration")),
+            "load_duration_ms": _milliseconds(self.metadata.get("load_duration")),
+        }
+
+
+def _milliseconds(nanoseconds: int | None) -> int | None:
+    """Ollama durations are in nanoseconds."""
+    return None if nanoseconds is None else nanoseconds // 1_000_000
 
 
 class LLMService:
     """Service for LLM interactions using LangChain and Ollama."""
 
     def __init__(self):
-        self.llm = ChatOllama(
-            base_url=settings.OLLAMA_BASE_URL,
-            model=settings.OLLAMA_MODEL,
-            temperature=0.7,
-        )
         self.system_prompt = (
             "You are a helpful AI assistant. Be concise, accurate, and friendly. "
             "If you don't know something, say so honestly."
         )
 
+    async def _invoke(self, messages: list["BaseMessage"], **kwargs: Any) -> Any:
+        """Run a chat call on the least-loaded Ollama backend.
+
+        Requests that fail before reaching a model (connection refused, host
+        overloaded) are retried on another backend.
+        """
+        tried: list = []
+        while True:
+            backend = ollama_pool.select(exclude=tried)
+            try:
+                async with ollama_pool.track(backend):
+                    return await backend.llm.ainvoke(messages, **kwargs)
+            except Exception as e:
+                tried.append(backend)
+                if not is_unstarted_failure(e) or len(tried) >= settings.OLLAMA_MAX_ATTEMPTS:
+                    raise
+                if len(tried) >= len(ollama_pool.backends):
+                    raise NoBackendAvailableError("All Ollama backends failed") from e
+
+    async def _stream(self, messages: list["BaseMessage"], **kwargs: Any) -> AsyncIterator[Any]:
+        """Stream a chat call from the least-loaded Ollama backend.
+
+        Failover works as in `_invoke`, but only until the first chunk arrives.
+        Closing the iterator (e.g. when the consuming task is cancelled) closes
+        the HTTP stream, which makes Ollama stop generating.
+        """
+        tried: list = []
+        while True:
+            backend = ollama_pool.select(exclude=tried)
+            started = False
+            try:
+                async with ollama_pool.track(backend):
+                    async for chunk in backend.llm.astream(messages, **kwargs):
+                        started = True
+                        yield chunk
+                return
+            except Exception as e:
+                tried.append(backend)
+                if started or not is_unstarted_failure(e):
+                    raise
+                if len(tried) >= settings.OLLAMA_MAX_ATTEMPTS:
+                    raise
+                if len(tried) >= len(ollama_pool.backends):
+                    raise NoBackendAvailableError("All Ollama backends failed") from e
+
     def _convert_messages(
-        self, history: list[Message]
-    ) -> list[SystemMessage | HumanMessage | AIMessage]:
+        self, history: Sequence[HistoryMessage | Message]
+    ) -> list["SystemMessage | HumanMessage | AIMessage"]:
         """Convert database messages to LangChain message format."""
+        from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
         messages: list[SystemMessage | HumanMessage | AIMessage] = [
             SystemMessage(content=self.system_prompt)
         ]
@@ -39,13 +175,154 @@ class LLMService:
 
         return messages
 
-    async def generate_response(self, history: list[Message]) -> str:
-        """Generate a response based on conversation history."""
+    async def generate_title(self, history: list[Message]) -> str | None:
+        """Generate a short session title with the small title model.
+
+        Errors propagate so background callers can retry.
+        """
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        transcript = "\n".join(f"{MessageRole(msg.role).value}: {msg.content}" for msg in history)
+        started = time.monotonic()
+        try:
+            async with background_circuit.guard():
+                response = await self._invoke(
+                    [SystemMessage(content=TITLE_PROMPT), HumanMessage(content=transcript)],
+                    model=settings.OLLAMA_TITLE_MODEL,
+                )
+        finally:
+            record_llm_call(time.monotonic() - started)
+        return _clean_title(str(response.content))
+
+    async def stream_response(
+        self, history: list[HistoryMessage], generation: Generation
+    ) -> AsyncIterator[str]:
+        """Stream a response token by token, accumulating it on `generation`.
+
+        Args:
+            history: Conversation so far, oldest first
+            generation: Receives the content, finish reason and Ollama metadata
+        """
+        if settings.MEMORY_ENABLED:
+            history = await memory_service.select_history(history, generation.user_id)
         messages = self._convert_messages(history)
+        options = {} if generation.budget is None else {"options": generation.budget.options()}
+
+        async with latency_tracker.track(generation.model):
+            async for chunk in self._stream(messages, model=generation.model, **options):
+                text = str(chunk.content)
+                if text:
+                    generation.content += text
+                    yield text
+                if chunk.response_metadata.get("done"):
+                    generation.metadata = dict(chunk.response_metadata)
+                    generation.finish_reason = generation.metadata.get("done_reason") or "stop"
+
+    async def generate_response(
+        self,
+        history: list[HistoryMessage],
+        generation: Generation,
+        on_token: Callable[[str], Awaitable[None]] | None = None,
+    ) -> Generation:
+        """Generate a response based on conversation history.
 
+        The reply is accumulated on `generation` as it streams in, so when the
+        calling task is cancelled the upstream request is aborted and the caller
+        still has the partial output. `on_token` receives each piece of text.
+
+        The first token must arrive within `OLLAMA_FIRST_TOKEN_TIMEOUT_SECONDS`
+        and the reply must be complete within `OLLAMA_GENERATION_TIMEOUT_SECONDS`
+        and the deadline of `generation.budget`, whichever comes first.
+        Without any output, failures raise `LLMTimeoutError` or
+        `LLMUnavailableError` (also raised at once while the circuit is open);
+        with partial output the reply is kept with `finish_reason` "deadline"
+        (the budget's), "timeout" or "error".
+        """
+        try:
+            await self._generate(history, generation, on_token)
+        finally:
+            record_llm_call(generation.elapsed)
+            # Also counts a budget deadline that passed before the first token
+            record_budget_hit(generation.finish_reason)
+        logger.info(
+            "Generated %d characters with %s in %.0f ms (%s)",
+            len(generation.content),
+            generation.model,
+            generation.elapsed * 1000,
+            generation.finish_reason,
+            extra={
+                "model": generation.model,
+                "finish_reason": generation.finish_reason,
+                "duration_ms": round(generation.elapsed * 1000, 1),
+                **generation.usage,
+            },
+        )
+        return generation
+
+    async def _generate(
+        self,
+        history: list[HistoryMessage],
+        generation: Generation,
+        on_token: Callable[[str], Awaitable[None]] | None,
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        server_timeout = settings.OLLAMA_GENERATION_TIMEOUT_SECONDS or None
+        budget_timeout = generation.budget.deadline_seconds if generation.budget else None
+        first_token_timeout = _shortest(settings.OLLAMA_FIRST_TOKEN_TIMEOUT_SECONDS, server_timeout)
+        error: LLMError
         try:
-            response = await self.llm.ainvoke(messages)
-            return str(response.content)
+            # The client's deadline runs outside the breaker: a reply cut off by its budget
+            # cancels the call, which counts as neither a failure nor a success of Ollama
+            async with (
+                asyncio.timeout_at(_deadline(loop, budget_timeout, generation.elapsed)) as budget,
+                ollama_circuit.guard(),
+                asyncio.timeout_at(_deadline(loop, first_token_timeout)) as deadline,
+            ):
+                waiting_for_first_token = True
+                async for text in self.stream_response(history, generation):
+                    if waiting_for_first_token:
+                        # From now on only the total deadline applies
+                        waiting_for_first_token = False
+                        deadline.reschedule(_deadline(loop, server_timeout, generation.elapsed))
+                    if on_token is not None:
+                        await on_token(text)
+            return
+        except CircuitOpenError as e:
+            raise LLMUnavailableError(str(e), retry_after=e.retry_after) from e
+        except TimeoutError as e:
+            error = LLMTimeoutError(f"{generation.model} did not reply within the deadline")
+            cause: Exception = e
+            generation.finish_reason = "deadline" if budget.expired() else "timeout"
         except Exception as e:
-            # Log the error in production
-            return f"I apologize, but I'm having trouble connecting to the AI service. Error: {e!s}"
+            error = LLMUnavailableError(f"{generation.model} failed: {e}")
+            cause = e
+            generation.finish_reason = "error"
+
+        if not generation.content:
+            logger.warning("Generation failed without output: %s", error)
+            raise error from cause
+        # Keep what the model already wrote, marked as cut short
+        logger.warning("Generation cut short with partial output: %s", error)
+
+
+def _deadline(
+    loop: asyncio.AbstractEventLoop, seconds: float | None, elapsed: float = 0.0
+) -> float | None:
+    """Loop time when a timeout of `seconds` that started `elapsed` ago expires, None if 0."""
+    return loop.time() + seconds - elapsed if seconds else None
+
+
+def _shortest(*seconds: float | None) -> float | None:
+    """The shortest of some timeouts, None when none is set (0 or None)."""
+    return min((s for s in seconds if s), default=None)
+
+
+def _clean_title(text: str) -> str | None:
+    """Reduce a model reply to a single-line title."""
+    for line in text.splitlines():
+        title = line.strip().strip("\"'*#").strip()
+        if title.lower().startswith("title:"):
+            title = title[len("title:") :].strip()
+        if title:
+            return title[:TITLE_MAX_LENGTH].rstrip(" .")
+    return None
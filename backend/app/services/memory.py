@@ -0,0 +1,328 @@
+"""Retrieval memory: recall the older messages of a session relevant to a new one.
+
+Long sessions are not sent to the model in full. The prompt gets the last
+`MEMORY_RECENT_MESSAGES` messages plus the `MEMORY_TOP_K` older exchanges whose
+embeddings are closest to the new message.
+
+Messages are embedded by a background job after each turn and stored in
+`message_embeddings`. Each worker keeps the embeddings of recently used
+sessions in a `SessionIndex`, one contiguous float32 array per session, so a
+recall costs one embedding call for the new message plus a scan of the array
+(vectorized with NumPy when it is installed).
+"""
+
+import logging
+import math
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from functools import partial
+from typing import TYPE_CHECKING, Protocol
+from uuid import UUID
+
+from sqlalchemy import delete
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, col, select
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.session import RoutingSession, engine
+from app.db.shards import insert_ignoring_duplicates
+from app.models.chat import HistoryMessage, Message, MessageRole
+from app.models.memory import MessageEmbedding
+from app.services.background import background_jobs
+from app.services.ollama_pool import ollama_pool
+
+
+if TYPE_CHECKING:
+    from ollama import AsyncClient
+
+
+logger = logging.getLogger(__name__)
+
+memory_recalls = metrics.counter(
+    "memory_recalls_total", "Prompts built with retrieval memory by outcome", ["outcome"]
+)
+
+EMBED_BATCH_SIZE = 32  # Texts per embedding request
+
+
+class Embedder(Protocol):
+    """Turns texts into embedding vectors."""
+
+    model: str
+
+    async def embed(self, texts: Sequence[str]) -> list[Sequence[float]]:
+        """One vector per text, in order."""
+        ...
+
+
+class OllamaEmbedder:
+    """Embeddings from an Ollama embedding model on the least-loaded backend."""
+
+    def __init__(self, model: str, timeout: float) -> None:
+        self.model = model
+        self.timeout = timeout
+        self._clients: dict[str, AsyncClient] = {}
+
+    async def embed(self, texts: Sequence[str]) -> list[Sequence[float]]:
+        backend = ollama_pool.select()
+        client = self._clients.get(backend.url)
+        if client is None:
+            from ollama import AsyncClient
+
+            client = self._clients[backend.url] = AsyncClient(
+                host=backend.url, timeout=self.timeout
+            )
+        response = await client.embed(
+            model=self.model, input=list(texts), keep_alive=settings.OLLAMA_KEEP_ALIVE
+        )
+        return list(response.embeddings)
+
+
+def _normalized(vector: Sequence[float]) -> array:
+    """A vector scaled to unit length as float32, so dot products are cosine similarities."""
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return array("f", (x / norm for x in vector))
+
+
+class SessionIndex:
+    """Unit-length embeddings of one session's messages in a contiguous float32 array."""
+
+    def __init__(self) -> None:
+        self.dimensions: int | None = None
+        self.ids: list[UUID] = []
+        self.vectors = array("f")
+        self._indexed: set[UUID] = set()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, message_id: object) -> bool:
+        return message_id in self._indexed
+
+    def add(self, message_id: UUID, vector: array) -> None:
+        """Add a unit-length vector, ignoring ids already indexed or other dimensions."""
+        if self.dimensions is None:
+            self.dimensions = len(vector)
+        if len(vector) != self.dimensions or message_id in self:
+            return
+        self.ids.append(message_id)
+        self._indexed.add(message_id)
+        self.vectors.extend(vector)
+
+    def search(self, query: array, k: int, candidates: set[UUID]) -> list[UUID]:
+        """The `k` candidates most similar to a unit-length query vector."""
+        if k <= 0 or not self.ids or len(query) != self.dimensions:
+            return []
+        scores = self._scores(query)
+        ranked = sorted(
+            (i for i, message_id in enumerate(self.ids) if message_id in candidates),
+            key=lambda i: scores[i],
+            reverse=True,
+        )
+        return [self.ids[i] for i in ranked[:k]]
+
+    def _scores(self, query: array) -> Sequence[float]:
+        dimensions = self.dimensions
+        assert dimensions is not None
+        try:
+            import numpy as np
+        except ImportError:
+            vectors = self.vectors
+            return [
+                sum(a * b for a, b in zip(vectors[i : i + dimensions], query, strict=True))
+                for i in range(0, len(vectors), dimensions)
+            ]
+        matrix = np.frombuffer(self.vectors, dtype=np.float32).reshape(-1, dimensions)
+        return (matrix @ np.frombuffer(query, dtype=np.float32)).tolist()
+
+
+class MemoryService:
+    """Embed messages, persist the embeddings and recall relevant older messages."""
+
+    def __init__(self, embedder: Embedder, engine: Engine, max_cached_sessions: int) -> None:
+        self.embedder = embedder
+        self.engine = engine
+        self.max_cached_sessions = max_cached_sessions
+        self._indexes: OrderedDict[UUID, SessionIndex] = OrderedDict()
+
+    async def select_history(
+        self, history: list[HistoryMessage], user_id: UUID | None = None
+    ) -> list[HistoryMessage]:
+        """The messages to send for a turn: recalled older exchanges, then recent ones.
+
+        `history` is the whole session of `user_id`, oldest first, ending with
+        the new user message. Falls back to the whole history when embedding
+        fails.
+        """
+        recent_count = max(1, settings.MEMORY_RECENT_MESSAGES)
+        if len(history) <= recent_count:
+            return history
+        older, recent = history[:-recent_count], history[-recent_count:]
+        query = history[-1]
+
+        try:
+            index = await self._index(query.chat_session_id, user_id)
+            missing = [message for message in older if message.id not in index]
+            if missing:
+                # Another worker may have indexed them already
+                index = await self._index(query.chat_session_id, user_id, reload=True)
+                missing = [message for message in older if message.id not in index]
+            # One request while the user waits: the query and the newest missing
+            # messages; the indexing job queued after each turn embeds the rest
+            missing = missing[-(EMBED_BATCH_SIZE - 1) :]
+            vectors = await self._embed([*missing, query])
+            embedded = list(zip([*missing, query], vectors, strict=True))
+            await self._store(index, query.chat_session_id, user_id, embedded)
+        except Exception as e:
+            logger.warning("Retrieval memory unavailable, sending the whole history: %s", e)
+            memory_recalls.inc(outcome="failed")
+            return history
+
+        hits = set(index.search(vectors[-1], settings.MEMORY_TOP_K, {m.id for m in older}))
+        memory_recalls.inc(outcome="recalled")
+        return [*_exchanges(older, hits), *recent]
+
+    async def index_session(self, session_id: UUID, user_id: UUID | None = None) -> None:
+        """Embed and store the messages of a user's session that have no embedding yet."""
+        pending = await run_in_threadpool(self._load_unindexed, session_id, user_id)
+        index = self._indexes.get(session_id)
+        for start in range(0, len(pending), EMBED_BATCH_SIZE):
+            batch = pending[start : start + EMBED_BATCH_SIZE]
+            vectors = await self._embed(batch)
+            await self._store(index, session_id, user_id, list(zip(batch, vectors, strict=True)))
+
+    def forget(self, session_id: UUID) -> None:
+        """Drop a session's cached index (e.g. when the session is deleted)."""
+        self._indexes.pop(session_id, None)
+
+    async def _embed(self, messages: Sequence[HistoryMessage]) -> list[array]:
+        if not messages:
+            return []
+        vectors = await self.embedder.embed([message.content for message in messages])
+        return [_normalized(vector) for vector in vectors]
+
+    async def _index(
+        self, session_id: UUID, user_id: UUID | None, reload: bool = False
+    ) -> SessionIndex:
+        """A session's index, loaded from the database on first use."""
+        index = self._indexes.get(session_id)
+        if index is None or reload:
+            index = await run_in_threadpool(self._load_index, session_id, user_id)
+            self._indexes[session_id] = index
+            while len(self._indexes) > self.max_cached_sessions:
+                self._indexes.popitem(last=False)
+        self._indexes.move_to_end(session_id)
+        return index
+
+    async def _store(
+        self,
+        index: SessionIndex | None,
+        session_id: UUID,
+        user_id: UUID | None,
+        embedded: list[tuple[HistoryMessage, array]],
+    ) -> None:
+        new = [
+            (message, vector)
+            for message, vector in embedded
+            if index is None or message.id not in index
+        ]
+        if not new:
+            return
+        await run_in_threadpool(self._save, session_id, user_id, new)
+        if index is not None:
+            for message, vector in new:
+                index.add(message.id, vector)
+
+    def _session(self, user_id: UUID | None) -> Session:
+        """A primary-only session on the database holding the user's chat data."""
+        session = RoutingSession(self.engine, replicas=[])
+        if user_id is not None:
+            session.info["user_id"] = str(user_id)
+        return session
+
+    def _load_index(self, session_id: UUID, user_id: UUID | None) -> SessionIndex:
+        index = SessionIndex()
+        statement = select(MessageEmbedding.message_id, MessageEmbedding.vector).where(
+            MessageEmbedding.chat_session_id == session_id,
+            MessageEmbedding.model == self.embedder.model,
+        )
+        with self._session(user_id) as session:
+            for message_id, data in session.exec(statement):
+                vector = array("f")
+                vector.frombytes(data)
+                index.add(message_id, vector)
+        return index
+
+    def _load_unindexed(self, session_id: UUID, user_id: UUID | None) -> list[HistoryMessage]:
+        indexed = select(MessageEmbedding.message_id).where(
+            MessageEmbedding.chat_session_id == session_id,
+            MessageEmbedding.model == self.embedder.model,
+        )
+        statement = (
+            select(Message.id, Message.chat_session_id, Message.role, Message.content)
+            .where(Message.chat_session_id == session_id, col(Message.id).not_in(indexed))
+            .order_by(col(Message.created_at))
+        )
+        with self._session(user_id) as session:
+            return [HistoryMessage(*row) for row in session.execute(statement)]
+
+    def _save(
+        self, session_id: UUID, user_id: UUID | None, embedded: list[tuple[HistoryMessage, array]]
+    ) -> None:
+        rows = [
+            {
+                "message_id": message.id,
+                "model": self.embedder.model,
+                "chat_session_id": session_id,
+                "vector": vector.tobytes(),
+            }
+            for message, vector in embedded
+        ]
+        with self._session(user_id) as session:
+            # The background job and a recall may embed the same message concurrently
+            bind = session.get_bind(MessageEmbedding.__mapper__)
+            session.execute(insert_ignoring_duplicates(bind, MessageEmbedding), rows)
+            session.commit()
+
+
+def delete_session_embeddings(session: Session, session_id: UUID) -> None:
+    """Delete a session's embeddings as part of deleting the session."""
+    session.execute(
+        delete(MessageEmbedding).where(col(MessageEmbedding.chat_session_id) == session_id)
+    )
+    memory_service.forget(session_id)
+
+
+def _exchanges(messages: list[HistoryMessage], hits: set[UUID]) -> list[HistoryMessage]:
+    """Recalled messages with their question or answer, oldest first."""
+    keep: set[int] = set()
+    for i, message in enumerate(messages):
+        if message.id not in hits:
+            continue
+        keep.add(i)
+        if message.role == MessageRole.USER and i + 1 < len(messages):
+            keep.add(i + 1)
+        elif message.role == MessageRole.ASSISTANT and i > 0:
+            keep.add(i - 1)
+    return [messages[i] for i in sorted(keep)]
+
+
+def schedule_memory_indexing(session_id: UUID, user_id: UUID) -> bool:
+    """Queue embedding of a user's session's new messages, at most one job per session."""
+    if not settings.MEMORY_ENABLED:
+        return False
+    return background_jobs.submit(
+        f"memory:{session_id}",
+        partial(memory_service.index_session, session_id, user_id),
+        kind="memory",
+    )
+
+
+memory_service = MemoryService(
+    OllamaEmbedder(settings.MEMORY_EMBEDDING_MODEL, settings.MEMORY_EMBED_TIMEOUT_SECONDS),
+    engine,
+    settings.MEMORY_MAX_CACHED_SESSIONS,
+)
@@ -0,0 +1,136 @@
+"""Latency-aware routing of chat turns between a small and a large model."""
+
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+routing_decisions = metrics.counter(
+    "model_routing_decisions_total", "Model chosen for chat turns", ["model", "reason"]
+)
+model_latency = metrics.histogram(
+    "llm_generation_seconds", "Wall-clock time of LLM generations", ["model"]
+)
+
+
+@dataclass(frozen=True)
+class RoutingDecision:
+    """Model picked for a chat turn and why."""
+
+    model: str
+    reason: str
+
+
+class ModelLatencyTracker:
+    """Exponentially weighted generation latency and in-flight count per model."""
+
+    def __init__(self, alpha: float = 0.2) -> None:
+        self.alpha = alpha
+        self._latency: dict[str, float] = {}
+        self._inflight: dict[str, int] = {}
+
+    def latency(self, model: str) -> float | None:
+        """Smoothed recent latency of a model in seconds, None until observed."""
+        return self._latency.get(model)
+
+    def inflight(self, model: str) -> int:
+        """Generations currently running on a model."""
+        return self._inflight.get(model, 0)
+
+    def observe(self, model: str, seconds: float) -> None:
+        """Record a completed generation."""
+        previous = self._latency.get(model)
+        self._latency[model] = (
+            seconds if previous is None else previous + self.alpha * (seconds - previous)
+        )
+        model_latency.observe(seconds, model=model)
+
+    @asynccontextmanager
+    async def track(self, model: str) -> AsyncIterator[None]:
+        """Count a generation as in flight and record its latency when it completes."""
+        self._inflight[model] = self._inflight.get(model, 0) + 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._inflight[model] -= 1
+        self.observe(model, time.monotonic() - started)
+
+
+class ModelRouter:
+    """Pick a model per chat turn from configurable rules.
+
+    Short turns in short conversations go to the small model, heavy turns to the
+    large one. Heavy turns are shed to the small model while the large model is
+    saturated, and a per-session override always wins.
+    """
+
+    def __init__(self, tracker: ModelLatencyTracker) -> None:
+        self.tracker = tracker
+
+    @property
+    def small_model(self) -> str:
+        return settings.MODEL_ROUTING_SMALL_MODEL or settings.OLLAMA_MODEL_DEV
+
+    @property
+    def large_model(self) -> str:
+        return settings.MODEL_ROUTING_LARGE_MODEL or settings.OLLAMA_MODEL_PROD
+
+    def active_models(self) -> list[str]:
+        """Models that may serve chat turns and should be kept warm."""
+        if not settings.MODEL_ROUTING_ENABLED:
+            return [settings.OLLAMA_MODEL]
+        return list(dict.fromkeys([self.small_model, self.large_model]))
+
+    def allowed_overrides(self) -> list[str]:
+        """Models a chat session may pin explicitly."""
+        if settings.MODEL_ROUTING_ALLOWED_MODELS:
+            return settings.MODEL_ROUTING_ALLOWED_MODELS
+        return list(dict.fromkeys([settings.OLLAMA_MODEL, *self.active_models()]))
+
+    def choose(
+        self, prompt: str, history_size: int, session_override: str | None = None
+    ) -> RoutingDecision:
+        """Pick the model for a turn and record the decision."""
+        decision = self._decide(prompt, history_size, session_override)
+        routing_decisions.inc(model=decision.model, reason=decision.reason)
+        return decision
+
+    def _decide(
+        self, prompt: str, history_size: int, session_override: str | None
+    ) -> RoutingDecision:
+        if session_override:
+            return RoutingDecision(session_override, "session_override")
+        if not settings.MODEL_ROUTING_ENABLED:
+            return RoutingDecision(settings.OLLAMA_MODEL, "default")
+
+        if len(prompt) > settings.MODEL_ROUTING_MAX_SMALL_PROMPT_CHARS:
+            reason = "long_prompt"
+        elif history_size > settings.MODEL_ROUTING_MAX_SMALL_HISTORY:
+            reason = "long_history"
+        else:
+            return RoutingDecision(self.small_model, "short_turn")
+
+        if self._large_model_saturated():
+            return RoutingDecision(self.small_model, "large_model_busy")
+        return RoutingDecision(self.large_model, reason)
+
+    def _large_model_saturated(self) -> bool:
+        inflight = self.tracker.inflight(self.large_model)
+        if inflight >= settings.MODEL_ROUTING_LARGE_MAX_INFLIGHT:
+            return True
+        # Slow recent turns only matter while the model is busy, an idle model gets probed again
+        latency = self.tracker.latency(self.large_model)
+        return (
+            inflight > 0
+            and latency is not None
+            and latency > settings.MODEL_ROUTING_LARGE_MAX_LATENCY_SECONDS
+        )
+
+
+latency_tracker = ModelLatencyTracker()
+model_router = ModelRouter(latency_tracker)
@@ -0,0 +1,192 @@
+"""Pool of Ollama backends with least-loaded balancing, health checks and failover."""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Sequence
+from contextlib import asynccontextmanager, suppress
+from typing import TYPE_CHECKING
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+if TYPE_CHECKING:
+    from langchain_ollama import ChatOllama
+    from ollama import AsyncClient
+
+
+logger = logging.getLogger(__name__)
+
+backend_outstanding = metrics.gauge(
+    "ollama_backend_outstanding_requests", "Requests in flight per Ollama backend", ["backend"]
+)
+backend_healthy = metrics.gauge(
+    "ollama_backend_healthy", "1 if the Ollama backend is in rotation", ["backend"]
+)
+backend_failures = metrics.counter(
+    "ollama_backend_failures_total", "Failed requests and health checks per backend", ["backend"]
+)
+
+
+class NoBackendAvailableError(Exception):
+    """Raised when every Ollama backend has been tried or is ejected."""
+
+
+def is_unstarted_failure(error: BaseException) -> bool:
+    """Whether a request failed before the backend started working on it.
+
+    Such requests are safe to retry on another backend: the connection could
+    not be opened, or the server refused it as overloaded.
+    """
+    import httpx
+    from ollama import ResponseError
+
+    if isinstance(error, ConnectionError | httpx.ConnectError | httpx.ConnectTimeout):
+        return True
+    if isinstance(error, httpx.PoolTimeout):
+        return True
+    return isinstance(error, ResponseError) and error.status_code in (502, 503)
+
+
+class OllamaBackend:
+    """One Ollama host and its recent load, latency and health."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.outstanding = 0
+        self.latency: float | None = None
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self._llm: ChatOllama | None = None
+        self._client: AsyncClient | None = None
+
+    @property
+    def available(self) -> bool:
+        """Whether the backend is in rotation."""
+        return time.monotonic() >= self.ejected_until
+
+    @property
+    def expected_wait(self) -> float:
+        """Expected time for a new request: queue position times recent latency."""
+        return (self.outstanding + 1) * (self.latency or 0.0)
+
+    @property
+    def llm(self) -> "ChatOllama":
+        """LangChain chat client for this backend, created on first use."""
+        if self._llm is None:
+            from langchain_ollama import ChatOllama
+
+            self._llm = ChatOllama(
+                base_url=self.url,
+                model=settings.OLLAMA_MODEL,
+                temperature=settings.OLLAMA_TEMPERATURE,
+                keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            )
+        return self._llm
+
+    @property
+    def client(self) -> "AsyncClient":
+        """Raw Ollama client for this backend (warm-up and health checks)."""
+        if self._client is None:
+            from ollama import AsyncClient
+
+            self._client = AsyncClient(host=self.url, timeout=settings.OLLAMA_HEALTH_CHECK_TIMEOUT)
+        return self._client
+
+
+class OllamaBackendPool:
+    """Dispatch requests to the Ollama backend with the lowest expected wait.
+
+    Backends that fail `eject_after` times in a row are taken out of rotation
+    for `eject_seconds`. Active health checks put them back once they answer.
+    """
+
+    def __init__(self, urls: Sequence[str], eject_after: int, eject_seconds: float) -> None:
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self._task: asyncio.Task | None = None
+        for backend in self.backends:
+            backend_healthy.set_function(lambda b=backend: float(b.available), backend=backend.url)
+            backend_outstanding.set_function(lambda b=backend: b.outstanding, backend=backend.url)
+
+    def select(self, exclude: Sequence[OllamaBackend] = ()) -> OllamaBackend:
+        """Pick the backend with the lowest expected wait, skipping `exclude`."""
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            raise NoBackendAvailableError("All Ollama backends failed")
+        healthy = [b for b in candidates if b.available]
+        # With every remaining backend ejected, try the one that comes back soonest
+        if not healthy:
+            return min(candidates, key=lambda b: b.ejected_until)
+        return min(healthy, key=lambda b: (b.expected_wait, b.outstanding))
+
+    @asynccontextmanager
+    async def track(self, backend: OllamaBackend) -> AsyncIterator[None]:
+        """Count a request as outstanding on a backend and record its outcome."""
+        backend.outstanding += 1
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_unstarted_failure(e):
+                self.record_failure(backend)
+            raise
+        finally:
+            backend.outstanding -= 1
+        self.record_success(backend, time.monotonic() - started)
+
+    def record_success(self, backend: OllamaBackend, seconds: float | None = None) -> None:
+        """Reset failures and fold a latency sample into the backend's average."""
+        backend.consecutive_failures = 0
+        backend.ejected_until = 0.0
+        if seconds is not None:
+            previous = backend.latency
+            backend.latency = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+    def record_failure(self, backend: OllamaBackend) -> None:
+        """Count a failure and eject the backend after too many in a row."""
+        backend.consecutive_failures += 1
+        backend_failures.inc(backend=backend.url)
+        if backend.consecutive_failures >= self.eject_after and backend.available:
+            logger.warning("Ejecting Ollama backend %s for %ss", backend.url, self.eject_seconds)
+            backend.ejected_until = time.monotonic() + self.eject_seconds
+
+    async def check_health(self) -> None:
+        """Probe every backend once."""
+        await asyncio.gather(*(self._probe(backend) for backend in self.backends))
+
+    async def _probe(self, backend: OllamaBackend) -> None:
+        try:
+            await backend.client.ps()
+        except Exception as e:
+            logger.debug("Health check failed for %s: %s", backend.url, e)
+            self.record_failure(backend)
+        else:
+            self.record_success(backend)
+
+    async def start(self) -> None:
+        """Start periodic health checks."""
+        if self._task is None and settings.OLLAMA_HEALTH_CHECK_INTERVAL_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop periodic health checks."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.check_health()
+            await asyncio.sleep(settings.OLLAMA_HEALTH_CHECK_INTERVAL_SECONDS)
+
+
+ollama_pool = OllamaBackendPool(
+    settings.OLLAMA_BACKENDS,
+    eject_after=settings.OLLAMA_EJECT_AFTER_FAILURES,
+    eject_seconds=settings.OLLAMA_EJECT_SECONDS,
+)
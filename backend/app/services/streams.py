@@ -0,0 +1,217 @@
+"""Resumable assistant replies.
+
+A reply is stored as soon as its generation starts, with
+`finish_reason="streaming"`, and its text is checkpointed to that row as it
+streams in, at most every `STREAM_CHECKPOINT_INTERVAL_SECONDS`. The worker
+generating it also keeps the text in memory.
+
+A client that lost the stream resumes it from a character offset without
+another model call: on the generating worker it follows the reply as the
+tokens arrive, on any other worker it follows the checkpoints until the row is
+finished.
+
+A worker that crashes mid-reply leaves its row "streaming". `StaleReplySweeper`
+marks such rows "error" once they are `STREAM_STALE_AFTER_SECONDS` old, which
+also ends resumes following them; prompts never include "streaming" rows.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from uuid import UUID
+
+from sqlalchemy import update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, col
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.session import chat_engines
+from app.models.chat import Message
+
+
+logger = logging.getLogger(__name__)
+
+STREAMING = "streaming"  # finish_reason of a reply that is still being generated
+
+resumed_replies = metrics.counter(
+    "chat_replies_resumed_total",
+    "Replies resumed by a client that lost the stream (live: on the generating worker)",
+    ["source"],
+)
+
+
+class StreamResumeError(Exception):
+    """Raised when a reply cannot be resumed."""
+
+
+class ReplyStream:
+    """A reply being generated in this worker: its text so far and who follows it."""
+
+    def __init__(
+        self,
+        message_id: UUID,
+        session_id: UUID,
+        checkpoint: Callable[[str], None],
+        interval: float,
+    ) -> None:
+        self.message_id = message_id
+        self.session_id = session_id
+        self.text = ""
+        self.done = False
+        self.loop = asyncio.get_running_loop()
+        self._checkpoint = checkpoint  # Stores the text so far, run in the threadpool
+        self._interval = interval
+        self._checkpointed_at = time.monotonic()
+        self._writing: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    def append(self, text: str) -> None:
+        """Add text, wake the followers and checkpoint if the last one is old enough."""
+        self.text += text
+        self._notify()
+        if self._writing is None and time.monotonic() - self._checkpointed_at >= self._interval:
+            self._writing = asyncio.create_task(self._write(self.text))
+
+    async def flush(self) -> None:
+        """Wait for a checkpoint being written, before the caller stores the final text."""
+        if self._writing is not None:
+            with suppress(Exception):
+                await asyncio.shield(self._writing)
+
+    def finish(self) -> None:
+        """Mark the reply complete (or abandoned) and release the followers."""
+        self.done = True
+        self._notify()
+
+    async def follow(self, offset: int) -> AsyncIterator[str]:
+        """Yield the text from `offset` on as it arrives, until the reply is done."""
+        while True:
+            changed = self._changed
+            if len(self.text) > offset:
+                yield self.text[offset:]
+                offset = len(self.text)
+            if self.done:
+                return
+            await changed.wait()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _write(self, text: str) -> None:
+        try:
+            await run_in_threadpool(self._checkpoint, text)
+        except Exception as e:
+            logger.warning("Could not checkpoint reply %s: %s", self.message_id, e)
+        finally:
+            self._checkpointed_at = time.monotonic()
+            self._writing = None
+
+
+class ReplyStreams:
+    """Replies being generated by this worker, by message id."""
+
+    def __init__(self) -> None:
+        self._streams: dict[UUID, ReplyStream] = {}
+
+    def open(
+        self, message_id: UUID, session_id: UUID, checkpoint: Callable[[str], None]
+    ) -> ReplyStream:
+        stream = ReplyStream(
+            message_id, session_id, checkpoint, settings.STREAM_CHECKPOINT_INTERVAL_SECONDS
+        )
+        self._streams[message_id] = stream
+        return stream
+
+    def get(self, message_id: UUID) -> ReplyStream | None:
+        """The live stream of a reply, if this worker's event loop is generating it."""
+        stream = self._streams.get(message_id)
+        if stream is None or stream.loop is not asyncio.get_running_loop():
+            return None
+        return stream
+
+    def close(self, stream: ReplyStream) -> None:
+        """Finish a stream once its final text is stored."""
+        stream.finish()
+        self._streams.pop(stream.message_id, None)
+
+
+async def follow_checkpoints(
+    read: Callable[[], tuple[str, str | None] | None], offset: int
+) -> AsyncIterator[str]:
+    """Follow a reply generated elsewhere through the checkpoints of its row.
+
+    `read` returns the row's content and finish reason, or None once the row is
+    gone (the generation failed or was cancelled before any output).
+    """
+    idle_since = time.monotonic()
+    while True:
+        row = read()
+        if row is None:
+            raise StreamResumeError("The reply was not completed")
+        text, finish_reason = row
+        if len(text) > offset:
+            yield text[offset:]
+            offset = len(text)
+            idle_since = time.monotonic()
+        if finish_reason != STREAMING:
+            return
+        if time.monotonic() - idle_since > settings.STREAM_RESUME_IDLE_SECONDS:
+            raise StreamResumeError("The reply is no longer being generated")
+        await asyncio.sleep(settings.STREAM_CHECKPOINT_INTERVAL_SECONDS)
+
+
+def fail_stale_replies(engine: Engine, older_than: float) -> int:
+    """Mark replies still "streaming" `older_than` seconds after they started as "error"."""
+    cutoff = datetime.now(UTC) - timedelta(seconds=older_than)
+    with Session(engine) as session:
+        result = session.execute(
+            update(Message)
+            .where(col(Message.finish_reason) == STREAMING, col(Message.created_at) < cutoff)
+            .values(finish_reason="error")
+        )
+        session.commit()
+    return result.rowcount
+
+
+class StaleReplySweeper:
+    """Mark abandoned "streaming" replies at startup and then periodically."""
+
+    def __init__(self, engines: list[Engine]) -> None:
+        self.engines = engines
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Start the sweep loop."""
+        if self._task is None and settings.STREAM_STALE_AFTER_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the sweep loop."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        older_than = settings.STREAM_STALE_AFTER_SECONDS
+        while True:
+            for engine in self.engines:
+                try:
+                    failed = await run_in_threadpool(fail_stale_replies, engine, older_than)
+                except Exception as e:
+                    logger.warning("Could not mark stale replies: %s", e)
+                else:
+                    if failed:
+                        logger.warning("Marked %d abandoned streaming replies as error", failed)
+            await asyncio.sleep(older_than)
+
+
+reply_streams = ReplyStreams()
+stale_reply_sweeper = StaleReplySweeper(chat_engines())
@@ -0,0 +1,66 @@
+"""Automatic chat session titles, generated by background jobs."""
+
+from functools import partial
+from uuid import UUID
+
+from sqlmodel import select
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.session import RoutingSession
+from app.models.chat import DEFAULT_SESSION_TITLE, ChatSession, Message
+from app.services.background import background_jobs
+from app.services.llm import LLMService
+
+
+# Title jobs only need the opening of the conversation
+TITLE_CONTEXT_MESSAGES = 2
+
+
+def schedule_title_generation(session_id: UUID, user_id: UUID) -> bool:
+    """Queue a title job for a chat session, at most one per session at a time."""
+    if not settings.TITLE_GENERATION_ENABLED:
+        return False
+    return background_jobs.submit(
+        f"title:{session_id}",
+        partial(generate_session_title, session_id, user_id),
+        kind="title",
+    )
+
+
+async def generate_session_title(session_id: UUID, user_id: UUID) -> None:
+    """Generate and store a title for a chat session that still has the default one."""
+    opening = await run_in_threadpool(_load_opening, session_id, user_id)
+    if not opening:
+        return
+
+    title = await LLMService().generate_title(opening)
+    if title:
+        await run_in_threadpool(_save_title, session_id, user_id, title)
+
+
+def _load_opening(session_id: UUID, user_id: UUID) -> list[Message]:
+    """Load the first messages of a chat session that still needs a title."""
+    with RoutingSession() as session:
+        session.info["user_id"] = str(user_id)
+        chat_session = session.get(ChatSession, session_id)
+        if not chat_session or chat_session.title != DEFAULT_SESSION_TITLE:
+            return []
+        statement = (
+            select(Message)
+            .where(Message.chat_session_id == session_id)
+            .order_by(Message.created_at.asc())  # type: ignore[union-attr]
+            .limit(TITLE_CONTEXT_MESSAGES)
+        )
+        return list(session.exec(statement).all())
+
+
+def _save_title(session_id: UUID, user_id: UUID, title: str) -> None:
+    """Store a generated title unless the user renamed the session meanwhile."""
+    with RoutingSession() as session:
+        session.info["user_id"] = str(user_id)
+        chat_session = session.get(ChatSession, session_id)
+        if chat_session and chat_session.title == DEFAULT_SESSION_TITLE:
+            chat_session.title = title
+            session.add(chat_session)
+            session.commit()
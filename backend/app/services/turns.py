@@ -0,0 +1,165 @@
+"""One chat turn at a time per session, any number of sessions in parallel.
+
+A turn reads the session's history, generates a reply and stores it. Two turns
+of the same session running together would both answer the same history, so
+later turns wait for the running one. Waiters in a worker queue on an asyncio
+lock per session. With `TURN_LOCK_BACKEND=postgres` the turn also holds a
+PostgreSQL advisory lock on the session, which serializes turns across workers
+and replicas; each worker then uses at most one connection per busy session.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from functools import partial
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db.session import engine
+
+
+logger = logging.getLogger(__name__)
+
+turn_wait_seconds = metrics.histogram(
+    "chat_turn_wait_seconds", "Time a chat turn waited for the previous turn of its session"
+)
+turns_waiting = metrics.gauge("chat_turns_waiting", "Chat turns queued behind another turn")
+
+ADVISORY_POLL_MAX_SECONDS = 0.5
+BUSY_MESSAGE = "Another message in this session is still being processed"
+
+
+class TurnBusyError(Exception):
+    """Raised when a turn waited too long for the previous turn of its session."""
+
+
+def advisory_key(session_id: UUID) -> int:
+    """Signed 64-bit advisory lock key for a chat session."""
+    return int.from_bytes(session_id.bytes[:8], "big", signed=True)
+
+
+class _SessionLock:
+    """An asyncio lock and the number of turns holding or waiting for it."""
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class TurnLocks:
+    """Serialize turns per chat session."""
+
+    def __init__(self, backend: str, engine: Engine, timeout: float) -> None:
+        self.backend = backend
+        self.engine = engine
+        self.timeout = timeout
+        self._locks: dict[UUID, _SessionLock] = {}
+        self._waiting = 0
+        turns_waiting.set_function(lambda: self._waiting)
+
+    @property
+    def distributed(self) -> bool:
+        """Whether turns are also serialized across workers."""
+        return self.backend == "postgres" and self.engine.dialect.name == "postgresql"
+
+    @asynccontextmanager
+    async def hold(self, session_id: UUID) -> AsyncIterator[None]:
+        """Wait until no other turn of the session runs, then run this one.
+
+        Raises `TurnBusyError` after waiting `timeout` seconds.
+        """
+        entry = self._locks.setdefault(session_id, _SessionLock())
+        entry.users += 1
+        connection: Connection | None = None
+        started = time.monotonic()
+        deadline = started + self.timeout if self.timeout else None
+        try:
+            self._waiting += 1
+            try:
+                try:
+                    async with asyncio.timeout(self.timeout or None):
+                        await entry.lock.acquire()
+                except TimeoutError as e:
+                    raise TurnBusyError(BUSY_MESSAGE) from e
+                try:
+                    if self.distributed:
+                        connection = await self._advisory_lock(advisory_key(session_id), deadline)
+                except BaseException:
+                    entry.lock.release()
+                    raise
+            finally:
+                # Also when the wait times out or is cancelled
+                self._waiting -= 1
+            turn_wait_seconds.observe(time.monotonic() - started)
+
+            try:
+                yield
+            finally:
+                if connection is not None:
+                    await run_in_threadpool(_advisory_unlock, connection, advisory_key(session_id))
+                entry.lock.release()
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                self._locks.pop(session_id, None)
+
+    async def _advisory_lock(self, key: int, deadline: float | None) -> Connection:
+        """Take the session's advisory lock on a dedicated connection."""
+        acquire = asyncio.ensure_future(
+            run_in_threadpool(_acquire_advisory_lock, self.engine, key, deadline)
+        )
+        try:
+            # Shielded: a cancelled turn must not abandon a lock the thread then takes
+            return await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            acquire.add_done_callback(partial(_release_abandoned, key))
+            raise
+
+
+def _acquire_advisory_lock(engine: Engine, key: int, deadline: float | None) -> Connection:
+    """Poll `pg_try_advisory_lock` with backoff until it succeeds or the deadline passes."""
+    connection = engine.connect()
+    try:
+        delay = 0.01
+        while True:
+            locked = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": key}
+            ).scalar()
+            # The lock belongs to the connection, don't keep a transaction open meanwhile
+            connection.commit()
+            if locked:
+                return connection
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise TurnBusyError(BUSY_MESSAGE)
+            time.sleep(delay)
+            delay = min(delay * 2, ADVISORY_POLL_MAX_SECONDS)
+    except BaseException:
+        connection.close()
+        raise
+
+
+def _release_abandoned(key: int, acquire: asyncio.Future) -> None:
+    if not acquire.cancelled() and acquire.exception() is None:
+        asyncio.get_running_loop().run_in_executor(None, _advisory_unlock, acquire.result(), key)
+
+
+def _advisory_unlock(connection: Connection, key: int) -> None:
+    try:
+        connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+        connection.commit()
+    except Exception as e:
+        # Ending the database session releases the lock
+        logger.warning("Could not release turn lock %d, dropping the connection: %s", key, e)
+        connection.invalidate()
+    finally:
+        connection.close()
+
+
+turn_locks = TurnLocks(settings.TURN_LOCK_BACKEND, engine, settings.TURN_LOCK_TIMEOUT_SECONDS)
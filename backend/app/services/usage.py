@@ -0,0 +1,141 @@
+"""Token usage and generation speed aggregated from stored assistant replies."""
+
+from datetime import datetime
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import func
+from sqlmodel import Session, col, select
+
+from app.db.session import read_only
+from app.models.chat import (
+    ChatSession,
+    Message,
+    MessageRole,
+    ModelUsageRead,
+    SessionUsageRead,
+    tokens_per_second,
+)
+from app.models.user import User
+
+
+class UsageService:
+    """Aggregate the token counts and timings stored on assistant messages."""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def _replies(self, since: datetime | None) -> list[Any]:
+        """Filters selecting assistant replies with usage, optionally since a time."""
+        filters = [
+            Message.role == MessageRole.ASSISTANT.value,
+            Message.completion_tokens.is_not(None),  # type: ignore[union-attr]
+        ]
+        if since is not None:
+            filters.append(Message.created_at >= since)
+        return filters
+
+    def _model_statement(self, since: datetime | None) -> Any:
+        """Usage aggregates per model over assistant replies."""
+        return (
+            select(
+                Message.model,
+                func.count().label("messages"),
+                func.coalesce(func.sum(Message.prompt_tokens), 0).label("prompt_tokens"),
+                func.coalesce(func.sum(Message.completion_tokens), 0).label("completion_tokens"),
+                func.avg(Message.prompt_tokens).label("avg_prompt_tokens"),
+                func.max(Message.prompt_tokens).label("max_prompt_tokens"),
+                func.avg(Message.load_duration_ms).label("avg_load_duration_ms"),
+                func.sum(Message.eval_duration_ms).label("eval_duration_ms"),
+            )
+            .select_from(Message)
+            .join(ChatSession, ChatSession.id == Message.chat_session_id)  # type: ignore[arg-type]
+            .where(*self._replies(since))
+            .group_by(Message.model)
+        )
+
+    @read_only
+    def by_model(self, user_id: UUID, since: datetime | None = None) -> list[ModelUsageRead]:
+        """A user's usage per model."""
+        statement = (
+            self._model_statement(since)
+            .where(ChatSession.user_id == user_id)
+            .order_by(Message.model)
+        )
+        return [_model_usage(row) for row in self.session.execute(statement)]
+
+    @read_only
+    def by_user_and_model(self, since: datetime | None = None) -> list[tuple[str, ModelUsageRead]]:
+        """Every user's usage per model as `(username, usage)`.
+
+        Aggregated on each shard, as users and chat data may be on different
+        databases, then given the usernames.
+        """
+        statement = (
+            self._model_statement(since)
+            .add_columns(ChatSession.user_id)
+            .group_by(ChatSession.user_id)
+        )
+        rows = []
+        for shard in getattr(self.session, "shards", None) or [None]:
+            bind_arguments = {"bind": shard} if shard is not None else None
+            rows.extend(self.session.execute(statement, bind_arguments=bind_arguments))
+        names = select(User.id, User.username).where(
+            col(User.id).in_({row.user_id for row in rows})
+        )
+        usernames = dict(self.session.execute(names).tuples().all())
+        return sorted(
+            ((usernames.get(row.user_id, str(row.user_id)), _model_usage(row)) for row in rows),
+            key=lambda entry: (entry[0], entry[1].model or ""),
+        )
+
+    @read_only
+    def largest_sessions(
+        self, user_id: UUID, limit: int = 10, since: datetime | None = None
+    ) -> list[SessionUsageRead]:
+        """A user's sessions with the longest prompts first."""
+        max_prompt = func.max(Message.prompt_tokens)
+        statement = (
+            select(
+                ChatSession.id,
+                ChatSession.title,
+                func.count().label("messages"),
+                func.coalesce(func.sum(Message.prompt_tokens), 0).label("prompt_tokens"),
+                func.coalesce(func.sum(Message.completion_tokens), 0).label("completion_tokens"),
+                max_prompt.label("max_prompt_tokens"),
+            )
+            .select_from(Message)
+            .join(ChatSession, ChatSession.id == Message.chat_session_id)  # type: ignore[arg-type]
+            .where(ChatSession.user_id == user_id, *self._replies(since))
+            .group_by(ChatSession.id, ChatSession.title)
+            .order_by(max_prompt.desc())
+            .limit(limit)
+        )
+        return [
+            SessionUsageRead(
+                session_id=row.id,
+                title=row.title,
+                messages=row.messages,
+                prompt_tokens=row.prompt_tokens,
+                completion_tokens=row.completion_tokens,
+                max_prompt_tokens=row.max_prompt_tokens,
+            )
+            for row in self.session.execute(statement)
+        ]
+
+
+def _model_usage(row: Any) -> ModelUsageRead:
+    return ModelUsageRead(
+        model=row.model,
+        messages=row.messages,
+        prompt_tokens=row.prompt_tokens,
+        completion_tokens=row.completion_tokens,
+        avg_prompt_tokens=_round(row.avg_prompt_tokens),
+        max_prompt_tokens=row.max_prompt_tokens,
+        avg_load_duration_ms=_round(row.avg_load_duration_ms),
+        tokens_per_second=tokens_per_second(row.completion_tokens, row.eval_duration_ms),
+    )
+
+
+def _round(value: Any) -> float | None:
+    return None if value is None else round(float(value), 2)
@@ -0,0 +1,129 @@
+"""Model warm-up, keep-alive and readiness tracking."""
+
+import asyncio
+import logging
+import time
+from contextlib import ExitStack, suppress
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.db.session import engine
+from app.services.model_router import model_router
+from app.services.ollama_pool import ollama_pool
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_MIN_SECONDS = 1.0  # First retry after a failed warm-up, doubling up to the max
+RETRY_MAX_SECONDS = 30.0
+
+
+class ModelWarmer:
+    """Keep the chat model resident in Ollama and track instance readiness.
+
+    The instance reports ready once the model has been loaded and the database
+    pool holds open connections. While running, the model is re-warmed and the
+    database checked periodically so Ollama never unloads it between requests;
+    failures are retried on a short backoff rather than after a full interval.
+    """
+
+    def __init__(self) -> None:
+        self.model_ready = not settings.OLLAMA_WARMUP_ENABLED
+        self.db_ready = False
+        self.last_warmed_at: float | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether the instance can serve chat traffic."""
+        return self.model_ready and self.db_ready
+
+    async def warm_model(self) -> bool:
+        """Load the chat models on every Ollama backend with the configured keep-alive.
+
+        The instance is ready once at least one backend has every model loaded.
+        """
+        results = await asyncio.gather(
+            *(self._warm_backend(backend.url) for backend in ollama_pool.backends)
+        )
+        if not any(results):
+            self.model_ready = False
+            return False
+
+        self.model_ready = True
+        self.last_warmed_at = time.time()
+        return True
+
+    async def _warm_backend(self, url: str) -> bool:
+        from ollama import AsyncClient
+
+        async with AsyncClient(host=url) as client:
+            for model in model_router.active_models():
+                try:
+                    # Loading a large model takes a while, but a hung host must not block readiness
+                    async with asyncio.timeout(settings.OLLAMA_WARMUP_TIMEOUT_SECONDS or None):
+                        # An empty prompt only loads the model, it does not generate anything
+                        await client.generate(
+                            model=model, prompt="", keep_alive=settings.OLLAMA_KEEP_ALIVE
+                        )
+                except Exception as e:
+                    logger.warning("Model warm-up failed for %s on %s: %s", model, url, repr(e))
+                    return False
+        return True
+
+    async def warm_db(self) -> bool:
+        """Fill the connection pool so the first requests skip connection setup."""
+        try:
+            await run_in_threadpool(_open_pool_connections)
+        except Exception as e:
+            logger.warning("Database warm-up failed: %s", e)
+            self.db_ready = False
+            return False
+
+        self.db_ready = True
+        return True
+
+    async def start(self) -> None:
+        """Start warming in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background warm-up loop."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        """Warm until ready, then re-warm the model and re-check the database on an interval."""
+        rewarm = settings.OLLAMA_WARMUP_ENABLED and settings.OLLAMA_REWARM_INTERVAL_SECONDS > 0
+        retry_delay = RETRY_MIN_SECONDS
+        while True:
+            await self.warm_db()
+            if rewarm or not self.model_ready:
+                await self.warm_model()
+            if not self.ready:
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, RETRY_MAX_SECONDS)
+                continue
+
+            retry_delay = RETRY_MIN_SECONDS
+            if settings.OLLAMA_REWARM_INTERVAL_SECONDS <= 0:
+                return
+            await asyncio.sleep(settings.OLLAMA_REWARM_INTERVAL_SECONDS)
+
+
+def _open_pool_connections() -> None:
+    """Check out a full pool of connections at once, then return them to the pool."""
+    pool_size = getattr(engine.pool, "size", lambda: 1)()
+    with ExitStack() as stack:
+        for _ in range(pool_size):
+            connection = stack.enter_context(engine.connect())
+            connection.execute(text("SELECT 1"))
+
+
+warmer = ModelWarmer()
@@ -0,0 +1,124 @@
+"""Benchmark ORM reads against column projections on the chat hot paths.
+
+Compares, on an in-memory SQLite database:
+
+- prompt history: `get_session_messages` (ORM instances) vs `get_history` (tuples)
+- session listing: ORM `ChatSession` instances vs the projected `get_user_sessions`
+
+Usage (from backend/):
+    python -m benchmarks.read_paths --messages 2000 --sessions 500
+"""
+
+import argparse
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from typing import Any
+from uuid import uuid4
+
+from sqlalchemy import insert
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models.chat import ChatSession, Message
+from app.models.user import User
+from app.services.chat import ChatService
+
+
+def _populate(session: Session, messages: int, sessions: int) -> tuple[Any, Any]:
+    user = User(email="bench@example.com", username="bench", hashed_password="x")
+    session.add(user)
+    session.commit()
+
+    started = datetime.now(UTC) - timedelta(days=1)
+    chat_sessions = [
+        {"id": uuid4(), "user_id": user.id, "title": f"Session {i}", "created_at": started}
+        for i in range(sessions)
+    ]
+    session.execute(insert(ChatSession), chat_sessions)
+    long_session = chat_sessions[0]["id"]
+    rows = [
+        {
+            "id": uuid4(),
+            "chat_session_id": long_session,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"Message {i} " + "lorem ipsum dolor sit amet " * 20,
+            "created_at": started + timedelta(seconds=i),
+        }
+        for i in range(messages)
+    ]
+    session.execute(insert(Message), rows)
+    session.commit()
+    return user.id, long_session
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> tuple[float, float]:
+    """Median seconds per call and peak MiB allocated by one call."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), peak / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000, help="Messages in the long session")
+    parser.add_argument("--sessions", type=int, default=500, help="Sessions in the listing")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        user_id, long_session = _populate(session, args.messages, args.sessions)
+
+    def fresh(call: Callable[[ChatService], Any]) -> Callable[[], Any]:
+        # A new session per call, as in a request, so the identity map starts empty
+        def run() -> Any:
+            with Session(engine) as session:
+                return call(ChatService(session))
+
+        return run
+
+    def orm_sessions(service: ChatService) -> list[ChatSession]:
+        statement = (
+            select(ChatSession)
+            .where(ChatSession.user_id == user_id)
+            .order_by(ChatSession.created_at.desc())  # type: ignore[union-attr]
+        )
+        return list(service.session.exec(statement).all())
+
+    cases = [
+        (
+            f"history ({args.messages} messages)",
+            fresh(lambda s: s.get_session_messages(long_session)),
+            fresh(lambda s: s.get_history(long_session)),
+        ),
+        (
+            f"listing ({args.sessions} sessions)",
+            fresh(orm_sessions),
+            fresh(lambda s: s.get_user_sessions(user_id)),
+        ),
+    ]
+
+    print(f"{'read path':<28}{'ORM ms':>10}{'lean ms':>10}{'ORM MiB':>10}{'lean MiB':>10}")
+    for name, orm, lean in cases:
+        orm_seconds, orm_peak = _measure(orm, args.repeat)
+        lean_seconds, lean_peak = _measure(lean, args.repeat)
+        print(
+            f"{name:<28}{orm_seconds * 1000:>10.2f}{lean_seconds * 1000:>10.2f}"
+            f"{orm_peak:>10.2f}{lean_peak:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Replay conversations against Ollama to compare the generation cost of configurations.
+
+Each user message of each conversation becomes one request whose prompt is
+built by `LLMService._convert_messages` from the conversation up to that
+message, exactly as the app would build it. Recorded assistant replies stay in
+the history, so every configuration answers the same prompts.
+
+A configuration is a model and a system prompt; all combinations of `--model`
+and `--system-prompt` are replayed one after another and reported side by side:
+time to first token, generation speed, prompt evaluation time and model time
+(load + prompt evaluation + generation, as reported by Ollama), optionally
+priced with `--cost-per-hour`.
+
+Usage (from backend/):
+    python -m benchmarks.replay --export chat-history.ndjson --model llama3.2:3b --model qwen3:4b
+    python -m benchmarks.replay --synthetic 20 --turns 6 --concurrency 4 --json report.json
+    python -m benchmarks.replay --synthetic 5 --standin  # No Ollama needed
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import time
+from collections.abc import Iterator, Sequence
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+from uuid import UUID, uuid4
+
+from app.core.config import settings
+from app.models.chat import HistoryMessage, MessageRole
+from app.services.llm import LLMService
+from app.services.ollama_pool import OllamaBackend
+
+
+TOPICS = ["python", "databases", "cooking", "travel", "astronomy", "music", "gardening"]
+
+
+@dataclass
+class Configuration:
+    """What is being compared: a model and the system prompt sent with every request."""
+
+    model: str
+    system_prompt: str
+    prompt_name: str = "default"
+
+    @property
+    def name(self) -> str:
+        return f"{self.model} / {self.prompt_name}"
+
+
+@dataclass
+class Sample:
+    """Timings of one replayed request; durations in milliseconds."""
+
+    ttft_ms: float | None = None
+    total_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    prompt_eval_ms: float = 0.0
+    eval_ms: float = 0.0
+    load_ms: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class Report:
+    """Aggregates of one configuration's replay."""
+
+    configuration: str
+    requests: int
+    errors: int
+    wall_seconds: float
+    ttft_p50_ms: float | None
+    ttft_p95_ms: float | None
+    tokens_per_second: float | None  # Generation speed of a single stream
+    throughput_tokens_per_second: float  # Completion tokens per wall second, all streams
+    prompt_tokens: int
+    completion_tokens: int
+    prompt_eval_p50_ms: float | None
+    model_seconds: float  # Load + prompt evaluation + generation
+    cost: float | None = None
+    samples: list[Sample] = field(default_factory=list, repr=False)
+
+
+def load_export(path: Path) -> list[list[HistoryMessage]]:
+    """Conversations of a history export (`GET /chat/export`), messages oldest first."""
+    conversations: dict[UUID, list[HistoryMessage]] = {}
+    with path.open(encoding="utf-8") as lines:
+        for line in lines:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if data.get("type") != "message":
+                continue
+            session_id = UUID(data["session_id"])
+            conversations.setdefault(session_id, []).append(
+                HistoryMessage(uuid4(), session_id, data["role"], data["content"])
+            )
+    return list(conversations.values())
+
+
+def synthetic_conversations(count: int, turns: int, seed: int = 0) -> list[list[HistoryMessage]]:
+    """Conversations of `turns` questions and canned answers growing in length."""
+    rng = random.Random(seed)
+    conversations = []
+    for _ in range(count):
+        session_id = uuid4()
+        topic = rng.choice(TOPICS)
+        messages = []
+        for turn in range(turns):
+            question = f"Question {turn + 1} about {topic}: " + "please explain in detail. " * (
+                1 + rng.randrange(4)
+            )
+            answer = f"Answer {turn + 1} about {topic}. " + "Here is some detail. " * (
+                5 + rng.randrange(20)
+            )
+            messages.append(HistoryMessage(uuid4(), session_id, MessageRole.USER.value, question))
+            messages.append(
+                HistoryMessage(uuid4(), session_id, MessageRole.ASSISTANT.value, answer)
+            )
+        conversations.append(messages)
+    return conversations
+
+
+def prompts(conversations: Sequence[list[HistoryMessage]]) -> Iterator[list[HistoryMessage]]:
+    """The history sent for each user message: the conversation up to and including it."""
+    for messages in conversations:
+        for i, message in enumerate(messages):
+            if message.role == MessageRole.USER:
+                yield messages[: i + 1]
+
+
+async def replay_one(llm: Any, messages: list[Any], model: str) -> Sample:
+    """Stream one request the way `LLMService.stream_response` does and time it."""
+    sample = Sample()
+    started = time.perf_counter()
+    try:
+        async for chunk in llm.astream(messages, model=model):
+            if sample.ttft_ms is None and chunk.content:
+                sample.ttft_ms = (time.perf_counter() - started) * 1000
+            metadata = chunk.response_metadata
+            if metadata.get("done"):
+                sample.prompt_tokens = metadata.get("prompt_eval_count") or 0
+                sample.completion_tokens = metadata.get("eval_count") or 0
+                sample.prompt_eval_ms = (metadata.get("prompt_eval_duration") or 0) / 1e6
+                sample.eval_ms = (metadata.get("eval_duration") or 0) / 1e6
+                sample.load_ms = (metadata.get("load_duration") or 0) / 1e6
+    except Exception as e:
+        sample.error = f"{type(e).__name__}: {e}"
+    sample.total_ms = (time.perf_counter() - started) * 1000
+    return sample
+
+
+async def replay(
+    url: str,
+    configuration: Configuration,
+    histories: list[list[HistoryMessage]],
+    concurrency: int,
+    cost_per_hour: float | None = None,
+) -> Report:
+    """Replay every prompt with one configuration, `concurrency` requests at a time."""
+    llm_service = LLMService()
+    llm_service.system_prompt = configuration.system_prompt
+    llm = OllamaBackend(url).llm
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(history: list[HistoryMessage]) -> Sample:
+        async with slots:
+            return await replay_one(
+                llm, llm_service._convert_messages(history), configuration.model
+            )
+
+    started = time.perf_counter()
+    samples = await asyncio.gather(*(run(history) for history in histories))
+    return summarize(configuration, samples, time.perf_counter() - started, cost_per_hour)
+
+
+def summarize(
+    configuration: Configuration,
+    samples: list[Sample],
+    wall_seconds: float,
+    cost_per_hour: float | None = None,
+) -> Report:
+    ok = [sample for sample in samples if sample.error is None]
+    ttfts = sorted(sample.ttft_ms for sample in ok if sample.ttft_ms is not None)
+    completion_tokens = sum(sample.completion_tokens for sample in ok)
+    eval_ms = sum(sample.eval_ms for sample in ok)
+    model_seconds = sum(sample.load_ms + sample.prompt_eval_ms + sample.eval_ms for sample in ok)
+    model_seconds /= 1000
+    return Report(
+        configuration=configuration.name,
+        requests=len(samples),
+        errors=len(samples) - len(ok),
+        wall_seconds=round(wall_seconds, 3),
+        ttft_p50_ms=_percentile(ttfts, 0.5),
+        ttft_p95_ms=_percentile(ttfts, 0.95),
+        tokens_per_second=round(completion_tokens * 1000 / eval_ms, 2) if eval_ms else None,
+        throughput_tokens_per_second=round(completion_tokens / wall_seconds, 2)
+        if wall_seconds
+        else 0.0,
+        prompt_tokens=sum(sample.prompt_tokens for sample in ok),
+        completion_tokens=completion_tokens,
+        prompt_eval_p50_ms=round(statistics.median(s.prompt_eval_ms for s in ok), 2)
+        if ok
+        else None,
+        model_seconds=round(model_seconds, 3),
+        cost=round(model_seconds / 3600 * cost_per_hour, 6) if cost_per_hour is not None else None,
+        samples=samples,
+    )
+
+
+def _percentile(values: list[float], fraction: float) -> float | None:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(fraction * len(values)))], 2)
+
+
+def print_reports(reports: list[Report]) -> None:
+    columns = [
+        ("configuration", "configuration", 32, "s"),
+        ("reqs", "requests", 6, "d"),
+        ("errs", "errors", 6, "d"),
+        ("ttft p50", "ttft_p50_ms", 10, ".1f"),
+        ("ttft p95", "ttft_p95_ms", 10, ".1f"),
+        ("tok/s", "tokens_per_second", 8, ".1f"),
+        ("all tok/s", "throughput_tokens_per_second", 10, ".1f"),
+        ("prompt tok", "prompt_tokens", 11, "d"),
+        ("eval p50", "prompt_eval_p50_ms", 10, ".1f"),
+        ("model s", "model_seconds", 9, ".2f"),
+        ("cost", "cost", 10, ".4f"),
+    ]
+    print(
+        "".join(
+            f"{title:<{width}}" if i == 0 else f"{title:>{width}}"
+            for i, (title, _key, width, _fmt) in enumerate(columns)
+        )
+    )
+    for report in reports:
+        cells = []
+        for i, (_title, key, width, fmt) in enumerate(columns):
+            value = getattr(report, key)
+            text = "-" if value is None else format(value, fmt)
+            cells.append(f"{text:<{width}}" if i == 0 else f"{text:>{width}}")
+        print("".join(cells))
+
+
+def _configurations(models: list[str], prompt_files: list[Path]) -> list[Configuration]:
+    system_prompts = [
+        (path.stem, path.read_text(encoding="utf-8").strip()) for path in prompt_files
+    ]
+    if not system_prompts:
+        system_prompts = [("default", LLMService().system_prompt)]
+    return [
+        Configuration(model=model, system_prompt=prompt, prompt_name=name)
+        for model, (name, prompt) in itertools.product(models, system_prompts)
+    ]
+
+
+async def _main(args: argparse.Namespace) -> list[Report]:
+    if args.export:
+        conversations = load_export(args.export)
+    else:
+        conversations = synthetic_conversations(args.synthetic, args.turns, args.seed)
+    histories = list(prompts(conversations))
+    if args.max_prompts:
+        histories = histories[: args.max_prompts]
+    configurations = _configurations(args.model or [settings.OLLAMA_MODEL], args.system_prompt)
+
+    url = args.url
+    standin = None
+    if args.standin:
+        from tests.ollama_standin import OllamaStandIn
+
+        standin = OllamaStandIn(reply="Stand-in reply " * 20, tokens=20, chunk_delay=0.005)
+        await standin.start()
+        url = standin.url
+    try:
+        reports = []
+        for configuration in configurations:
+            reports.append(
+                await replay(url, configuration, histories, args.concurrency, args.cost_per_hour)
+            )
+    finally:
+        if standin is not None:
+            await standin.stop()
+    return reports
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--export", type=Path, help="History export (NDJSON) to replay")
+    source.add_argument("--synthetic", type=int, default=10, help="Synthetic conversations")
+    parser.add_argument(
+        "--turns", type=int, default=4, help="User turns per synthetic conversation"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-prompts", type=int, default=0, help="Replay at most this many")
+    parser.add_argument("--model", action="append", help="Model to compare (repeatable)")
+    parser.add_argument(
+        "--system-prompt",
+        action="append",
+        type=Path,
+        default=[],
+        help="File with a system prompt to compare (repeatable, default: the app's)",
+    )
+    parser.add_argument("--url", default=settings.OLLAMA_BASE_URL, help="Ollama to replay against")
+    parser.add_argument("--standin", action="store_true", help="Replay against a local stand-in")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--cost-per-hour", type=float, help="Price of one hour of model time")
+    parser.add_argument("--json", type=Path, help="Also write the reports to this file")
+    args = parser.parse_args()
+
+    reports = asyncio.run(_main(args))
+    print_reports(reports)
+    if args.json:
+        data = [asdict(report) for report in reports]
+        args.json.write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,20 @@ from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine
 from sqlmodel.pool import StaticPool
 
+from app.core.ratelimit import MemoryRateLimitBackend, rate_limiter
 from app.db.session import get_session
 from app.main import app
 
 
+TEST_USER = {"email": "tester@example.com", "username": "tester", "password": "password123"}
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limits(monkeypatch):
+    """Start every test with full rate limit buckets."""
+    monkeypatch.setattr(rate_limiter, "backend", MemoryRateLimitBackend())
+
+
 @pytest.fixture(name="session")
 def session_fixture():
     """Create a test database session."""
@@ -33,3 +43,34 @@ def client_fixture(session: Session):
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
+
+
+@pytest.fixture(name="login")
+def login_fixture(client):
+    """Log in as the test user, registering it on first use; returns the tokens."""
+    registered = False
+
+    def login(password: str = TEST_USER["password"]) -> dict:
+        nonlocal registered
+        if not registered:
+            client.post("/api/v1/auth/register", json=TEST_USER)
+            registered = True
+        response = client.post(
+            "/api/v1/auth/login", json={"username": TEST_USER["username"], "password": password}
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    return login
+
+
+@pytest.fixture(name="access_token")
+def access_token_fixture(login):
+    """Register the test user and return an access token."""
+    return login()["access_token"]
+
+
+@pytest.fixture(name="auth_headers")
+def auth_headers_fixture(access_token):
+    """Register the test user and return auth headers."""
+    return {"Authorization": f"Bearer {access_token}"}
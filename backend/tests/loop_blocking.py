@@ -0,0 +1,23 @@
+"""Fail a test when code it runs on the event loop blocks the loop for too long."""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from app.core.config import settings
+from app.core.loop_monitor import BlockedCall, CallbackTimer
+
+
+@contextmanager
+def assert_no_blocking(budget_ms: float | None = None) -> Iterator[list[BlockedCall]]:
+    """Fail if any event loop callback run inside the block takes longer than the budget.
+
+    Covers every asyncio loop of the process, including the one `TestClient`
+    runs the app on. The budget defaults to `LOOP_BLOCK_THRESHOLD_MS`.
+    """
+    budget = settings.LOOP_BLOCK_THRESHOLD_MS if budget_ms is None else budget_ms
+    blocked: list[BlockedCall] = []
+    with CallbackTimer(budget, blocked.append):
+        yield blocked
+    if blocked:
+        details = "\n".join(call.describe() for call in blocked)
+        raise AssertionError(f"Event loop blocked for more than {budget:.0f} ms:\n{details}")
@@ -0,0 +1,214 @@
+"""Minimal stand-ins for Ollama, for tests without a real model.
+
+`OllamaStandIn` serves the HTTP API; `ScriptedChatModel` replaces the LangChain
+chat model of `OllamaBackend` (`monkeypatch.setattr(OllamaBackend, "llm", ...)`).
+"""
+
+import asyncio
+import json
+import re
+import socket
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any
+
+
+class ScriptedChatModel:
+    """Streams a scripted reply word by word, recording how it was called.
+
+    `reply` and `metadata` may be functions of the messages. With `error`, calls
+    fail before the first token: all of them, or those whose last message is
+    `fail_on`. Like Ollama, `num_predict` in the options ends the reply early
+    with done_reason "length".
+    """
+
+    def __init__(
+        self,
+        reply: str | Callable[[list], str] = "Hello from stand-in",
+        delay: float = 0.0,
+        metadata: dict | Callable[[list], dict] | None = None,
+        error: Exception | None = None,
+        fail_on: str | None = None,
+    ) -> None:
+        self.reply = reply
+        self.delay = delay  # Before every word
+        self.metadata = metadata
+        self.error = error
+        self.fail_on = fail_on
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self.options: dict[str, Any] | None = None
+
+    async def astream(self, messages, **kwargs):
+        self.calls += 1
+        self.options = kwargs.get("options")
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            if self.error is not None and self.fail_on in (None, messages[-1].content):
+                raise self.error
+            reply = self.reply(messages) if callable(self.reply) else self.reply
+            words = re.findall(r"\S+\s*", reply)
+            limit = (self.options or {}).get("num_predict", len(words))
+            for word in words[:limit]:
+                await asyncio.sleep(self.delay)
+                yield SimpleNamespace(content=word, response_metadata={})
+            metadata = self.metadata(messages) if callable(self.metadata) else self.metadata
+            yield SimpleNamespace(
+                content="",
+                response_metadata={
+                    "done": True,
+                    "done_reason": "length" if limit < len(words) else "stop",
+                    **(metadata or {}),
+                },
+            )
+        finally:
+            self.running -= 1
+
+    async def ainvoke(self, messages, **kwargs):
+        content = ""
+        async for chunk in self.astream(messages, **kwargs):
+            content += chunk.content
+        return SimpleNamespace(content=content)
+
+
+class OllamaStandIn:
+    """Serve `/api/chat`, `/api/generate` and `/api/ps` with canned replies."""
+
+    def __init__(
+        self,
+        reply: str = "Hello from stand-in",
+        tokens: int = 3,
+        chunk_delay: float = 0.0,
+        hang: bool = False,
+    ) -> None:
+        self.reply = reply
+        self.tokens = tokens
+        self.chunk_delay = chunk_delay  # Stream chunks slowly, like a real model
+        self.hang = hang  # Accept requests but never answer, like a stuck host
+        self.requests: list[tuple[str, dict]] = []
+        self.aborted = 0  # Streams the client hung up on before the end
+        self.url = ""
+        self._server: asyncio.Server | None = None
+        self._stopping = asyncio.Event()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def _chunks(self, model: str) -> list[dict]:
+        words = self.reply.split(" ")
+        step = max(1, len(words) // self.tokens)
+        parts = [" ".join(words[i : i + step]) for i in range(0, len(words), step)]
+        chunks = [
+            {"model": model, "message": {"role": "assistant", "content": part + " "}, "done": False}
+            for part in parts
+        ]
+        chunks.append(
+            {
+                "model": model,
+                "message": {"role": "assistant", "content": ""},
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": 40_000_000,
+                "load_duration": 1_000_000,
+                "prompt_eval_count": 12,
+                "prompt_eval_duration": 5_000_000,
+                "eval_count": len(parts),
+                "eval_duration": 30_000_000,
+            }
+        )
+        return chunks
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        request_line = (await reader.readline()).decode()
+        if not request_line:
+            writer.close()
+            return
+        _method, path, _version = request_line.split(" ", 2)
+        headers = {}
+        while (line := (await reader.readline()).decode().strip()) != "":
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+        raw = await reader.readexactly(int(headers.get("content-length", 0)))
+        body = json.loads(raw) if raw else {}
+        self.requests.append((path, body))
+        if self.hang:
+            await self._stopping.wait()
+            writer.close()
+            return
+
+        model = body.get("model", "")
+        if path == "/api/chat" and body.get("stream", True) and self.chunk_delay:
+            await self._stream_slowly(reader, writer, model)
+            return
+        if path == "/api/chat" and body.get("stream", True):
+            payload = "".join(json.dumps(chunk) + "\n" for chunk in self._chunks(model))
+            content_type = "application/x-ndjson"
+        elif path == "/api/chat":
+            chunks = self._chunks(model)
+            final = chunks[-1] | {"message": {"role": "assistant", "content": self.reply}}
+            payload, content_type = json.dumps(final), "application/json"
+        elif path == "/api/generate":
+            payload = json.dumps({"model": model, "response": "", "done": True})
+            content_type = "application/json"
+        else:
+            payload, content_type = json.dumps({"models": []}), "application/json"
+
+        data = payload.encode()
+        writer.write(
+            (
+                "HTTP/1.1 200 OK\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode()
+            + data
+        )
+        await writer.drain()
+        writer.close()
+
+    async def _stream_slowly(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, model: str
+    ) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nConnection: close\r\n\r\n"
+        )
+        for chunk in self._chunks(model):
+            writer.write((json.dumps(chunk) + "\n").encode())
+            await writer.drain()
+            await asyncio.sleep(self.chunk_delay)
+            if reader.at_eof():
+                self.aborted += 1
+                break
+        writer.close()
+
+
+def unused_url() -> str:
+    """URL of a local port with nothing listening."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+@asynccontextmanager
+async def ollama_standins(count: int) -> AsyncIterator[list[OllamaStandIn]]:
+    """Run several stand-in Ollama servers."""
+    servers = [OllamaStandIn(reply=f"Hello from stand-in {i}") for i in range(count)]
+    for server in servers:
+        await server.start()
+    try:
+        yield servers
+    finally:
+        for server in servers:
+            await server.stop()
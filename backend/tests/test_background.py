@@ -0,0 +1,109 @@
+"""Background job runner tests."""
+
+import asyncio
+
+from app.services.background import BackgroundJob, BackgroundJobRunner
+
+
+def _runner() -> BackgroundJobRunner:
+    return BackgroundJobRunner(
+        concurrency=2,
+        max_attempts=3,
+        retry_base_delay=0.01,
+        max_queue_size=10,
+        max_defer_seconds=0.1,
+    )
+
+
+async def test_jobs_are_deduplicated_by_key():
+    """Test a key can only be queued once while its job is pending."""
+    runner = _runner()
+    await runner.start()
+    calls = []
+
+    async def job():
+        calls.append(1)
+
+    try:
+        assert runner.submit("title:1", job) is True
+        assert runner.submit("title:1", job) is False
+        await asyncio.sleep(0.05)
+        assert calls == [1]
+        assert runner.submit("title:1", job) is True
+    finally:
+        await runner.stop()
+
+
+async def test_failed_jobs_are_retried():
+    """Test a failing job is retried until it succeeds."""
+    runner = _runner()
+    await runner.start()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RuntimeError("model busy")
+
+    try:
+        runner.submit("title:2", flaky)
+        await asyncio.sleep(0.2)
+        assert len(attempts) == 3
+        assert runner.depth == 0
+    finally:
+        await runner.stop()
+
+
+async def test_retries_count_towards_depth_and_queue_cap():
+    """Test jobs waiting to be retried are part of the depth and the queue size limit."""
+    runner = BackgroundJobRunner(
+        concurrency=1,
+        max_attempts=3,
+        retry_base_delay=0.1,
+        max_queue_size=1,
+        max_defer_seconds=0.1,
+    )
+    await runner.start()
+
+    async def failing():
+        raise RuntimeError("model busy")
+
+    async def job():
+        pass
+
+    try:
+        runner.submit("title:1", failing)
+        await asyncio.sleep(0.02)
+        assert runner.depth == 1  # Waiting for its retry
+        assert runner.submit("title:2", job) is False
+    finally:
+        await runner.stop()
+    assert runner.depth == 0
+
+
+async def test_retry_is_dropped_when_queue_is_full():
+    """Test a retry coming due while the queue is full is dropped, not queued past the cap."""
+    runner = BackgroundJobRunner(
+        concurrency=0,  # Nothing consumes the queue
+        max_attempts=3,
+        retry_base_delay=0.01,
+        max_queue_size=1,
+        max_defer_seconds=0.1,
+    )
+    await runner.start()
+
+    async def job():
+        pass
+
+    try:
+        assert runner.submit("title:1", job) is True
+        retry = BackgroundJob(100, 0, "title:2", "title", job, attempts=1)
+        runner._keys.add(retry.key)
+
+        runner._requeue(retry)
+
+        assert runner.depth == 1
+        assert runner.submit("title:2", job) is False  # Full, but no longer a duplicate
+        assert "title:2" not in runner._keys
+    finally:
+        await runner.stop()
@@ -0,0 +1,94 @@
+"""Batch inference tests."""
+
+import json
+from uuid import uuid4
+
+import pytest
+
+from app.core.config import settings
+from app.services import llm
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.ollama_pool import OllamaBackend
+from tests.ollama_standin import ScriptedChatModel
+
+
+@pytest.fixture(name="model")
+def model_fixture(monkeypatch):
+    """Replace the chat model and start with a closed circuit."""
+    # Echoes the last prompt with the number of messages it was given
+    model = ScriptedChatModel(
+        lambda messages: f"{messages[-1].content} ({len(messages)})",
+        delay=0.01,
+        metadata={"prompt_eval_count": 7, "eval_count": 3},
+        error=ConnectionError("connection refused"),
+        fail_on="boom",
+    )
+    monkeypatch.setattr(OllamaBackend, "llm", model)
+    monkeypatch.setattr(llm, "ollama_circuit", CircuitBreaker("ollama", 5, reset_seconds=30))
+    return model
+
+
+def _run(client, headers, items):
+    response = client.post("/api/v1/chat/batch", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    return {result["index"]: result for result in results}
+
+
+def test_batch_runs_turns_and_prompts_with_per_item_errors(client, auth_headers, model):
+    """Test session turns are stored in order, prompts are not, and bad items fail alone."""
+    session_id = client.post("/api/v1/chat/sessions", json={}, headers=auth_headers).json()["id"]
+    items = [
+        {"session_id": session_id, "content": "first", "id": "a"},
+        {"content": "stateless"},
+        {"session_id": session_id, "content": "second"},
+        {"session_id": str(uuid4()), "content": "lost"},
+        {"content": " "},
+        {"session_id": session_id, "content": "boom"},
+    ]
+
+    results = _run(client, auth_headers, items)
+
+    assert sorted(results) == list(range(len(items)))
+    assert results[0]["id"] == "a"
+    assert results[0]["reply"]["content"] == "first (2)"
+    assert results[0]["reply"]["prompt_tokens"] == 7
+    # The second turn was answered from a history with the first reply
+    assert results[2]["reply"]["content"] == "second (4)"
+    assert results[1]["reply"]["content"] == "stateless (2)"
+    assert "message_id" not in results[1]["reply"]
+    assert results[3]["error"]["code"] == "not_found"
+    assert results[4]["error"]["code"] == "invalid"
+    assert results[5]["status"] == "error"
+    assert results[5]["error"]["code"] == "unavailable"
+
+    chat_session = client.get(f"/api/v1/chat/sessions/{session_id}", headers=auth_headers).json()
+    assert [m["content"] for m in chat_session["messages"]] == [
+        "first",
+        "first (2)",
+        "second",
+        "second (4)",
+    ]
+    assert chat_session["messages"][1]["id"] == results[0]["reply"]["message_id"]
+    assert chat_session["messages"][1]["completion_tokens"] == 3
+
+
+def test_batch_parallelism_is_bounded(client, auth_headers, model, monkeypatch):
+    """Test stateless prompts run in parallel up to BATCH_CONCURRENCY."""
+    monkeypatch.setattr(settings, "BATCH_CONCURRENCY", 3)
+
+    results = _run(client, auth_headers, [{"content": f"prompt {i}"} for i in range(12)])
+
+    assert all(result["status"] == "ok" for result in results.values())
+    assert model.max_running == 3
+
+
+def test_batch_size_is_limited(client, auth_headers, model, monkeypatch):
+    """Test empty and oversized batches are rejected."""
+    monkeypatch.setattr(settings, "BATCH_MAX_ITEMS", 2)
+    url = "/api/v1/chat/batch"
+
+    too_many = {"items": [{"content": "hi"}] * 3}
+    assert client.post(url, json=too_many, headers=auth_headers).status_code == 400
+    assert client.post(url, json={"items": []}, headers=auth_headers).status_code == 400
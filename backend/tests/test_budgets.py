@@ -0,0 +1,120 @@
+"""Generation budget tests."""
+
+from sqlmodel import select
+
+from app.core.config import settings
+from app.models.chat import GenerationLimits
+from app.models.user import User
+from app.services import llm
+from app.services.budgets import budget_hits, clamped_limits, generation_budget, user_caps
+from app.services.circuit_breaker import CLOSED, CircuitBreaker
+from app.services.ollama_pool import OllamaBackend
+from tests.ollama_standin import ScriptedChatModel
+
+
+def _send(client, headers, limits):
+    session_id = client.post("/api/v1/chat/sessions", json={}, headers=headers).json()["id"]
+    return client.post(
+        f"/api/v1/chat/sessions/{session_id}/messages",
+        json={"content": "hi", "limits": limits},
+        headers=headers,
+    )
+
+
+def test_limits_are_clamped_to_the_users_caps(monkeypatch):
+    """Test requested limits are lowered to the tier's caps, overridden per user."""
+    monkeypatch.setattr(
+        settings,
+        "GENERATION_TIERS",
+        {"default": {"max_tokens": 100, "deadline_seconds": 30}, "pro": {"max_tokens": 1000}},
+    )
+    clamped = clamped_limits.value(limit="max_tokens")
+
+    free = user_caps(User(email="a", username="a", hashed_password="x", tier="unknown"))
+    budget = generation_budget(free, GenerationLimits(max_tokens=500, context_tokens=4096))
+    assert (budget.max_tokens, budget.context_tokens, budget.deadline_seconds) == (100, 4096, 30)
+    assert clamped_limits.value(limit="max_tokens") == clamped + 1
+
+    pro = User(email="b", username="b", hashed_password="x", tier="pro")
+    pro.generation_limits = {"max_tokens": 2000}
+    budget = generation_budget(user_caps(pro))
+    assert (budget.max_tokens, budget.deadline_seconds) == (2000, None)
+    assert budget.options() == {"temperature": settings.OLLAMA_TEMPERATURE, "num_predict": 2000}
+
+
+def test_max_tokens_reach_the_model_and_are_recorded(client, auth_headers, monkeypatch):
+    """Test a reply stopped by its token budget is stored with finish_reason length."""
+    model = ScriptedChatModel("word " * 5)
+    monkeypatch.setattr(OllamaBackend, "llm", model)
+    monkeypatch.setattr(settings, "GENERATION_TIERS", {"default": {"max_tokens": 2}})
+    hits = budget_hits.value(limit="max_tokens")
+
+    response = _send(client, auth_headers, {"max_tokens": 10, "temperature": 0.1})
+
+    assert response.status_code == 200
+    assert response.json()["finish_reason"] == "length"
+    assert response.json()["content"] == "word word "
+    assert model.options == {"temperature": 0.1, "num_predict": 2}
+    assert budget_hits.value(limit="max_tokens") == hits + 1
+
+
+def test_deadline_cuts_the_reply_short(client, auth_headers, monkeypatch):
+    """Test a reply still streaming at its deadline keeps its output as finish_reason deadline."""
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel("word " * 50, delay=0.02))
+    hits = budget_hits.value(limit="deadline")
+
+    response = _send(client, auth_headers, {"deadline_seconds": 0.2})
+
+    assert response.status_code == 200
+    assert response.json()["finish_reason"] == "deadline"
+    assert 0 < response.json()["content"].count("word") < 50
+    assert budget_hits.value(limit="deadline") == hits + 1
+
+
+def test_invalid_limits_are_rejected(client, auth_headers):
+    """Test limits outside their range are a validation error."""
+    assert _send(client, auth_headers, {"max_tokens": 0}).status_code == 422
+
+
+def test_deadline_before_the_first_token_is_a_budget_hit(client, auth_headers, monkeypatch):
+    """Test a deadline that passes before any output fails the reply and is counted."""
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel("late", delay=1))
+    hits = budget_hits.value(limit="deadline")
+
+    response = _send(client, auth_headers, {"deadline_seconds": 0.1})
+
+    assert response.status_code == 504
+    assert budget_hits.value(limit="deadline") == hits + 1
+
+
+def test_invalid_stored_caps_are_ignored(client, session, auth_headers, monkeypatch):
+    """Test a user's invalid generation_limits fall back to the tier's caps."""
+    model = ScriptedChatModel("word " * 5)
+    monkeypatch.setattr(OllamaBackend, "llm", model)
+    monkeypatch.setattr(settings, "GENERATION_TIERS", {"default": {"max_tokens": 3}})
+    user = session.exec(select(User)).one()
+    user.generation_limits = {"max_tokens": 0, "deadline_seconds": "soon"}
+    session.add(user)
+    session.commit()
+
+    response = _send(client, auth_headers, None)
+
+    assert response.status_code == 200
+    assert model.options == {"temperature": settings.OLLAMA_TEMPERATURE, "num_predict": 3}
+
+
+def test_budget_deadlines_do_not_open_the_circuit(client, auth_headers, monkeypatch):
+    """Test replies cut off by their own deadline are not counted as Ollama failures."""
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel("slow reply", delay=0.2))
+    breaker = CircuitBreaker("ollama", 2, reset_seconds=30)
+    monkeypatch.setattr(llm, "ollama_circuit", breaker)
+
+    statuses = [
+        _send(client, auth_headers, {"deadline_seconds": 0.05}).status_code for _ in range(3)
+    ]
+    partial = _send(client, auth_headers, {"deadline_seconds": 0.3})
+
+    assert statuses == [504, 504, 504]
+    assert partial.json()["finish_reason"] == "deadline"
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
@@ -0,0 +1,72 @@
+"""WebSocket chat channel tests."""
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.services.ollama_pool import OllamaBackend
+from tests.ollama_standin import ScriptedChatModel
+
+
+def _create_session(client, token):
+    headers = {"Authorization": f"Bearer {token}"}
+    return client.post("/api/v1/chat/sessions", json={}, headers=headers).json()["id"]
+
+
+def _receive_turn(ws):
+    events = [ws.receive_json()]
+    while events[-1]["type"] not in ("end", "error"):
+        events.append(ws.receive_json())
+    return events
+
+
+def test_turns_stream_tokens_over_one_connection(client, access_token, monkeypatch):
+    """Test several turns on one authenticated connection stream and store replies."""
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel("Hello over the socket "))
+    session_id = _create_session(client, access_token)
+
+    with client.websocket_connect(
+        f"/api/v1/chat/sessions/{session_id}/ws?token={access_token}"
+    ) as ws:
+        for content in ("first", "second"):
+            ws.send_json({"type": "message", "content": content})
+            events = _receive_turn(ws)
+
+            assert events[0]["type"] == "start"
+            tokens = "".join(e["content"] for e in events if e["type"] == "token")
+            assert tokens == "Hello over the socket "
+            assert events[-1]["type"] == "end"
+            assert events[-1]["message"]["content"] == tokens
+            assert events[-1]["message"]["finish_reason"] == "stop"
+            assert events[-1]["message"]["id"] == events[0]["message_id"]
+
+    headers = {"Authorization": f"Bearer {access_token}"}
+    stored = client.get(f"/api/v1/chat/sessions/{session_id}", headers=headers).json()
+    assert [m["role"] for m in stored["messages"]] == ["user", "assistant"] * 2
+
+
+def test_cancel_stops_the_reply_mid_stream(client, access_token, monkeypatch):
+    """Test a cancel message ends the turn with the partial reply."""
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel("one two three four five", 0.05))
+    session_id = _create_session(client, access_token)
+
+    with client.websocket_connect(
+        f"/api/v1/chat/sessions/{session_id}/ws?token={access_token}"
+    ) as ws:
+        ws.send_json({"type": "message", "content": "count"})
+        assert ws.receive_json()["type"] == "start"
+        assert ws.receive_json()["type"] == "token"
+        ws.send_json({"type": "cancel"})
+        events = _receive_turn(ws)
+
+    end = events[-1]
+    assert end["type"] == "end"
+    assert end["message"]["finish_reason"] == "cancelled"
+    assert "five" not in end["message"]["content"]
+
+
+def test_invalid_token_is_rejected(client):
+    """Test connections without a valid token are closed with a policy violation."""
+    url = "/api/v1/chat/sessions/00000000-0000-0000-0000-000000000000/ws?token=bad"
+    with pytest.raises(WebSocketDisconnect) as exc_info, client.websocket_connect(url) as ws:
+        ws.receive_json()
+    assert exc_info.value.code == 1008
@@ -0,0 +1,61 @@
+"""Circuit breaker and deadline tests."""
+
+import pytest
+
+from app.core.config import settings
+from app.services import llm
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.services.ollama_pool import OllamaBackend
+from tests.ollama_standin import ScriptedChatModel
+
+
+def test_breaker_opens_probes_and_closes(monkeypatch):
+    """Test the circuit opens at the threshold and a successful probe closes it."""
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    monkeypatch.setattr(breaker, "opened_at", breaker.opened_at - 30)
+    assert breaker.state == "half_open"
+    breaker.before_call()  # The probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_failures_are_not_stored_and_open_circuit_fails_fast(client, auth_headers, monkeypatch):
+    """Test Ollama failures answer 503 without storing messages, then stop calling Ollama."""
+    model = ScriptedChatModel(error=ConnectionError("connection refused"))
+    monkeypatch.setattr(OllamaBackend, "llm", model)
+    monkeypatch.setattr(llm, "ollama_circuit", CircuitBreaker("ollama", 2, reset_seconds=30))
+    session_id = client.post("/api/v1/chat/sessions", json={}, headers=auth_headers).json()["id"]
+    url = f"/api/v1/chat/sessions/{session_id}/messages"
+
+    responses = [client.post(url, json={"content": "hi"}, headers=auth_headers) for _ in range(3)]
+
+    assert [r.status_code for r in responses] == [503, 503, 503]
+    assert int(responses[2].headers["Retry-After"]) >= 29
+    assert model.calls == 2  # The third request never reached Ollama
+    chat_session = client.get(f"/api/v1/chat/sessions/{session_id}", headers=auth_headers).json()
+    assert chat_session["messages"] == []
+
+
+def test_missing_first_token_times_out(client, auth_headers, monkeypatch):
+    """Test a model that does not start replying within the deadline answers 504."""
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel("late", delay=1))
+    monkeypatch.setattr(llm, "ollama_circuit", CircuitBreaker("ollama", 5, reset_seconds=30))
+    monkeypatch.setattr(settings, "OLLAMA_FIRST_TOKEN_TIMEOUT_SECONDS", 0.05)
+    session_id = client.post("/api/v1/chat/sessions", json={}, headers=auth_headers).json()["id"]
+
+    response = client.post(
+        f"/api/v1/chat/sessions/{session_id}/messages", json={"content": "hi"}, headers=auth_headers
+    )
+
+    assert response.status_code == 504
+    assert llm.ollama_circuit.failures == 1
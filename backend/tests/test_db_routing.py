@@ -0,0 +1,60 @@
+"""Read-replica routing tests using two local SQLite databases."""
+
+from uuid import uuid4
+
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from app.db.session import RoutingSession, WriteTracker
+from app.models.chat import ChatSession, ChatSessionCreate
+from app.services.chat import ChatService
+
+
+@pytest.fixture(name="engines")
+def engines_fixture(tmp_path):
+    """Create a primary and a replica database."""
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    SQLModel.metadata.create_all(primary)
+    SQLModel.metadata.create_all(replica)
+    return primary, replica
+
+
+def _seed_replica(replica, user_id):
+    """Insert a chat session that only exists on the replica."""
+    with RoutingSession(replica, replicas=[]) as session:
+        session.add(ChatSession(user_id=user_id, title="From replica"))
+        session.commit()
+
+
+def test_read_only_methods_use_replica(engines):
+    """Test read-only service methods are served by the replica."""
+    primary, replica = engines
+    user_id = uuid4()
+    _seed_replica(replica, user_id)
+
+    with RoutingSession(primary, replicas=[replica], tracker=WriteTracker(60)) as session:
+        session.info["user_id"] = str(user_id)
+        titles = [s.title for s in ChatService(session).get_user_sessions(user_id)]
+
+    assert titles == ["From replica"]
+
+
+def test_reads_stick_to_primary_after_write(engines):
+    """Test a user's reads go to the primary after they write."""
+    primary, replica = engines
+    user_id = uuid4()
+    _seed_replica(replica, user_id)
+    tracker = WriteTracker(60)
+
+    with RoutingSession(primary, replicas=[replica], tracker=tracker) as session:
+        session.info["user_id"] = str(user_id)
+        ChatService(session).create_session(user_id, ChatSessionCreate(title="From primary"))
+
+    # A new request for the same user still reads its own write
+    with RoutingSession(primary, replicas=[replica], tracker=tracker) as session:
+        session.info["user_id"] = str(user_id)
+        titles = [s.title for s in ChatService(session).get_user_sessions(user_id)]
+
+    assert titles == ["From primary"]
+    assert tracker.is_sticky(user_id)
@@ -0,0 +1,60 @@
+"""Generation cancellation tests against a slow stand-in Ollama server."""
+
+import asyncio
+from uuid import uuid4
+
+from app.models.chat import Message, MessageRole
+from app.services import llm
+from app.services.generations import GenerationRegistry, cancelled_generations
+from app.services.llm import Generation, LLMService
+from app.services.ollama_pool import OllamaBackendPool
+from tests.ollama_standin import OllamaStandIn
+
+
+async def test_cancel_aborts_upstream_stream_and_keeps_partial_output(monkeypatch):
+    """Test cancelling a session's generation closes the Ollama stream mid-reply."""
+    server = OllamaStandIn(reply="one two three four five six", tokens=6, chunk_delay=0.1)
+    await server.start()
+    try:
+        pool = OllamaBackendPool([server.url], eject_after=3, eject_seconds=30)
+        monkeypatch.setattr(llm, "ollama_pool", pool)
+        registry = GenerationRegistry(poll_interval=0.05)
+        session_id = uuid4()
+        history = [Message(chat_session_id=session_id, content="count", role=MessageRole.USER)]
+        generation = Generation(model="m")
+        before = cancelled_generations.value(reason="user_cancelled", partial="kept")
+
+        async def cancel_soon() -> None:
+            while not generation.content:
+                await asyncio.sleep(0.01)
+            assert registry.cancel(session_id) == 1
+
+        canceller = asyncio.create_task(cancel_soon())
+        await registry.run(
+            session_id, generation, LLMService().generate_response(history, generation)
+        )
+        await canceller
+        await asyncio.sleep(0.2)
+
+        assert generation.finish_reason == "cancelled"
+        assert generation.content.startswith("one")
+        assert "six" not in generation.content
+        assert server.aborted == 1
+        assert cancelled_generations.value(reason="user_cancelled", partial="kept") == before + 1
+        assert registry.cancel(session_id) == 0
+    finally:
+        await server.stop()
+
+
+async def test_client_disconnect_cancels_generation():
+    """Test a disconnected client stops a generation that has produced nothing yet."""
+    registry = GenerationRegistry(poll_interval=0.01)
+    generation = Generation(model="m")
+
+    async def is_disconnected() -> bool:
+        return True
+
+    await registry.run(uuid4(), generation, asyncio.sleep(10), is_disconnected)
+
+    assert generation.finish_reason == "cancelled"
+    assert generation.content == ""
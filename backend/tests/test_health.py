@@ -1,6 +1,17 @@
 """Basic health check tests."""
 
+import asyncio
+import time
+
 from fastapi.testclient import TestClient
+from sqlalchemy.pool import StaticPool
+from sqlmodel import create_engine
+
+from app.core.config import settings
+from app.services import warmup
+from app.services.ollama_pool import OllamaBackendPool
+from app.services.warmup import ModelWarmer
+from tests.ollama_standin import OllamaStandIn
 
 
 def test_health_check(client: TestClient):
@@ -8,3 +19,86 @@ def test_health_check(client: TestClient):
     response = client.get("/health")
     assert response.status_code == 200
     assert response.json() == {"status": "healthy"}
+
+
+def test_ready_reports_not_ready_until_warm(client: TestClient, monkeypatch):
+    """Test readiness endpoint returns 503 until model and database are warm."""
+    from app.services.warmup import warmer
+
+    monkeypatch.setattr(warmer, "model_ready", False)
+    monkeypatch.setattr(warmer, "db_ready", True)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "not_ready"
+
+    monkeypatch.setattr(warmer, "model_ready", True)
+    response = client.get("/ready")
+    assert response.status_code == 200
+    assert response.json()["status"] == "ready"
+
+
+async def test_warm_up_loads_models_and_gives_up_on_hung_hosts(monkeypatch):
+    """Test warm-up loads the model with keep-alive and a host that never answers times out."""
+    monkeypatch.setattr(settings, "OLLAMA_WARMUP_TIMEOUT_SECONDS", 0.2)
+    healthy, hung = OllamaStandIn(), OllamaStandIn(hang=True)
+    await healthy.start()
+    await hung.start()
+    try:
+        warmer = ModelWarmer()
+        pool = OllamaBackendPool([hung.url, healthy.url], eject_after=3, eject_seconds=30)
+        monkeypatch.setattr(warmup, "ollama_pool", pool)
+        started = time.monotonic()
+        assert await warmer.warm_model()
+        assert time.monotonic() - started < 2
+
+        [(path, body)] = healthy.requests
+        assert path == "/api/generate"
+        assert body["model"] == settings.OLLAMA_MODEL
+        assert body["keep_alive"] == settings.OLLAMA_KEEP_ALIVE
+
+        monkeypatch.setattr(warmup, "ollama_pool", OllamaBackendPool([hung.url], 3, 30))
+        assert not await warmer.warm_model()
+        assert not warmer.model_ready
+    finally:
+        await hung.stop()
+        await healthy.stop()
+
+
+async def test_keep_alive_retries_soon_and_rechecks_the_database(monkeypatch, tmp_path):
+    """Test a failed warm-up is retried on a short backoff and a lost database is noticed."""
+    monkeypatch.setattr(settings, "OLLAMA_WARMUP_ENABLED", True)
+    monkeypatch.setattr(settings, "OLLAMA_WARMUP_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(settings, "OLLAMA_REWARM_INTERVAL_SECONDS", 600)
+    monkeypatch.setattr(warmup, "RETRY_MIN_SECONDS", 0.01)
+    monkeypatch.setattr(warmup, "engine", create_engine("sqlite://", poolclass=StaticPool))
+    healthy, hung = OllamaStandIn(), OllamaStandIn(hang=True)
+    await healthy.start()
+    await hung.start()
+    warmer = ModelWarmer()
+    try:
+        monkeypatch.setattr(warmup, "ollama_pool", OllamaBackendPool([hung.url], 3, 30))
+        await warmer.start()
+        await asyncio.sleep(0.3)
+        assert warmer.db_ready
+        assert not warmer.ready
+
+        # Well before the re-warm interval
+        monkeypatch.setattr(warmup, "ollama_pool", OllamaBackendPool([healthy.url], 3, 30))
+        for _ in range(50):
+            if warmer.ready:
+                break
+            await asyncio.sleep(0.05)
+        assert warmer.ready
+        await warmer.stop()
+
+        monkeypatch.setattr(settings, "OLLAMA_REWARM_INTERVAL_SECONDS", 0.05)
+        missing = tmp_path / "missing" / "chat.db"
+        monkeypatch.setattr(warmup, "engine", create_engine(f"sqlite:///{missing}"))
+        await warmer.start()
+        await asyncio.sleep(0.2)
+        assert not warmer.db_ready
+        assert not warmer.ready
+    finally:
+        await warmer.stop()
+        await hung.stop()
+        await healthy.stop()
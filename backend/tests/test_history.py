@@ -0,0 +1,109 @@
+"""Chat history export and import tests."""
+
+import json
+from datetime import date
+from uuid import UUID
+
+from app.core.config import settings
+from app.models.chat import ChatSession, Message, MessageRole
+from app.services import history
+
+
+def _auth_headers(client):
+    user = {"email": "history@example.com", "username": "history", "password": "password123"}
+    user_id = UUID(client.post("/api/v1/auth/register", json=user).json()["id"])
+    response = client.post(
+        "/api/v1/auth/login", json={"username": "history", "password": "password123"}
+    )
+    return user_id, {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_export_then_import_round_trips_history(client, session):
+    """Test exported NDJSON can be imported back as new sessions with the same messages."""
+    user_id, headers = _auth_headers(client)
+    for title in ("First", "Second"):
+        chat_session = ChatSession(user_id=user_id, title=title)
+        session.add(chat_session)
+        session.flush()
+        for role in (MessageRole.USER, MessageRole.ASSISTANT):
+            session.add(
+                Message(chat_session_id=chat_session.id, content=f"{title} {role.value}", role=role)
+            )
+    session.add(ChatSession(user_id=user_id, title="Empty"))
+    session.commit()
+
+    exported = client.get("/api/v1/chat/export", headers=headers)
+    assert exported.status_code == 200
+    assert exported.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in exported.text.splitlines()]
+    assert [r["type"] for r in records] == [
+        "export", "session", "message", "message", "session", "message", "message", "session",
+    ]  # fmt: skip
+
+    imported = client.post("/api/v1/chat/import", content=exported.content, headers=headers)
+    assert imported.status_code == 201
+    assert imported.json() == {"sessions": 3, "messages": 4}
+
+    sessions = client.get("/api/v1/chat/sessions", headers=headers).json()
+    assert sorted(s["title"] for s in sessions) == sorted(["First", "Second", "Empty"] * 2)
+    copy = next(s for s in sessions if s["title"] == "First" and s["id"] != records[1]["id"])
+    messages = client.get(f"/api/v1/chat/sessions/{copy['id']}", headers=headers).json()["messages"]
+    assert [m["content"] for m in messages] == ["First user", "First assistant"]
+
+
+def test_import_rejects_invalid_lines_atomically(client):
+    """Test a bad line fails the import with its line number and stores nothing."""
+    _user_id, headers = _auth_headers(client)
+    body = "\n".join(
+        [
+            json.dumps({"type": "session", "id": "00000000-0000-0000-0000-000000000001",
+                        "title": "Kept?", "created_at": "2026-01-01T00:00:00Z",
+                        "updated_at": "2026-01-01T00:00:00Z"}),
+            json.dumps({"type": "message", "session_id": "00000000-0000-0000-0000-000000000001",
+                        "role": "robot", "content": "hi", "created_at": "2026-01-01T00:00:00Z"}),
+        ]
+    )  # fmt: skip
+
+    response = client.post("/api/v1/chat/import", content=body, headers=headers)
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Line 2:")
+    assert client.get("/api/v1/chat/sessions", headers=headers).json() == []
+
+
+def _export(*message_dates):
+    session_id = "00000000-0000-0000-0000-000000000001"
+    lines = [
+        {"type": "session", "id": session_id, "title": "Old", "created_at": "2020-01-01T00:00:00Z",
+         "updated_at": "2020-01-01T00:00:00Z"},
+        *({"type": "message", "session_id": session_id, "role": "user", "content": "hi",
+           "created_at": created_at} for created_at in message_dates),
+    ]  # fmt: skip
+    return "\n".join(json.dumps(line) for line in lines)
+
+
+def test_import_creates_partitions_for_the_months_it_writes(client, monkeypatch):
+    """Test the partitions of imported messages' months are ensured before they are inserted."""
+    _user_id, headers = _auth_headers(client)
+    ensured = []
+    monkeypatch.setattr(history, "ensure_months", lambda _engine, months: ensured.append(months))
+    body = _export("2020-01-31T23:59:59Z", "2020-02-01T00:30:00+01:00", "2020-03-01T00:00:00Z")
+
+    response = client.post("/api/v1/chat/import", content=body, headers=headers)
+
+    assert response.status_code == 201
+    assert ensured == [{date(2020, 1, 1), date(2020, 3, 1)}]
+
+
+def test_import_rejects_messages_older_than_retention(client, monkeypatch):
+    """Test messages that retention would remove fail the import with a 400."""
+    _user_id, headers = _auth_headers(client)
+    monkeypatch.setattr(settings, "MESSAGE_RETENTION_MONTHS", 3)
+
+    response = client.post(
+        "/api/v1/chat/import", content=_export("2020-01-01T00:00:00Z"), headers=headers
+    )
+
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Line 2: message is older than the retention")
+    assert client.get("/api/v1/chat/sessions", headers=headers).json() == []
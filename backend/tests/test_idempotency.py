@@ -0,0 +1,73 @@
+"""Idempotency store tests."""
+
+import asyncio
+
+import pytest
+
+from app.services.idempotency import IdempotencyKeyMismatchError, IdempotencyStore
+
+
+async def test_concurrent_duplicates_share_one_execution_and_replays_are_stored():
+    """Test duplicates wait for the in-flight call and later calls replay its result."""
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    calls = 0
+
+    async def work(_is_disconnected):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return f"reply {calls}"
+
+    first, second = await asyncio.gather(store.run("key", "fp", work), store.run("key", "fp", work))
+    third = await store.run("key", "fp", work)
+
+    assert calls == 1
+    assert first == ("reply 1", False)
+    assert second == ("reply 1", True)
+    assert third == ("reply 1", True)
+
+    with pytest.raises(IdempotencyKeyMismatchError):
+        await store.run("key", "other request", work)
+
+
+async def test_failures_are_not_stored():
+    """Test a failed call can be retried with the same key."""
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    attempts = 0
+
+    async def flaky(_is_disconnected):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("upstream down")
+        return "ok"
+
+    with pytest.raises(RuntimeError):
+        await store.run("key", "fp", flaky)
+    assert await store.run("key", "fp", flaky) == ("ok", False)
+
+
+async def test_work_sees_disconnect_only_when_every_client_is_gone():
+    """Test a retry keeps the shared work alive after the first client drops."""
+    store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+    connected = {"first": False, "retry": True}
+    seen = []
+
+    async def work(is_disconnected):
+        await asyncio.sleep(0.02)
+        seen.append(await is_disconnected())
+        connected["retry"] = False
+        seen.append(await is_disconnected())
+        return "done"
+
+    async def first_gone():
+        return not connected["first"]
+
+    async def retry_gone():
+        return not connected["retry"]
+
+    await asyncio.gather(
+        store.run("key", "fp", work, first_gone), store.run("key", "fp", work, retry_gone)
+    )
+
+    assert seen == [False, True]
@@ -0,0 +1,90 @@
+"""Structured logging and request context tests."""
+
+import json
+import logging
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.core import logging as app_logging
+from app.core.config import settings
+from app.core.logging import configure_logging, request_id, stop_logging
+from app.core.request_context import RequestTimings, request_timings
+
+
+def test_request_ids_are_returned_and_reused(client):
+    """Test responses carry a request id, the client's own when it is usable."""
+    generated = client.get("/health").headers["X-Request-ID"]
+    assert len(generated) == 32
+
+    given = client.get("/health", headers={"X-Request-ID": "trace-123"})
+    assert given.headers["X-Request-ID"] == "trace-123"
+
+    unusable = client.get("/health", headers={"X-Request-ID": "bad id\twith spaces"})
+    assert unusable.headers["X-Request-ID"] != "bad id\twith spaces"
+
+
+def test_slow_requests_are_logged_with_sql_timings(client, monkeypatch, caplog):
+    """Test a request over the threshold is logged with its id and statements."""
+    monkeypatch.setattr(settings, "SLOW_REQUEST_THRESHOLD_MS", 0.001)
+    user = {"email": "slow@example.com", "username": "slow", "password": "password123"}
+
+    with caplog.at_level(logging.WARNING, logger="app.core.request_context"):
+        response = client.post(
+            "/api/v1/auth/register", json=user, headers={"X-Request-ID": "slow-1"}
+        )
+
+    assert response.status_code == 201
+    (record,) = [r for r in caplog.records if r.getMessage().startswith("Slow request")]
+    assert record.path == "/api/v1/auth/register"
+    assert record.status == 201
+    assert record.request_id == "slow-1"
+    assert record.sql_statements >= 1
+    assert record.slowest_sql[0]["statement"]
+
+
+def test_failed_statements_do_not_leak_timers():
+    """Test a failing statement leaves no start time behind on its pooled connection."""
+    engine = create_engine("sqlite://")
+    timings = RequestTimings()
+    token = request_timings.set(timings)
+    try:
+        with engine.connect() as connection:
+            with pytest.raises(OperationalError):
+                connection.execute(text("SELECT * FROM missing"))
+            connection.execute(text("SELECT 1"))
+
+            assert connection.info["query_started"] == []
+    finally:
+        request_timings.reset(token)
+
+    assert timings.sql_statements == 1
+    assert timings.slowest_sql[0][1] == "SELECT 1"
+
+
+def test_json_lines_go_through_the_queue(capsys, monkeypatch):
+    """Test records are written as JSON with the request id and extra fields."""
+    monkeypatch.setattr(settings, "LOG_FORMAT", "json")
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    token = request_id.set("req-42")
+    try:
+        configure_logging()
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logging.getLogger("app.test").exception("Failed %s", "here", extra={"model": "m"})
+        stop_logging()
+    finally:
+        request_id.reset(token)
+        root.handlers, root.level = handlers, level
+        app_logging._listener = None
+
+    (line,) = [line for line in capsys.readouterr().out.splitlines() if "app.test" in line]
+    data = json.loads(line)
+    assert data["message"] == "Failed here"
+    assert data["level"] == "ERROR"
+    assert data["request_id"] == "req-42"
+    assert data["model"] == "m"
+    assert "ValueError: boom" in data["exception"]
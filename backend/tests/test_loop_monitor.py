@@ -0,0 +1,82 @@
+"""Event loop lag monitor tests."""
+
+import asyncio
+import logging
+import time
+
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.loop_monitor import event_loop_lag, loop_monitor
+from tests.loop_blocking import assert_no_blocking
+
+
+router = APIRouter()
+
+
+@router.get("/test-loop/blocking")
+async def blocking_endpoint() -> dict[str, str]:
+    time.sleep(0.2)  # Synchronous work inside async def
+    return {"status": "done"}
+
+
+@router.get("/test-loop/yielding")
+async def yielding_endpoint() -> dict[str, str]:
+    await asyncio.sleep(0.2)
+    return {"status": "done"}
+
+
+@pytest.fixture(name="loop_client")
+def loop_client_fixture():
+    """A client for a throwaway app serving the endpoints above, not the real one."""
+    test_app = FastAPI()
+    test_app.include_router(router)
+    return TestClient(test_app)
+
+
+def test_blocking_endpoint_fails_the_budget(loop_client):
+    """Test the helper names the coroutine that blocked and passes one that awaits."""
+    loop_client.get("/test-loop/yielding")  # First request pays for imports and startup
+
+    with assert_no_blocking(budget_ms=100):
+        assert loop_client.get("/test-loop/yielding").status_code == 200
+
+    blocked = r"test_loop_monitor.py:\d+ in blocking_endpoint"
+    with pytest.raises(AssertionError, match=blocked), assert_no_blocking(budget_ms=100):
+        loop_client.get("/test-loop/blocking")
+
+
+@pytest.mark.parametrize("mode", ["sample", "debug"])
+def test_monitor_reports_blocks_with_their_task(monkeypatch, caplog, mode):
+    """Test the lag is recorded and a block is logged once, with its task and stack."""
+    monkeypatch.setattr(settings, "LOOP_MONITOR_MODE", mode)
+    monkeypatch.setattr(settings, "LOOP_MONITOR_INTERVAL_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "LOOP_BLOCK_THRESHOLD_MS", 50.0)
+    observed = event_loop_lag.count()
+
+    def hash_password_synchronously() -> None:
+        time.sleep(0.2)
+
+    async def handle_request() -> None:
+        await asyncio.sleep(0.05)
+        hash_password_synchronously()
+
+    async def run() -> None:
+        await loop_monitor.start()
+        try:
+            await asyncio.create_task(handle_request(), name="request-1")
+            await asyncio.sleep(0.05)
+        finally:
+            await loop_monitor.stop()
+
+    with caplog.at_level(logging.WARNING, logger="app.core.loop_monitor"):
+        asyncio.run(run())
+
+    assert event_loop_lag.count() > observed
+    (record,) = [r for r in caplog.records if r.getMessage().startswith("Event loop blocked")]
+    assert record.task == "request-1"
+    assert record.coroutine.endswith("handle_request")
+    assert record.blocked_ms >= 100
+    assert "hash_password_synchronously" in record.getMessage()
@@ -0,0 +1,103 @@
+"""Retrieval memory tests."""
+
+from uuid import uuid4
+
+from app.core.config import settings
+from app.models.chat import ChatSession, Message, MessageRole
+from app.models.user import User
+from app.services import memory as memory_module
+from app.services.memory import MemoryService, SessionIndex, _normalized
+
+
+TOPICS = ["cat", "boat", "tax", "pizza", "guitar", "snow"]
+
+
+class TopicEmbedder:
+    """One dimension per topic word, so similarity means sharing a topic."""
+
+    model = "topics"
+
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    async def embed(self, texts):
+        self.calls.append(list(texts))
+        return [[float(topic in text) + 0.01 for topic in TOPICS] for text in texts]
+
+
+def _history(session):
+    user = User(email="memory@example.com", username="memory", hashed_password="x")
+    chat_session = ChatSession(user_id=user.id, title="Memory")
+    session.add(user)
+    session.add(chat_session)
+    history = []
+    for topic in TOPICS:
+        history.append(
+            Message(chat_session_id=chat_session.id, role=MessageRole.USER, content=f"my {topic}?")
+        )
+        history.append(
+            Message(
+                chat_session_id=chat_session.id,
+                role=MessageRole.ASSISTANT,
+                content=f"about {topic}",
+            )
+        )
+    history.append(
+        Message(chat_session_id=chat_session.id, role=MessageRole.USER, content="my boat again")
+    )
+    session.add_all(history)
+    session.commit()
+    return chat_session.id, history
+
+
+async def test_recalls_relevant_older_exchange_with_recent_messages(session, monkeypatch):
+    """Test the prompt keeps recent messages and the older exchange about the same topic."""
+    monkeypatch.setattr(settings, "MEMORY_RECENT_MESSAGES", 3)
+    monkeypatch.setattr(settings, "MEMORY_TOP_K", 1)
+    session_id, history = _history(session)
+    embedder = TopicEmbedder()
+    memory = MemoryService(embedder, session.get_bind(), max_cached_sessions=10)
+
+    await memory.index_session(session_id)
+    selected = await memory.select_history(history)
+
+    assert [m.content for m in selected] == [
+        "my boat?",
+        "about boat",
+        *[m.content for m in history[-3:]],
+    ]
+    # Only the new message was embedded at prompt-build time
+    assert embedder.calls[-1] == ["my boat again"]
+
+    # A fresh worker loads the persisted index instead of embedding again
+    other_worker = MemoryService(embedder, session.get_bind(), max_cached_sessions=10)
+    assert await other_worker.select_history(history) == selected
+    assert embedder.calls[-1] == ["my boat again"]
+
+
+async def test_unindexed_backlog_is_embedded_one_batch_per_request(session, monkeypatch):
+    """Test a recall embeds at most one batch: the new message and the newest missing ones."""
+    monkeypatch.setattr(settings, "MEMORY_RECENT_MESSAGES", 3)
+    monkeypatch.setattr(memory_module, "EMBED_BATCH_SIZE", 4)
+    _session_id, history = _history(session)
+    embedder = TopicEmbedder()
+    memory = MemoryService(embedder, session.get_bind(), max_cached_sessions=10)
+
+    await memory.select_history(history)
+    await memory.select_history(history)
+
+    older = [m.content for m in history[:-3]]
+    assert embedder.calls == [[*older[-3:], "my boat again"], [*older[-6:-3], "my boat again"]]
+
+
+def test_index_scores_with_cosine_similarity():
+    """Test search ranks by direction, not length, and only among candidates."""
+    index = SessionIndex()
+    first, second, third = uuid4(), uuid4(), uuid4()
+    index.add(first, _normalized([10.0, 0.0]))
+    index.add(second, _normalized([1.0, 1.0]))
+    index.add(third, _normalized([0.1, 0.0]))
+
+    assert index.search(_normalized([1.0, 0.2]), 2, {first, second}) == [first, second]
+    assert index.search(_normalized([1.0, 0.0]), 3, {third}) == [third]
+    assert len(index.vectors) == 2 * len(index)
@@ -0,0 +1,101 @@
+"""Model routing tests."""
+
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.services.model_router import (
+    ModelLatencyTracker,
+    ModelRouter,
+    RoutingDecision,
+    routing_decisions,
+)
+from app.services.ollama_pool import OllamaBackend
+from tests.ollama_standin import ScriptedChatModel
+
+
+@pytest.fixture(name="routing")
+def routing_fixture(monkeypatch):
+    """Route between a small and a large model with small limits."""
+    for name, value in {
+        "MODEL_ROUTING_ENABLED": True,
+        "MODEL_ROUTING_SMALL_MODEL": "small",
+        "MODEL_ROUTING_LARGE_MODEL": "large",
+        "MODEL_ROUTING_MAX_SMALL_PROMPT_CHARS": 20,
+        "MODEL_ROUTING_MAX_SMALL_HISTORY": 4,
+        "MODEL_ROUTING_LARGE_MAX_INFLIGHT": 2,
+        "MODEL_ROUTING_LARGE_MAX_LATENCY_SECONDS": 10.0,
+        "MODEL_ROUTING_ALLOWED_MODELS": [],
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    return ModelRouter(ModelLatencyTracker())
+
+
+def test_turns_are_routed_by_prompt_and_history(routing):
+    """Test short turns go to the small model and long prompts or histories to the large one."""
+    decisions = routing_decisions.value(model="large", reason="long_prompt")
+
+    assert routing.choose("hi", 0) == RoutingDecision("small", "short_turn")
+    assert routing.choose("x" * 21, 0) == RoutingDecision("large", "long_prompt")
+    assert routing.choose("hi", 5) == RoutingDecision("large", "long_history")
+    assert routing.choose("hi", 5, "pinned") == RoutingDecision("pinned", "session_override")
+    assert routing_decisions.value(model="large", reason="long_prompt") == decisions + 1
+
+
+def test_heavy_turns_are_shed_while_the_large_model_is_busy(routing):
+    """Test heavy turns go to the small model at the in-flight limit or while slow and busy."""
+
+    async def with_large_turns(count):
+        async with asyncio.TaskGroup() as group:
+            started = asyncio.Event()
+            for _ in range(count):
+                group.create_task(_hold(routing.tracker, started))
+            await asyncio.sleep(0)
+            decision = routing.choose("x" * 21, 0)
+            started.set()
+        return decision
+
+    assert asyncio.run(with_large_turns(2)) == RoutingDecision("small", "large_model_busy")
+    assert asyncio.run(with_large_turns(1)) == RoutingDecision("large", "long_prompt")
+
+    routing.tracker.observe("large", 60.0)
+    assert asyncio.run(with_large_turns(1)) == RoutingDecision("small", "large_model_busy")
+    # An idle model gets the next heavy turn, however slow it was
+    assert routing.choose("x" * 21, 0) == RoutingDecision("large", "long_prompt")
+
+
+async def _hold(tracker, released):
+    async with tracker.track("large"):
+        await released.wait()
+
+
+def test_disabled_routing_uses_the_configured_model(routing, monkeypatch):
+    """Test every turn goes to OLLAMA_MODEL without routing, unless the session pins one."""
+    monkeypatch.setattr(settings, "MODEL_ROUTING_ENABLED", False)
+
+    assert routing.choose("x" * 100, 50) == RoutingDecision(settings.OLLAMA_MODEL, "default")
+    assert routing.choose("hi", 0, "pinned") == RoutingDecision("pinned", "session_override")
+    assert routing.active_models() == [settings.OLLAMA_MODEL]
+
+
+def test_session_override_is_validated_and_used(client, auth_headers, routing, monkeypatch):
+    """Test a session pinned to an allowed model is answered by it and others are refused."""
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel())
+    session_id = client.post("/api/v1/chat/sessions", json={}, headers=auth_headers).json()["id"]
+    url = f"/api/v1/chat/sessions/{session_id}"
+
+    response = client.patch(url, json={"model_override": "unknown"}, headers=auth_headers)
+    assert response.status_code == 400
+    assert "small" in response.json()["detail"]
+
+    response = client.patch(url, json={"model_override": "large"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["model_override"] == "large"
+    reply = client.post(f"{url}/messages", json={"content": "hi"}, headers=auth_headers).json()
+    assert reply["model"] == "large"
+
+    response = client.patch(url, json={"model_override": None}, headers=auth_headers)
+    assert response.json()["model_override"] is None
+    reply = client.post(f"{url}/messages", json={"content": "hi"}, headers=auth_headers).json()
+    assert reply["model"] == "small"
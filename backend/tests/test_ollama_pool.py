@@ -0,0 +1,35 @@
+"""Ollama backend pool tests against local stand-in servers."""
+
+from app.models.chat import Message, MessageRole
+from app.services import llm
+from app.services.llm import Generation, LLMService
+from app.services.ollama_pool import OllamaBackendPool
+from tests.ollama_standin import ollama_standins, unused_url
+
+
+async def test_requests_fail_over_and_dead_backend_is_ejected(monkeypatch):
+    """Test unreachable backends are skipped and ejected after repeated failures."""
+    async with ollama_standins(2) as servers:
+        dead = unused_url()
+        pool = OllamaBackendPool([dead, *(s.url for s in servers)], eject_after=2, eject_seconds=60)
+        monkeypatch.setattr(llm, "ollama_pool", pool)
+        history = [Message(chat_session_id=None, content="hi", role=MessageRole.USER)]
+
+        for _ in range(3):
+            reply = await LLMService().generate_response(history, Generation(model="m"))
+            assert reply.content.startswith("Hello from stand-in")
+
+        dead_backend = pool.backends[0]
+        assert not dead_backend.available
+        assert sum(len(s.requests) for s in servers) == 3
+
+
+def test_least_loaded_backend_is_selected():
+    """Test selection prefers fewer outstanding requests, then lower latency."""
+    pool = OllamaBackendPool(["http://a", "http://b", "http://c"], eject_after=3, eject_seconds=30)
+    a, b, c = pool.backends
+    a.latency, b.latency, c.latency = 1.0, 1.0, 4.0
+    a.outstanding = 2
+
+    assert pool.select() is b
+    assert pool.select(exclude=[b]) is a
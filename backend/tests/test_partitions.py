@@ -0,0 +1,51 @@
+"""Message partition maintenance tests."""
+
+from datetime import UTC, date, datetime, timedelta, timezone
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import create_engine
+
+from app.db.partitions import (
+    add_months,
+    ensure_months,
+    expired_partitions,
+    month_of,
+    partition_bounds,
+    partition_month,
+    partition_name,
+    run_maintenance,
+)
+
+
+def test_partition_names_and_bounds_follow_utc_months():
+    """Test partitions are named by month and cover it up to the next month."""
+    month = date(2026, 12, 1)
+
+    assert add_months(month, 1) == date(2027, 1, 1)
+    assert add_months(month, -12) == date(2025, 12, 1)
+    assert partition_name(month) == "messages_y2026m12"
+    assert partition_month("messages_y2026m12") == month
+    assert partition_month("messages_archive") is None
+    assert partition_bounds(month) == ("2026-12-01 00:00:00+00", "2027-01-01 00:00:00+00")
+    assert month_of(datetime(2027, 1, 1, 0, 30, tzinfo=timezone(timedelta(hours=1)))) == month
+    assert month_of(datetime(2026, 12, 31, 23, 59, tzinfo=UTC)) == month
+
+
+def test_only_partitions_before_the_retention_window_expire():
+    """Test retention keeps the current month and the configured months before it."""
+    names = ["messages_y2026m10", "messages_y2026m06", "messages_y2026m07", "messages_y2025m12"]
+    today = date(2026, 10, 19)
+
+    assert expired_partitions(names, today, retention_months=3) == [
+        "messages_y2025m12",
+        "messages_y2026m06",
+    ]
+    assert expired_partitions(names, today, retention_months=0) == []
+
+
+def test_maintenance_skips_unpartitioned_databases():
+    """Test maintenance does nothing where messages is a plain table."""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+
+    assert run_maintenance(engine, retention_months=1) is None
+    assert ensure_months(engine, [date(2020, 1, 1)]) == []
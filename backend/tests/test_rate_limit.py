@@ -0,0 +1,125 @@
+"""Rate limiting tests."""
+
+import time
+
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+from app.api import deps
+from app.core.ratelimit import (
+    DatabaseRateLimitBackend,
+    MemoryRateLimitBackend,
+    RateLimit,
+    RateLimiter,
+)
+
+
+def test_expensive_route_is_rejected_with_retry_headers(client, monkeypatch):
+    """Test a client draining its IP bucket on login gets 429 with rate limit headers."""
+    limiter = RateLimiter(
+        MemoryRateLimitBackend(),
+        user_limit=RateLimit(100, 1),
+        ip_limit=RateLimit(25, 0.5),
+        route_costs={"POST /api/v1/auth/login": 10},
+    )
+    monkeypatch.setattr(deps, "rate_limiter", limiter)
+    credentials = {"username": "nobody", "password": "wrong"}
+
+    statuses = [client.post("/api/v1/auth/login", json=credentials).status_code for _ in range(3)]
+    assert statuses == [401, 401, 429]
+
+    response = client.post("/api/v1/auth/login", json=credentials)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.headers["RateLimit-Limit"] == "25"
+    assert response.headers["RateLimit-Remaining"] == "5"
+
+    # Cheap routes still fit in the remaining tokens
+    user = {"email": "new@example.com", "username": "newuser", "password": "password123"}
+    response = client.post("/api/v1/auth/register", json=user)
+    assert response.status_code == 201
+    assert response.headers["RateLimit-Remaining"] == "4"
+
+
+def test_streamed_responses_carry_rate_limit_headers(client, auth_headers):
+    """Test a route returning its own StreamingResponse still gets the rate limit headers."""
+    response = client.get("/api/v1/chat/export", headers=auth_headers)
+
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].startswith("attachment")
+    assert int(response.headers["RateLimit-Remaining"]) < int(response.headers["RateLimit-Limit"])
+
+
+def test_memory_backend_evicts_least_recently_used_bucket():
+    """Test a full memory backend forgets only the least recently used bucket."""
+    backend = MemoryRateLimitBackend(max_keys=2)
+    limit = RateLimit(capacity=2, refill_per_second=0.001)
+    backend.take("user:1", 2, limit)
+    backend.take("user:2", 2, limit)
+    backend.take("user:1", 0, limit)  # user:2 is now the least recently used
+
+    backend.take("user:3", 1, limit)
+
+    assert not backend.take("user:1", 1, limit).allowed  # Still drained
+    assert backend.take("user:2", 1, limit).allowed  # Forgotten, starts full again
+
+
+def test_database_backend_shares_buckets_between_workers(tmp_path):
+    """Test two workers using the database backend drain the same bucket."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'limits.db'}")
+    SQLModel.metadata.create_all(engine)
+    worker_a, worker_b = DatabaseRateLimitBackend(engine), DatabaseRateLimitBackend(engine)
+    limit = RateLimit(capacity=3, refill_per_second=0.01)
+
+    assert worker_a.take("user:1", 2, limit).allowed
+    rejected = worker_b.take("user:1", 2, limit)
+    assert not rejected.allowed
+    assert 99 < rejected.retry_after <= 100
+    assert worker_b.take("user:2", 2, limit).allowed
+
+
+@pytest.mark.parametrize("backend", ["memory", "database"])
+async def test_rejected_user_does_not_drain_the_ip_bucket(backend, tmp_path):
+    """Test a request the user bucket rejects costs the IP bucket nothing."""
+    if backend == "database":
+        engine = create_engine(f"sqlite:///{tmp_path / 'limits.db'}")
+        SQLModel.metadata.create_all(engine)
+        buckets = DatabaseRateLimitBackend(engine)
+    else:
+        buckets = MemoryRateLimitBackend()
+    ip_limit = RateLimit(capacity=10, refill_per_second=0.001)
+    limiter = RateLimiter(buckets, RateLimit(capacity=2, refill_per_second=0.001), ip_limit, {})
+
+    decisions = [await limiter.check("GET /", "user-id", "127.0.0.1") for _ in range(5)]
+
+    assert [d.allowed for d in decisions] == [True, True, False, False, False]
+    assert round(buckets.take("ip:127.0.0.1", 0, ip_limit).remaining) == 8
+
+
+def test_expired_local_rejections_are_forgotten(tmp_path):
+    """Test the database backend drops rejections it remembers once they run out."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'limits.db'}")
+    SQLModel.metadata.create_all(engine)
+    backend = DatabaseRateLimitBackend(engine, prune_after=0)
+    limit = RateLimit(capacity=1, refill_per_second=100)
+
+    assert backend.take("user:1", 1, limit).allowed
+    assert not backend.take("user:1", 1, limit).allowed
+    assert "user:1" in backend._rejected_until
+    time.sleep(0.02)
+    backend.take("user:2", 1, limit)
+
+    assert "user:1" not in backend._rejected_until
+
+
+async def test_memory_check_costs_microseconds():
+    """Test evaluating both buckets stays in the microsecond range."""
+    limiter = RateLimiter(MemoryRateLimitBackend(), RateLimit(1e9, 1), RateLimit(1e9, 1), {})
+    checks = 10_000
+
+    started = time.perf_counter()
+    for _ in range(checks):
+        await limiter.check("GET /api/v1/chat/sessions", "user-id", "127.0.0.1")
+    per_check = (time.perf_counter() - started) / checks
+
+    assert per_check < 100e-6
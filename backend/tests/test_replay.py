@@ -0,0 +1,62 @@
+"""Conversation replay harness tests."""
+
+import asyncio
+import json
+
+from benchmarks.replay import Configuration, Sample, load_export, prompts, replay, summarize
+
+from tests.ollama_standin import OllamaStandIn
+
+
+def test_export_is_replayed_one_prompt_per_user_message(tmp_path):
+    """Test prompts are rebuilt from the conversation up to each user message."""
+    lines = [
+        {"type": "export", "version": 1},
+        {"type": "session", "id": "8b0f7a3e-0000-4000-8000-000000000001"},
+    ]
+    session_id = "8b0f7a3e-0000-4000-8000-000000000001"
+    for role, content in [("user", "hi"), ("assistant", "hello"), ("user", "how are you?")]:
+        lines.append(
+            {"type": "message", "session_id": session_id, "role": role, "content": content}
+        )
+    export = tmp_path / "export.ndjson"
+    export.write_text("".join(json.dumps(line) + "\n" for line in lines))
+
+    histories = list(prompts(load_export(export)))
+
+    assert [[m.content for m in history] for history in histories] == [
+        ["hi"],
+        ["hi", "hello", "how are you?"],
+    ]
+
+    async def run():
+        standin = OllamaStandIn(tokens=3)
+        await standin.start()
+        try:
+            configuration = Configuration(model="m", system_prompt="Be brief.")
+            return await replay(standin.url, configuration, histories, 2), standin.requests
+        finally:
+            await standin.stop()
+
+    report, requests = asyncio.run(run())
+
+    assert report.requests == 2
+    assert report.errors == 0
+    assert report.prompt_tokens == 24
+    assert report.ttft_p50_ms is not None
+    # The system prompt comes first, then the history as the app sends it
+    sent = [message["content"] for message in requests[-1][1]["messages"]]
+    assert sent[0] == "Be brief."
+    assert sent[1:] in (["hi"], ["hi", "hello", "how are you?"])
+
+
+def test_cost_is_priced_model_time():
+    """Test cost is load + prompt evaluation + generation time at the hourly price."""
+    samples = [Sample(ttft_ms=10, completion_tokens=100, eval_ms=2000, prompt_eval_ms=1000)]
+
+    report = summarize(Configuration("m", ""), samples, 4.0, cost_per_hour=3600)
+
+    assert report.model_seconds == 3.0
+    assert report.cost == 3.0
+    assert report.tokens_per_second == 50.0
+    assert report.throughput_tokens_per_second == 25.0
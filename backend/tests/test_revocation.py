@@ -0,0 +1,130 @@
+"""Token revocation tests."""
+
+import time
+from uuid import uuid4
+
+import pytest
+from sqlmodel import Session
+
+from app.core.revocation import BloomFilter, RevocationList
+from app.models.user import User
+
+
+@pytest.fixture(autouse=True)
+def fresh_revocations(session, monkeypatch):
+    """Give every test an empty revocation list on the test database."""
+    revocations = RevocationList(session.get_bind(), capacity=1000, error_rate=0.001)
+    for module in ("app.api.deps", "app.services.auth"):
+        monkeypatch.setattr(f"{module}.revocation_list", revocations)
+    return revocations
+
+
+@pytest.fixture(name="tokens")
+def tokens_fixture(login):
+    """Register the test user and log in."""
+    return login()
+
+
+def _me(client, tokens):
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    return client.get("/api/v1/auth/me", headers=headers).status_code
+
+
+def _refresh(client, tokens):
+    return client.post("/api/v1/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+
+
+def test_logout_revokes_access_and_refresh_tokens(client, login, tokens):
+    """Test tokens stop working after logout while other logins keep working."""
+    other = login()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+
+    response = client.post(
+        "/api/v1/auth/logout", json={"refresh_token": tokens["refresh_token"]}, headers=headers
+    )
+
+    assert response.status_code == 204
+    assert _me(client, tokens) == 401
+    assert _refresh(client, tokens).status_code == 401
+    assert _me(client, other) == 200
+
+
+def test_logout_everywhere_and_refresh_reuse(client, login, tokens):
+    """Test a used refresh token cannot be replayed and logout everywhere ends all logins."""
+    refreshed = _refresh(client, tokens).json()
+    assert _refresh(client, tokens).status_code == 401
+    other = login()
+
+    headers = {"Authorization": f"Bearer {refreshed['access_token']}"}
+    response = client.post("/api/v1/auth/logout", json={"everywhere": True}, headers=headers)
+
+    assert response.status_code == 204
+    assert _me(client, other) == 401
+    assert _refresh(client, other).status_code == 401
+
+
+def test_password_change_revokes_existing_tokens(client, login, tokens):
+    """Test a password change invalidates old tokens and returns working new ones."""
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    wrong = {"current_password": "nope", "new_password": "new-password"}
+    assert client.post("/api/v1/auth/password", json=wrong, headers=headers).status_code == 400
+
+    change = {"current_password": "password123", "new_password": "new-password"}
+    response = client.post("/api/v1/auth/password", json=change, headers=headers)
+
+    assert response.status_code == 200
+    assert _me(client, tokens) == 401
+    assert _refresh(client, tokens).status_code == 401
+    assert _me(client, response.json()) == 200
+    assert _me(client, login("new-password")) == 200
+
+
+def test_valid_tokens_are_checked_without_a_query(session, fresh_revocations):
+    """Test the database is only consulted for ids the filter reports."""
+    user = User(email="bloom@example.com", username="bloom", hashed_password="x")
+    session.add(user)
+    session.commit()
+    fresh_revocations.revoke(session, "revoked", user.id, time.time() + 60)
+    session.commit()
+
+    class NoQueries:
+        def get(self, *_args):
+            raise AssertionError("queried the database")
+
+    assert not fresh_revocations.is_revoked(NoQueries(), uuid4().hex)
+    assert fresh_revocations.is_revoked(session, "revoked")
+
+
+def test_revocations_sync_between_workers_and_expire(session):
+    """Test another worker sees a revocation after syncing and expired ones are pruned."""
+    bind = session.get_bind()
+    user = User(email="sync@example.com", username="sync", hashed_password="x")
+    session.add(user)
+    session.commit()
+    worker_a = RevocationList(bind, capacity=100, error_rate=0.001)
+    worker_b = RevocationList(bind, capacity=100, error_rate=0.001)
+    worker_b.rebuild()
+
+    with Session(bind) as db:
+        worker_a.revoke(db, "current", user.id, time.time() + 60)
+        worker_a.revoke(db, "expired", user.id, time.time() - 1)
+        db.commit()
+
+    assert "current" not in worker_b._filter
+    worker_b.sync()
+    assert worker_b.is_revoked(session, "current")
+
+    assert worker_b.rebuild() == 1
+    assert "expired" not in worker_b._filter
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """Test every added key is found and unknown keys rarely are."""
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [uuid4().hex for _ in range(1000)]
+    for key in keys:
+        bloom.add(key)
+
+    assert all(key in bloom for key in keys)
+    false_positives = sum(uuid4().hex in bloom for _ in range(10000))
+    assert false_positives < 300
@@ -0,0 +1,113 @@
+"""Sharding tests using a main and two shard SQLite databases."""
+
+from uuid import uuid4
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, func, select
+
+from app.db.session import RoutingSession
+from app.db.shards import ShardingError, jump_hash, rebalance, shard_for
+from app.models.chat import ChatSession, ChatSessionCreate, Message, MessageRole
+from app.models.user import User
+from app.services.chat import ChatService
+
+
+@pytest.fixture(name="databases")
+def databases_fixture(tmp_path):
+    """Create the main database and two shards."""
+    engines = [create_engine(f"sqlite:///{tmp_path / f'{name}.db'}") for name in "abc"]
+    for engine in engines:
+        SQLModel.metadata.create_all(engine)
+    return engines[0], engines[1:]
+
+
+def _user_on(shard: int, count: int = 2):
+    """A user id whose chat data belongs on a given shard."""
+    while shard_for(user_id := uuid4(), count) != shard:
+        pass
+    return user_id
+
+
+def _count(engine, model) -> int:
+    with Session(engine) as session:
+        return session.exec(select(func.count()).select_from(model)).one()
+
+
+def test_chat_data_goes_to_the_users_shard(databases):
+    """Test a user's sessions and messages are stored on and read from their shard."""
+    main, shards = databases
+    for shard in range(2):
+        user_id = _user_on(shard)
+        with RoutingSession(main, replicas=[], shards=shards) as session:
+            session.info["user_id"] = str(user_id)
+            service = ChatService(session)
+            chat = service.create_session(user_id, ChatSessionCreate(title=f"Shard {shard}"))
+            service.add_message(chat.id, "Hello", MessageRole.USER)
+            titles = [s.title for s in service.get_user_sessions(user_id)]
+        assert titles == [f"Shard {shard}"]
+
+    assert [_count(shard, ChatSession) for shard in shards] == [1, 1]
+    assert [_count(shard, Message) for shard in shards] == [1, 1]
+    assert _count(main, ChatSession) == 0
+
+
+def test_global_tables_stay_on_main_database(databases):
+    """Test users are stored on the main database, and chat data needs a user."""
+    main, shards = databases
+    with RoutingSession(main, replicas=[], shards=shards) as session:
+        session.add(User(email="a@example.com", username="a", hashed_password="x"))
+        session.commit()
+        with pytest.raises(ShardingError):
+            session.exec(select(ChatSession)).all()
+
+    assert _count(main, User) == 1
+    assert [_count(shard, User) for shard in shards] == [0, 0]
+
+
+def test_query_across_databases_is_rejected(databases):
+    """Test a join of chat data with users cannot be routed."""
+    main, shards = databases
+    statement = select(ChatSession.title, User.username).join(
+        User,
+        User.id == ChatSession.user_id,  # type: ignore[arg-type]
+    )
+    with RoutingSession(main, replicas=[], shards=shards) as session:
+        session.info["user_id"] = str(uuid4())
+        with pytest.raises(ShardingError, match="different databases"):
+            session.execute(statement)
+
+
+def test_jump_hash_moves_few_keys():
+    """Test adding a bucket only moves keys to the new bucket, about 1/n of them."""
+    keys = range(10_000)
+    before = [jump_hash(key, 4) for key in keys]
+    after = [jump_hash(key, 5) for key in keys]
+    moved = [b for a, b in zip(before, after, strict=True) if a != b]
+
+    assert set(moved) == {4}
+    assert 1500 < len(moved) < 2500
+
+
+def test_rebalance_moves_users_to_their_shard(databases):
+    """Test a rebalance moves chat data from the main database to the shards, once."""
+    main, shards = databases
+    user_ids = [_user_on(0), _user_on(1)]
+    with RoutingSession(main, replicas=[], shards=[]) as session:
+        for user_id in user_ids:
+            chat = ChatService(session).create_session(user_id, ChatSessionCreate())
+            ChatService(session).add_message(chat.id, "Hello", MessageRole.USER)
+
+    preview = rebalance(shards, [main], dry_run=True)
+    assert (preview.users, preview.sessions, preview.messages) == (2, 2, 2)
+    assert _count(main, ChatSession) == 2
+
+    result = rebalance(shards, [main])
+    assert (result.users, result.sessions, result.messages) == (2, 2, 2)
+    assert _count(main, ChatSession) == 0
+    assert _count(main, Message) == 0
+    for user_id, shard in zip(user_ids, shards, strict=True):
+        with Session(shard) as session:
+            stored = session.exec(select(ChatSession.user_id)).all()
+        assert stored == [user_id]
+
+    assert rebalance(shards, [main]).users == 0
@@ -0,0 +1,66 @@
+"""Startup import-time budget tests."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Wall-clock budget for `import app.main` in a fresh interpreter (override via env)
+IMPORT_TIME_BUDGET_SECONDS = float(os.environ.get("IMPORT_TIME_BUDGET_SECONDS", "2.0"))
+
+# Modules that must only be imported on first LLM use
+LAZY_MODULES = ("langchain", "langchain_core", "langchain_ollama", "ollama")
+
+
+def _run_python(code: str, *args: str) -> subprocess.CompletedProcess:
+    """Run code in a fresh interpreter from the backend directory."""
+    return subprocess.run(
+        [sys.executable, *args, "-c", code],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _slowest_imports(limit: int = 10) -> str:
+    """Return the slowest cumulative imports reported by `-X importtime`."""
+    result = _run_python("import app.main", "-X", "importtime")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        rows.append((int(cumulative_us), name.strip()))
+    rows.sort(reverse=True)
+    return "\n".join(f"{us / 1000:8.1f} ms  {name}" for us, name in rows[:limit])
+
+
+def test_import_app_main_skips_llm_stack():
+    """Importing the app must not pull in LangChain or the Ollama client."""
+    code = (
+        "import json, sys\n"
+        "import app.main\n"
+        f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    loaded = json.loads(_run_python(code).stdout)
+    assert loaded == [], f"LLM stack imported at startup: {loaded}"
+
+
+def test_import_app_main_within_budget():
+    """Importing the app stays under the configured wall-clock budget."""
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        "import app.main\n"
+        "print(time.perf_counter() - start)"
+    )
+    elapsed = float(_run_python(code).stdout)
+    assert elapsed < IMPORT_TIME_BUDGET_SECONDS, (
+        f"import app.main took {elapsed:.2f}s (budget {IMPORT_TIME_BUDGET_SECONDS:.2f}s). "
+        f"Slowest imports:\n{_slowest_imports()}"
+    )
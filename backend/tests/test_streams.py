@@ -0,0 +1,140 @@
+"""Resumable reply stream tests."""
+
+import asyncio
+from datetime import UTC, datetime, timedelta
+from uuid import uuid4
+
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.core.config import settings
+from app.db.session import get_session
+from app.main import app
+from app.models.chat import ChatSessionCreate, Message, MessageRole
+from app.services.chat import ChatService
+from app.services.ollama_pool import OllamaBackend
+from app.services.streams import STREAMING, ReplyStream, fail_stale_replies, resumed_replies
+from tests.ollama_standin import ScriptedChatModel
+
+
+def _receive_turn(ws):
+    events = [ws.receive_json()]
+    while events[-1]["type"] not in ("end", "error"):
+        events.append(ws.receive_json())
+    return events
+
+
+def _tokens(events):
+    return "".join(event["content"] for event in events if event["type"] == "token")
+
+
+def test_reply_stream_follows_from_an_offset_with_throttled_checkpoints():
+    """Test followers get the text after their offset and checkpoints are spaced out."""
+    checkpoints = []
+
+    async def run():
+        stream = ReplyStream(uuid4(), uuid4(), checkpoints.append, interval=0.05)
+        stream.append("Hello")
+        received = []
+
+        async def follow():
+            async for text in stream.follow(3):
+                received.append(text)
+
+        follower = asyncio.create_task(follow())
+        for word in [" there"] * 20:
+            await asyncio.sleep(0.01)
+            stream.append(word)
+        await stream.flush()
+        stream.finish()
+        await follower
+        return stream.text, "".join(received)
+
+    text, received = asyncio.run(run())
+    assert received == text[3:]
+    assert 1 <= len(checkpoints) < 10
+    assert all(text.startswith(checkpoint) for checkpoint in checkpoints)
+
+
+def test_resume_on_another_connection_follows_the_checkpoints(client, login, monkeypatch, tmp_path):
+    """Test a second connection picks up a reply mid-stream without a second model call."""
+    # Connections running at once need their own sessions and database connections
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'chat.db'}", connect_args={"check_same_thread": False}
+    )
+    SQLModel.metadata.create_all(engine)
+    app.dependency_overrides[get_session] = lambda: Session(engine)
+    token = login()["access_token"]
+    resumed = resumed_replies.value(source="checkpoint")
+    model = ScriptedChatModel("one two three four five six seven eight nine ten ", 0.05)
+    monkeypatch.setattr(OllamaBackend, "llm", model)
+    monkeypatch.setattr(settings, "STREAM_CHECKPOINT_INTERVAL_SECONDS", 0.01)
+    headers = {"Authorization": f"Bearer {token}"}
+    session_id = client.post("/api/v1/chat/sessions", json={}, headers=headers).json()["id"]
+    url = f"/api/v1/chat/sessions/{session_id}/ws?token={token}"
+
+    with client.websocket_connect(url) as first:
+        first.send_json({"type": "message", "content": "count", "resumable": True})
+        start = first.receive_json()
+        received = first.receive_json()["content"] + first.receive_json()["content"]
+
+        with client.websocket_connect(url) as second:
+            second.send_json(
+                {"type": "resume", "message_id": start["message_id"], "offset": len(received)}
+            )
+            events = _receive_turn(second)
+
+        _receive_turn(first)
+
+    assert events[0] == {"type": "start", "message_id": start["message_id"], "offset": 8}
+    assert events[-1]["type"] == "end"
+    reply = events[-1]["message"]
+    assert received + _tokens(events) == reply["content"]
+    assert reply["content"] == "one two three four five six seven eight nine ten "
+    assert reply["finish_reason"] == "stop"
+    assert model.calls == 1
+    assert resumed_replies.value(source="checkpoint") == resumed + 1
+
+
+def test_resume_of_finished_and_unknown_replies(client, access_token, monkeypatch):
+    """Test finished replies replay from the offset and bad requests get errors."""
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel("all done "))
+    headers = {"Authorization": f"Bearer {access_token}"}
+    session_id = client.post("/api/v1/chat/sessions", json={}, headers=headers).json()["id"]
+    url = f"/api/v1/chat/sessions/{session_id}/ws?token={access_token}"
+
+    with client.websocket_connect(url) as ws:
+        ws.send_json({"type": "message", "content": "finish"})
+        message_id = _receive_turn(ws)[0]["message_id"]
+
+        ws.send_json({"type": "resume", "message_id": message_id, "offset": 4})
+        events = _receive_turn(ws)
+        assert _tokens(events) == "done "
+        assert events[-1]["message"]["content"] == "all done "
+
+        ws.send_json({"type": "resume", "message_id": message_id, "offset": 100})
+        assert ws.receive_json()["detail"] == "Offset is past the end of the reply"
+        ws.send_json({"type": "resume", "message_id": str(uuid4()), "offset": 0})
+        assert ws.receive_json()["detail"] == "Reply not found"
+        ws.send_json({"type": "resume", "message_id": message_id, "offset": -1})
+        assert ws.receive_json()["type"] == "error"
+
+
+def test_abandoned_streaming_reply_is_skipped_and_marked_error(session):
+    """Test a reply a crashed worker never finished stays out of prompts and becomes an error."""
+    service = ChatService(session)
+    user_id = uuid4()
+    chat = service.create_session(user_id, ChatSessionCreate())
+    service.add_message(chat.id, "question", MessageRole.USER)
+    abandoned = service.add_message(
+        chat.id, "half a", MessageRole.ASSISTANT, finish_reason=STREAMING
+    )
+    abandoned.created_at = datetime.now(UTC) - timedelta(hours=1)
+    session.add(abandoned)
+    live = service.add_message(chat.id, "still", MessageRole.ASSISTANT, finish_reason=STREAMING)
+
+    assert [m.content for m in service.get_history(chat.id)] == ["question"]
+
+    assert fail_stale_replies(session.get_bind(), older_than=600) == 1
+    session.expire_all()
+    assert session.get(Message, abandoned.id).finish_reason == "error"
+    assert session.get(Message, live.id).finish_reason == STREAMING
@@ -0,0 +1,122 @@
+"""Automatic session title tests."""
+
+from functools import partial
+
+import pytest
+
+from app.db.session import RoutingSession
+from app.models.chat import DEFAULT_SESSION_TITLE, ChatSession, Message, MessageRole
+from app.models.user import User
+from app.services import chat, llm, titles
+from app.services.circuit_breaker import CircuitBreaker
+from app.services.llm import _clean_title
+from app.services.ollama_pool import OllamaBackend
+from tests.ollama_standin import ScriptedChatModel
+
+
+@pytest.fixture(autouse=True)
+def fresh_circuits(monkeypatch):
+    """Start every test with closed circuits."""
+    monkeypatch.setattr(llm, "ollama_circuit", CircuitBreaker("ollama", 1, reset_seconds=30))
+    monkeypatch.setattr(
+        llm, "background_circuit", CircuitBreaker("ollama_background", 1, reset_seconds=30)
+    )
+
+
+def _untitled_chat(session, monkeypatch):
+    """Store a chat with one exchange and point the title jobs at the test database."""
+    monkeypatch.setattr(
+        titles,
+        "RoutingSession",
+        partial(RoutingSession, session.get_bind(), replicas=[], shards=[]),
+    )
+    user = User(email="titles@example.com", username="titles", hashed_password="x")
+    chat_session = ChatSession(user_id=user.id, title=DEFAULT_SESSION_TITLE)
+    session.add(user)
+    session.add(chat_session)
+    session.add(
+        Message(
+            chat_session_id=chat_session.id,
+            role=MessageRole.USER,
+            content="What should I see in Rome?",
+        )
+    )
+    session.commit()
+    return chat_session.id, user.id
+
+
+@pytest.mark.parametrize(
+    ("text", "title"),
+    [
+        ("Trip to Rome", "Trip to Rome"),
+        ('"Trip to Rome."', "Trip to Rome"),
+        ("**Title: Trip to Rome**", "Trip to Rome"),
+        ("\n\n# Trip to Rome\nA chat about sights", "Trip to Rome"),
+        ("x" * 80, "x" * 60),
+        ('""', None),
+    ],
+)
+def test_clean_title(text, title):
+    """Test model output is reduced to a bare single-line title."""
+    assert _clean_title(text) == title
+
+
+def test_title_is_scheduled_after_first_exchange(client, auth_headers, monkeypatch):
+    """Test only the first exchange of an untitled chat queues a title job."""
+    scheduled = []
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel("Sure."))
+    monkeypatch.setattr(chat, "schedule_title_generation", lambda *args: scheduled.append(args))
+    session_id = client.post("/api/v1/chat/sessions", json={}, headers=auth_headers).json()["id"]
+    url = f"/api/v1/chat/sessions/{session_id}/messages"
+
+    for content in ["hi", "again"]:
+        assert client.post(url, json={"content": content}, headers=auth_headers).status_code == 200
+
+    assert [str(session_id) for session_id, _user_id in scheduled] == [session_id]
+
+
+async def test_generated_title_is_saved(session, monkeypatch):
+    """Test a title job stores the cleaned title from the title model."""
+    session_id, user_id = _untitled_chat(session, monkeypatch)
+    model = ScriptedChatModel('"Title: Sights in Rome."')
+    monkeypatch.setattr(OllamaBackend, "llm", model)
+
+    await titles.generate_session_title(session_id, user_id)
+
+    session.expire_all()
+    assert session.get(ChatSession, session_id).title == "Sights in Rome"
+    assert model.calls == 1
+
+
+async def test_generated_title_does_not_overwrite_rename(session, monkeypatch):
+    """Test a rename made while the title was being generated is kept."""
+    session_id, user_id = _untitled_chat(session, monkeypatch)
+
+    def rename_then_reply(messages):
+        chat_session = session.get(ChatSession, session_id)
+        chat_session.title = "My Rome notes"
+        session.add(chat_session)
+        session.commit()
+        return "Sights in Rome"
+
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel(rename_then_reply))
+
+    await titles.generate_session_title(session_id, user_id)
+
+    session.expire_all()
+    assert session.get(ChatSession, session_id).title == "My Rome notes"
+
+
+async def test_title_failures_leave_chat_circuit_closed(session, monkeypatch):
+    """Test failing title calls open the background circuit, not the chat one."""
+    session_id, user_id = _untitled_chat(session, monkeypatch)
+    monkeypatch.setattr(
+        OllamaBackend, "llm", ScriptedChatModel(error=RuntimeError("model crashed"))
+    )
+
+    with pytest.raises(RuntimeError):
+        await titles.generate_session_title(session_id, user_id)
+
+    assert llm.background_circuit.state == "open"
+    assert llm.ollama_circuit.state == "closed"
+    assert llm.ollama_circuit.failures == 0
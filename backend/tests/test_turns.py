@@ -0,0 +1,120 @@
+"""Per-session turn serialization tests."""
+
+import asyncio
+import time
+from uuid import uuid4
+
+import pytest
+
+from app.models.chat import ChatSessionCreate
+from app.models.user import User
+from app.services.chat import ChatService
+from app.services.ollama_pool import OllamaBackend
+from app.services.turns import TurnBusyError, TurnLocks, advisory_key, turn_locks
+from tests.ollama_standin import ScriptedChatModel
+
+
+def _counting_model():
+    """Replies slowly with the number of messages it was given."""
+    return ScriptedChatModel(lambda messages: f"saw {len(messages)}", delay=0.05)
+
+
+def _chat_sessions(session, count):
+    user = User(email="turns@example.com", username="turns", hashed_password="x")
+    session.add(user)
+    session.commit()
+    service = ChatService(session)
+    return service, [
+        service.create_session(user.id, ChatSessionCreate(title=f"Chat {i}")).id
+        for i in range(count)
+    ]
+
+
+def test_turns_of_one_session_run_one_at_a_time(session, monkeypatch):
+    """Test a second turn waits and is answered from a history with the first reply."""
+    model = _counting_model()
+    monkeypatch.setattr(OllamaBackend, "llm", model)
+    service, (session_id,) = _chat_sessions(session, 1)
+
+    async def both():
+        return await asyncio.gather(
+            service.process_message(session_id, "first"),
+            service.process_message(session_id, "second"),
+        )
+
+    first, second = asyncio.run(both())
+
+    assert model.max_running == 1
+    # The system prompt plus first, its reply and second
+    assert first.content == "saw 2"
+    assert second.content == "saw 4"
+    contents = [m.content for m in service.get_session_messages(session_id)]
+    assert contents == ["first", "saw 2", "second", "saw 4"]
+
+
+def test_turns_of_different_sessions_run_in_parallel(session, monkeypatch):
+    """Test turns of other sessions are not held up."""
+    model = _counting_model()
+    monkeypatch.setattr(OllamaBackend, "llm", model)
+    service, session_ids = _chat_sessions(session, 3)
+
+    async def all_sessions():
+        return await asyncio.gather(
+            *(service.process_message(session_id, "hi") for session_id in session_ids)
+        )
+
+    asyncio.run(all_sessions())
+
+    assert model.max_running == 3
+    assert not turn_locks._locks
+
+
+def test_waiting_too_long_raises_busy():
+    """Test a turn gives up after the lock timeout and the lock is freed afterwards."""
+    locks = TurnLocks("memory", engine=None, timeout=0.05)
+    session_id = uuid4()
+
+    async def contend():
+        async with locks.hold(session_id):
+            started = time.monotonic()
+            with pytest.raises(TurnBusyError):
+                async with locks.hold(session_id):
+                    pass
+            assert time.monotonic() - started < 1
+        async with locks.hold(session_id):
+            pass
+
+    asyncio.run(contend())
+    assert not locks._locks
+
+
+def test_abandoned_waits_are_not_counted_as_waiting():
+    """Test turns that time out or are cancelled while waiting leave the waiting count."""
+    locks = TurnLocks("memory", engine=None, timeout=0.05)
+    session_id = uuid4()
+
+    async def wait_for_turn():
+        async with locks.hold(session_id):
+            pass
+
+    async def contend():
+        async with locks.hold(session_id):
+            with pytest.raises(TurnBusyError):
+                await wait_for_turn()
+            cancelled = asyncio.create_task(wait_for_turn())
+            await asyncio.sleep(0.01)
+            assert locks._waiting == 1
+            cancelled.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await cancelled
+
+    asyncio.run(contend())
+    assert locks._waiting == 0
+    assert not locks._locks
+
+
+def test_advisory_key_fits_bigint():
+    """Test advisory lock keys are signed 64-bit and stable per session."""
+    session_id = uuid4()
+    assert -(2**63) <= advisory_key(session_id) < 2**63
+    assert advisory_key(session_id) == advisory_key(session_id)
@@ -0,0 +1,46 @@
+"""Token usage tests."""
+
+from app.services.ollama_pool import OllamaBackend
+from tests.ollama_standin import ScriptedChatModel
+
+
+def _usage(messages):
+    """Ollama's token counts and timings for a reply."""
+    return {
+        "prompt_eval_count": 20 * len(messages),
+        "prompt_eval_duration": 40_000_000,
+        "eval_count": 50,
+        "eval_duration": 2_000_000_000,
+        "load_duration": 5_000_000,
+    }
+
+
+def test_replies_store_usage_and_usage_is_aggregated(client, auth_headers, monkeypatch):
+    """Test assistant replies keep Ollama's numbers and /usage sums them per model."""
+    monkeypatch.setattr(OllamaBackend, "llm", ScriptedChatModel("Forty two", metadata=_usage))
+    session_id = client.post("/api/v1/chat/sessions", json={}, headers=auth_headers).json()["id"]
+
+    replies = [
+        client.post(
+            f"/api/v1/chat/sessions/{session_id}/messages",
+            json={"content": content},
+            headers=auth_headers,
+        ).json()
+        for content in ("question", "follow-up")
+    ]
+
+    assert replies[0]["prompt_tokens"] == 40  # System prompt and one user message
+    assert replies[0]["completion_tokens"] == 50
+    assert replies[0]["eval_duration_ms"] == 2000
+    assert replies[0]["load_duration_ms"] == 5
+    assert replies[0]["tokens_per_second"] == 25.0
+
+    usage = client.get("/api/v1/chat/usage", headers=auth_headers).json()
+    [model] = usage["models"]
+    assert model["model"] == replies[0]["model"]
+    assert model["messages"] == 2
+    assert model["prompt_tokens"] == 40 + 80
+    assert model["max_prompt_tokens"] == 80
+    assert model["tokens_per_second"] == 25.0
+    assert usage["sessions"][0]["session_id"] == session_id
+    assert usage["sessions"][0]["max_prompt_tokens"] == 80